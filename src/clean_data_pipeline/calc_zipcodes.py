@@ -1,7 +1,27 @@
-from uszipcode import ZipcodeSearchEngine
-search = ZipcodeSearchEngine()
 import pandas as pd
 import numpy as np
+import json
+from src.clean_data_pipeline.zip_geocoder import ZipGeocoder
+
+ZIPS_PATH = 'data/zips_manhattan.csv'
+ZIP_CODES_PATH = 'data/OrderedZipCodes.json'
+CHUNK_SIZE = 500000
+
+_search = None
+
+
+def _get_search_engine():
+    """Method which creates the uszipcode search engine on first use
+
+    Creating the engine lazily keeps uszipcode optional for the polygon
+    geocoders. The engine is shared by the process, parallel_zipcodes
+    creates one per worker instead.
+    """
+    global _search
+    if _search is None:
+        from uszipcode import ZipcodeSearchEngine
+        _search = ZipcodeSearchEngine()
+    return _search
 
 
 def _get_zips(df):
@@ -18,6 +38,7 @@ def _get_zips(df):
            dropoff_zips(list): List with dropoff zipcodes
 
     """
+    search = _get_search_engine()
     p_lats = df.pickup_latitude.tolist()
     p_longs = df.pickup_longitude.tolist()
     d_lats = df.dropoff_latitude.tolist()
@@ -52,12 +73,61 @@ def _get_zips(df):
     return df
 
 
-def filter_zips(df):
+def get_zips(df, geocoder=None):
+    """Method which calculates zipcodes for pairs of lats/longs in bulk
+
+    Vectorised alternative to _get_zips, the zip polygons are loaded once
+    and whole coordinate columns are assigned in a single pass. Rows where
+    the pickup or dropoff could not be assigned a zipcode are dropped.
+
+    Args:
+        df(df): Dataframe containing lat/long pairs
+        geocoder(ZipGeocoder): geocoder to reuse, one is built if None
+
+    Returns:
+           df(df): Dataframe with pickup_zips and dropoff_zips columns
+           failed(np.array): boolean mask over the input rows which failed
+
+    """
+    if geocoder is None:
+        geocoder = ZipGeocoder()
+
+    pickup_zips, dropoff_zips, failed = geocoder.assign_zips(df)
+
+    df = df.loc[~failed].copy()
+    df['pickup_zips'] = pickup_zips[~failed]
+    df['dropoff_zips'] = dropoff_zips[~failed]
+
+    return df, failed
+
+
+def load_zip_set(path=ZIPS_PATH):
+    """Method which loads the zip codes trips are allowed to start and end in
+
+    Args:
+        path(string): json file with a ZipCodes list, or a csv file with
+            pickup_zips and dropoff_zips columns
+
+    Returns:
+           zips(np.array): unique allowed zip codes
+    """
+    if path.endswith('.json'):
+        with open(path) as data_file:
+            return np.unique(json.load(data_file)['ZipCodes'])
+
+    zips = pd.read_csv(path, usecols=['pickup_zips', 'dropoff_zips'])
+    return np.unique(zips[['pickup_zips', 'dropoff_zips']])
+
+
+def filter_zips(df, zips=None):
     """ Method to filter zips codes 
-    
+
+    Args:
+        df(df): Dataframe with pickup_zips and dropoff_zips columns
+        zips(list): allowed zip codes, loaded with load_zip_set if None
     """
-    zips = pd.read_csv('data/zips_manhattan.csv')
-    zips = np.unique(zips[['pickup_zips', 'dropoff_zips']])
+    if zips is None:
+        zips = load_zip_set()
     df = df.loc[df['pickup_zips'].isin(zips)]
     df = df.loc[df['dropoff_zips'].isin(zips)]
     return df
@@ -81,4 +151,43 @@ def clean_columns(data):
     dropoff_longitude = None
     
     return data
-  
+
+
+def clean_csv(input_paths, output_path, geocoder=None, zips=None,
+              chunksize=CHUNK_SIZE):
+    """Method which cleans raw trip csvs in bounded size chunks
+
+    Each chunk is read, filtered with clean_columns, geocoded, filtered to
+    the allowed zip codes and appended to the output csv, so peak memory
+    depends on chunksize and not on the size of the input.
+
+    Args:
+        input_paths(list): raw trip csv path or list of paths
+        output_path(string): csv file the cleaned trips are written to
+        geocoder(ZipGeocoder): geocoder to reuse, one is built if None
+        zips(list): allowed zip codes, ordered zip codes are used if None
+        chunksize(int): number of raw rows read at a time
+
+    Returns:
+           n_rows(int): number of cleaned rows written
+    """
+    if isinstance(input_paths, str):
+        input_paths = [input_paths]
+    if geocoder is None:
+        geocoder = ZipGeocoder()
+    if zips is None:
+        zips = load_zip_set(ZIP_CODES_PATH)
+
+    n_rows = 0
+    for path in input_paths:
+        for chunk in pd.read_csv(path, chunksize=chunksize,
+                                 skipinitialspace=True):
+            chunk = clean_columns(chunk)
+            chunk, _ = get_zips(chunk, geocoder)
+            chunk = filter_zips(chunk, zips)
+
+            chunk.to_csv(output_path, mode='a' if n_rows else 'w',
+                         header=not n_rows, index=False)
+            n_rows += len(chunk)
+
+    return n_rows
@@ -0,0 +1,212 @@
+import os
+from collections import OrderedDict
+from multiprocessing import Pool
+import pandas as pd
+import numpy as np
+from src.clean_data_pipeline.zip_geocoder import ZipGeocoder, NO_ZIP
+from src.clean_data_pipeline.zip_raster import ZipRaster
+
+PRECISION = 4
+CACHE_SIZE = 100000
+ENGINE = 'polygon'
+
+# Engine and memo cache of the current worker process
+_engine = None
+_cache = None
+
+
+class CoordinateCache(object):
+    """Bounded least recently used cache of rounded lat/long -> zip code
+
+    Keeps count of hits and misses so the rounding precision can be tuned.
+    """
+
+    def __init__(self, max_size=CACHE_SIZE):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._zips = OrderedDict()
+
+    def get(self, key):
+        """Returns the cached zip code for key or None, marking it as used"""
+        zip_code = self._zips.get(key)
+        if zip_code is not None:
+            self._zips.move_to_end(key)
+        return zip_code
+
+    def put(self, key, zip_code):
+        """Caches a zip code, evicting the least recently used if full"""
+        self._zips[key] = zip_code
+        self._zips.move_to_end(key)
+        if len(self._zips) > self.max_size:
+            self._zips.popitem(last=False)
+
+    def __len__(self):
+        return len(self._zips)
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class UszipcodeEngine(object):
+    """Wraps the uszipcode search engine with the geocoder interface
+
+    A new engine is created for every object rather than shared through
+    calc_zipcodes, so a worker building one in its initializer owns its
+    database connection instead of inheriting the parent's through fork.
+    """
+
+    def __init__(self, radius=10):
+        from uszipcode import ZipcodeSearchEngine
+        self.search = ZipcodeSearchEngine()
+        self.radius = radius
+
+    def geocode(self, lats, lons):
+        """Method which assigns a zip code to each lat/long pair
+
+        Returns:
+            zips(np.array): int zip codes, NO_ZIP where no zip was found
+        """
+        zips = np.full(len(lats), NO_ZIP, dtype=np.int64)
+        for i, (lat, lon) in enumerate(zip(lats, lons)):
+            result = self.search.by_coordinate(lat, lon, radius=self.radius,
+                                               returns=1)
+            if result:
+                zips[i] = int(result[0]['Zipcode'])
+
+        return zips
+
+
+ENGINES = {'polygon': ZipGeocoder,
+           'raster': ZipRaster.load,
+           'uszipcode': UszipcodeEngine}
+
+
+def cached_geocode(lats, lons, engine, cache, precision=PRECISION):
+    """Method which geocodes lat/long pairs through a memo cache
+
+    Coordinates are rounded to precision decimal places, each distinct
+    rounded pair is looked up in the cache and only the misses are passed
+    to the engine, in one batch.
+
+    Args:
+        lats(np.array): latitudes
+        lons(np.array): longitudes
+        engine: object with a geocode(lats, lons) method
+        cache(CoordinateCache): memo cache, hit counts are updated
+        precision(int): decimal places coordinates are rounded to
+
+    Returns:
+           zips(np.array): int zip codes, NO_ZIP where none was found
+    """
+    pairs = np.column_stack([np.round(lats, precision),
+                             np.round(lons, precision)])
+    if not len(pairs):
+        return np.empty(0, dtype=np.int64)
+
+    unique_pairs, inverse = np.unique(pairs, axis=0, return_inverse=True)
+    keys = list(map(tuple, unique_pairs.tolist()))
+    zips = np.empty(len(keys), dtype=np.int64)
+
+    missing = []
+    for i, key in enumerate(keys):
+        zip_code = cache.get(key)
+        if zip_code is None:
+            missing.append(i)
+        else:
+            zips[i] = zip_code
+
+    if missing:
+        zips[missing] = engine.geocode(unique_pairs[missing, 0],
+                                       unique_pairs[missing, 1])
+        for i in missing:
+            cache.put(keys[i], int(zips[i]))
+
+    cache.misses += len(missing)
+    cache.hits += len(pairs) - len(missing)
+
+    return zips[inverse.ravel()]
+
+
+def _init_worker(engine_name, cache_size):
+    """Builds the engine and memo cache of a worker process"""
+    global _engine, _cache
+    _engine = ENGINES[engine_name]()
+    _cache = CoordinateCache(cache_size)
+
+
+def _geocode_shard(args):
+    """Geocodes one shard of coordinates in a worker process
+
+    Returns:
+        pickup_zips, dropoff_zips and (pid, hits, misses) of the worker
+    """
+    coordinates, precision = args
+    pickup_zips = cached_geocode(coordinates[:, 0], coordinates[:, 1],
+                                 _engine, _cache, precision)
+    dropoff_zips = cached_geocode(coordinates[:, 2], coordinates[:, 3],
+                                  _engine, _cache, precision)
+
+    return pickup_zips, dropoff_zips, (os.getpid(), _cache.hits,
+                                       _cache.misses)
+
+
+def parallel_get_zips(df, n_workers=None, engine=ENGINE,
+                      precision=PRECISION, cache_size=CACHE_SIZE,
+                      n_shards=None):
+    """Method which calculates zipcodes for lat/long pairs over a process pool
+
+    The coordinates are split into shards and geocoded by a pool of
+    workers, each with its own engine and memo cache of coordinates
+    rounded to precision decimal places. Rows where the pickup or dropoff
+    could not be assigned a zipcode are dropped.
+
+    Args:
+        df(df): Dataframe containing lat/long pairs
+        n_workers(int): number of worker processes, os.cpu_count() if None
+        engine(string): 'polygon', 'raster' or 'uszipcode'
+        precision(int): decimal places coordinates are rounded to
+        cache_size(int): maximum entries in each worker's cache
+        n_shards(int): number of shards, 4 per worker if None
+
+    Returns:
+           df(df): Dataframe with pickup_zips and dropoff_zips columns
+           failed(np.array): boolean mask over the input rows which failed
+           stats(df): hits, misses and hit_rate of each worker's cache
+    """
+    n_workers = n_workers or os.cpu_count()
+    n_shards = n_shards or 4 * n_workers
+
+    coordinates = df[['pickup_latitude', 'pickup_longitude',
+                      'dropoff_latitude', 'dropoff_longitude']].values
+    shards = [(shard, precision) for shard
+              in np.array_split(coordinates, max(min(n_shards,
+                                                     len(coordinates)), 1))]
+
+    with Pool(n_workers, initializer=_init_worker,
+              initargs=(engine, cache_size)) as pool:
+        results = pool.map(_geocode_shard, shards)
+
+    pickup_zips = np.concatenate([result[0] for result in results])
+    dropoff_zips = np.concatenate([result[1] for result in results])
+    failed = (pickup_zips == NO_ZIP) | (dropoff_zips == NO_ZIP)
+
+    # Cache counters are cumulative, keep the last report of each worker
+    counts = {}
+    for _, _, (pid, hits, misses) in results:
+        previous = counts.get(pid, (0, 0))
+        counts[pid] = max(previous, (hits, misses))
+
+    stats = pd.DataFrame([(pid, hits, misses) for pid, (hits, misses)
+                          in sorted(counts.items())],
+                         columns=['worker', 'hits', 'misses'])
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_rate'] = (stats['hits'] / lookups.where(lookups > 0)).fillna(0)
+
+    df = df.loc[~failed].copy()
+    df['pickup_zips'] = pickup_zips[~failed]
+    df['dropoff_zips'] = dropoff_zips[~failed]
+
+    return df, failed, stats
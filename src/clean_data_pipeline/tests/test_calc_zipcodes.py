@@ -0,0 +1,63 @@
+import unittest
+import os
+import tempfile
+from src.clean_data_pipeline.calc_zipcodes import clean_csv, filter_zips
+from src.clean_data_pipeline.calc_zipcodes import load_zip_set
+from src.clean_data_pipeline.zip_geocoder import ZipGeocoder
+import pandas as pd
+import numpy as np
+
+ZIP_CODES_PATH = 'src/data_preprocess/tests/transition_test_data/'
+ZIP_CODES_PATH += 'DummyZipCodes.json'
+
+
+class CalcZipcodesTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.raw_path = os.path.join(self.directory, 'raw.csv')
+        self.output_path = os.path.join(self.directory, 'clean.csv')
+
+        # 10026 -> 10027, 10027 -> 10026, bad trip time, Brooklyn pickup
+        # and a dropoff in the sea
+        raw_df = pd.DataFrame({
+            'medallion': ['a', 'b', 'c', 'd', 'e'],
+            'trip_time_in_secs': [600, 300, 0, 900, 400],
+            'trip_distance': [1.5, 1.0, 2.0, 3.0, 1.0],
+            'pickup_latitude': [40.803054265, 40.811546722, 40.803054265,
+                                40.665595853, 40.803054265],
+            'pickup_longitude': [-73.953374506, -73.952803161,
+                                 -73.953374506, -73.979805232,
+                                 -73.953374506],
+            'dropoff_latitude': [40.811546722, 40.803054265, 40.811546722,
+                                 40.803054265, 40.75],
+            'dropoff_longitude': [-73.952803161, -73.953374506,
+                                  -73.952803161, -73.953374506, -73.5]})
+        raw_df.to_csv(self.raw_path, index=False)
+
+    def test_load_zip_set_reads_json(self):
+        zips = load_zip_set(ZIP_CODES_PATH)
+        self.assertTrue(np.array_equal(zips, [10026, 10027]))
+
+    def test_filter_zips_uses_given_zips(self):
+        df = pd.DataFrame({'pickup_zips': [10026, 10026, 11215],
+                           'dropoff_zips': [10027, 11215, 10026]})
+
+        filtered = filter_zips(df, [10026, 10027])
+        self.assertTrue(len(filtered) == 1)
+
+    def test_clean_csv_streams_chunks_to_output(self):
+        n_rows = clean_csv(self.raw_path, self.output_path,
+                           geocoder=ZipGeocoder(),
+                           zips=load_zip_set(ZIP_CODES_PATH), chunksize=2)
+
+        clean_df = pd.read_csv(self.output_path)
+
+        self.assertTrue(n_rows == 2)
+        self.assertTrue(clean_df['medallion'].tolist() == ['a', 'b'])
+        self.assertTrue(clean_df['pickup_zips'].tolist() == [10026, 10027])
+        self.assertTrue(clean_df['dropoff_zips'].tolist() == [10027, 10026])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+from src.clean_data_pipeline.parallel_zipcodes import CoordinateCache
+from src.clean_data_pipeline.parallel_zipcodes import cached_geocode
+from src.clean_data_pipeline.parallel_zipcodes import parallel_get_zips
+from src.clean_data_pipeline.zip_geocoder import ZipGeocoder
+import pandas as pd
+import numpy as np
+
+
+class ParallelZipcodesTestCase(unittest.TestCase):
+
+    def test_coordinate_cache_evicts_least_recently_used(self):
+        cache = CoordinateCache(max_size=2)
+        cache.put((1, 1), 10026)
+        cache.put((2, 2), 10027)
+        cache.get((1, 1))
+        cache.put((3, 3), 10030)
+
+        self.assertTrue(len(cache) == 2)
+        self.assertTrue(cache.get((1, 1)) == 10026)
+        self.assertTrue(cache.get((2, 2)) is None)
+
+    def test_cached_geocode_only_looks_up_misses(self):
+        cache = CoordinateCache()
+        geocoder = ZipGeocoder()
+        lats = np.array([40.803054265, 40.80306, 40.811546722])
+        lons = np.array([-73.953374506, -73.95341, -73.952803161])
+
+        zips = cached_geocode(lats, lons, geocoder, cache, precision=4)
+        self.assertTrue(np.array_equal(zips, [10026, 10026, 10027]))
+        self.assertTrue(cache.misses == 2 and cache.hits == 1)
+
+        zips = cached_geocode(lats, lons, geocoder, cache, precision=4)
+        self.assertTrue(np.array_equal(zips, [10026, 10026, 10027]))
+        self.assertTrue(cache.misses == 2 and cache.hits == 4)
+
+    def test_parallel_get_zips_drops_failures_and_reports_hit_rates(self):
+        df = pd.DataFrame({'pickup_latitude': [40.803054265, 40.75] * 10,
+                           'pickup_longitude': [-73.953374506, -73.5] * 10,
+                           'dropoff_latitude': [40.811546722] * 20,
+                           'dropoff_longitude': [-73.952803161] * 20})
+
+        zips_df, failed, stats = parallel_get_zips(df, n_workers=2,
+                                                   n_shards=4)
+
+        self.assertTrue(np.array_equal(failed, [False, True] * 10))
+        self.assertTrue((zips_df['pickup_zips'] == 10026).all())
+        self.assertTrue((zips_df['dropoff_zips'] == 10027).all())
+        self.assertTrue(stats['hits'].sum() + stats['misses'].sum() == 40)
+        self.assertTrue((stats['hit_rate'] > 0).all())
+
+
+if __name__ == '__main__':
+    unittest.main()
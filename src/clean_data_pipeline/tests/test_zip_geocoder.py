@@ -0,0 +1,45 @@
+import unittest
+from src.clean_data_pipeline.zip_geocoder import ZipGeocoder, NO_ZIP
+import pandas as pd
+import numpy as np
+
+
+class ZipGeocoderTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.obj = ZipGeocoder()
+
+    def test_geocode_assigns_correct_zips(self):
+        lats = [40.803054265, 40.811546722, 40.81839353, 40.665595853]
+        lons = [-73.953374506, -73.952803161, -73.94278816, -73.979805232]
+
+        zips = self.obj.geocode(lats, lons)
+        self.assertTrue(np.array_equal(zips, [10026, 10027, 10030, 11215]))
+
+    def test_geocode_outside_polygons_returns_no_zip(self):
+        zips = self.obj.geocode([40.75, np.nan], [-73.5, -73.95])
+        self.assertTrue((zips == NO_ZIP).all())
+
+    def test_zip_codes_filter_ignores_other_polygons(self):
+        obj = ZipGeocoder(zip_codes=[10026])
+        zips = obj.geocode([40.803054265, 40.811546722],
+                           [-73.953374506, -73.952803161])
+
+        self.assertTrue(np.array_equal(zips, [10026, NO_ZIP]))
+
+    def test_assign_zips_reports_failures_as_mask(self):
+        df = pd.DataFrame({'pickup_latitude': [40.803054265, 40.75],
+                           'pickup_longitude': [-73.953374506, -73.5],
+                           'dropoff_latitude': [40.811546722, 40.81839353],
+                           'dropoff_longitude': [-73.952803161,
+                                                 -73.94278816]})
+
+        pickup_zips, dropoff_zips, failed = self.obj.assign_zips(df)
+
+        self.assertTrue(pickup_zips[0] == 10026)
+        self.assertTrue(np.array_equal(dropoff_zips, [10027, 10030]))
+        self.assertTrue(np.array_equal(failed, [False, True]))
+
+
+if __name__ == '__main__':
+    unittest.main()
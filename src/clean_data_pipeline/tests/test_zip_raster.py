@@ -0,0 +1,52 @@
+import unittest
+import os
+import tempfile
+from src.clean_data_pipeline.zip_raster import ZipRaster, NO_ZIP_INDEX
+from src.clean_data_pipeline.zip_geocoder import ZipGeocoder, NO_ZIP
+import numpy as np
+
+RESOLUTION = 0.0005
+
+
+class ZipRasterTestCase(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.obj = ZipRaster.build(resolution=RESOLUTION)
+
+    def test_lookup_returns_ordered_zip_indexes(self):
+        lats = [40.803054265, 40.811546722, 40.665595853]
+        lons = [-73.953374506, -73.952803161, -73.979805232]
+
+        indexes = self.obj.lookup(lats, lons)
+
+        self.assertTrue(self.obj.zip_codes[indexes[0]] == 10026)
+        self.assertTrue(self.obj.zip_codes[indexes[1]] == 10027)
+        # 11215 is in Brooklyn so not one of the ordered zip codes
+        self.assertTrue(indexes[2] == NO_ZIP_INDEX)
+
+    def test_geocode_matches_polygon_geocoder(self):
+        random_state = np.random.RandomState(2)
+        lats = random_state.uniform(40.69, 40.89, 20000)
+        lons = random_state.uniform(-74.03, -73.90, 20000)
+        geocoder = ZipGeocoder(zip_codes=self.obj.zip_codes)
+
+        zips = self.obj.geocode(lats, lons)
+
+        self.assertTrue(np.array_equal(zips, geocoder.geocode(lats, lons)))
+        self.assertTrue((zips != NO_ZIP).any())
+
+    def test_saved_and_loaded_rasters_are_equal(self):
+        path = os.path.join(tempfile.mkdtemp(), 'zip_raster.npy')
+        self.obj.save(path)
+
+        loaded = ZipRaster.load(path)
+
+        self.assertTrue(isinstance(loaded.grid, np.memmap))
+        self.assertTrue(np.array_equal(loaded.grid, self.obj.grid))
+        self.assertTrue(np.array_equal(loaded.zip_codes, self.obj.zip_codes))
+        self.assertTrue(loaded.resolution == RESOLUTION)
+
+
+if __name__ == '__main__':
+    unittest.main()
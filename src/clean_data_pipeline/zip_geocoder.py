@@ -0,0 +1,200 @@
+import json
+import numpy as np
+
+GEOJSON_PATH = 'notebooks/geojson/zip_codes.geojson'
+CELL_SIZE = 0.01
+NO_ZIP = 0
+
+
+class ZipGeocoder(object):
+    """Class which assigns zipcodes to lat/long pairs using zip polygons
+
+    The zip code polygons are loaded once from a geojson file and a uniform
+    grid spatial index is built over their bounding boxes. Whole arrays of
+    coordinates are then assigned to zip codes in one pass, each polygon
+    only testing the points which fall inside the grid cells it covers.
+
+    """
+
+    def __init__(self, geojson_path=GEOJSON_PATH, zip_codes=None,
+                 cell_size=CELL_SIZE):
+        """
+            Args:
+                geojson_path: path to geojson file containing zip polygons
+                zip_codes: optional list of zip codes, if given polygons of
+                    any other zip code are ignored
+                cell_size: size of the spatial index grid cells in degrees
+
+            Attr:
+                polygon_zips: numpy array with the zip code of each polygon
+                rings: list containing the (n, 2) lon/lat rings of each
+                    polygon, the first ring is the exterior, the rest holes
+                bounds: numpy array of (min_lon, min_lat, max_lon, max_lat)
+                    for each polygon
+        """
+        with open(geojson_path) as data_file:
+            features = json.load(data_file)['features']
+
+        if zip_codes is not None:
+            zip_codes = set(int(zip_code) for zip_code in zip_codes)
+
+        # Building zip codes sit inside area zip codes, test them last so
+        # points are given the zip code of the surrounding area
+        features = sorted(features,
+                          key=lambda feature: feature['properties'].get(
+                              'BLDGpostal', 0))
+
+        polygon_zips = []
+        self.rings = []
+        for feature in features:
+            zip_code = int(feature['properties']['postalCode'])
+            if zip_codes is not None and zip_code not in zip_codes:
+                continue
+
+            geometry = feature['geometry']
+            if geometry['type'] == 'Polygon':
+                polygons = [geometry['coordinates']]
+            else:
+                polygons = geometry['coordinates']
+
+            for polygon in polygons:
+                polygon_zips.append(zip_code)
+                self.rings.append([np.array(ring, dtype=float)
+                                   for ring in polygon])
+
+        self.polygon_zips = np.array(polygon_zips, dtype=np.int64)
+        self.bounds = np.array([[ring[0][:, 0].min(), ring[0][:, 1].min(),
+                                 ring[0][:, 0].max(), ring[0][:, 1].max()]
+                                for ring in self.rings]).reshape(-1, 4)
+        self._build_index(cell_size)
+
+    def _build_index(self, cell_size):
+        """Method which builds the uniform grid spatial index
+
+        Each polygon is given the range of grid rows and columns its bounding
+        box covers, so candidate points can be sliced out of a cell-sorted
+        point array with searchsorted.
+
+        Args:
+            cell_size(float): size of the grid cells in degrees
+        """
+        self.cell_size = cell_size
+        if len(self.bounds):
+            self.min_lon, self.min_lat = self.bounds[:, :2].min(axis=0)
+            max_lon, max_lat = self.bounds[:, 2:].max(axis=0)
+        else:
+            self.min_lon = self.min_lat = max_lon = max_lat = 0.0
+
+        self.n_cols = int((max_lon - self.min_lon) // cell_size) + 1
+        self.n_rows = int((max_lat - self.min_lat) // cell_size) + 1
+
+        self.polygon_cells = np.empty((len(self.bounds), 4), dtype=np.int64)
+        self.polygon_cells[:, 0] = ((self.bounds[:, 1] - self.min_lat)
+                                    // cell_size)
+        self.polygon_cells[:, 1] = ((self.bounds[:, 3] - self.min_lat)
+                                    // cell_size)
+        self.polygon_cells[:, 2] = ((self.bounds[:, 0] - self.min_lon)
+                                    // cell_size)
+        self.polygon_cells[:, 3] = ((self.bounds[:, 2] - self.min_lon)
+                                    // cell_size)
+
+    def _cell_ids(self, lats, lons):
+        """Method which finds the grid cell of each point, -1 if outside"""
+        rows = np.floor((lats - self.min_lat) / self.cell_size)
+        cols = np.floor((lons - self.min_lon) / self.cell_size)
+        outside = ~((rows >= 0) & (rows < self.n_rows) &
+                    (cols >= 0) & (cols < self.n_cols))
+
+        rows[outside] = 0
+        cols[outside] = 0
+        cells = rows.astype(np.int64) * self.n_cols + cols.astype(np.int64)
+        cells[outside] = -1
+
+        return cells
+
+    def _contains(self, polygon_index, lons, lats):
+        """Method which tests points against one polygon (even-odd rule)
+
+        Args:
+            polygon_index(int): index of the polygon to test against
+            lons(np.array): point longitudes
+            lats(np.array): point latitudes
+
+        Returns:
+            inside(np.array): boolean mask, True if the point is inside
+        """
+        inside = np.zeros(len(lons), dtype=bool)
+        for ring in self.rings[polygon_index]:
+            next_ring = np.roll(ring, -1, axis=0)
+            for (x_i, y_i), (x_j, y_j) in zip(ring, next_ring):
+                # Horizontal edges can never be crossed by the ray
+                if y_i == y_j:
+                    continue
+                crosses = ((y_i > lats) != (y_j > lats))
+                crosses &= (lons < (x_j - x_i) * (lats - y_i) /
+                            (y_j - y_i) + x_i)
+                inside ^= crosses
+
+        return inside
+
+    def geocode(self, lats, lons):
+        """Method which assigns a zip code to each lat/long pair
+
+        Points are sorted by grid cell once, each polygon then slices out
+        the points in the cells covered by its bounding box and runs an
+        exact point in polygon test on those not already assigned.
+
+        Args:
+            lats(array like): latitudes
+            lons(array like): longitudes
+
+        Returns:
+            zips(np.array): int zip codes, NO_ZIP where no polygon matched
+        """
+        lats = np.asarray(lats, dtype=float)
+        lons = np.asarray(lons, dtype=float)
+        zips = np.full(len(lats), NO_ZIP, dtype=np.int64)
+
+        cells = self._cell_ids(lats, lons)
+        order = np.argsort(cells, kind='stable')
+        sorted_cells = cells[order]
+
+        for polygon_index, cell_range in enumerate(self.polygon_cells):
+            row_0, row_1, col_0, col_1 = cell_range
+            row_starts = np.arange(row_0, row_1 + 1) * self.n_cols
+            starts = np.searchsorted(sorted_cells, row_starts + col_0,
+                                     side='left')
+            ends = np.searchsorted(sorted_cells, row_starts + col_1,
+                                   side='right')
+            candidates = np.concatenate([order[start:end] for start, end
+                                         in zip(starts, ends)])
+            candidates = candidates[zips[candidates] == NO_ZIP]
+
+            if not len(candidates):
+                continue
+
+            inside = self._contains(polygon_index, lons[candidates],
+                                    lats[candidates])
+            zips[candidates[inside]] = self.polygon_zips[polygon_index]
+
+        return zips
+
+    def assign_zips(self, df):
+        """Method which calculates zipcodes for pickup and dropoff lat/longs
+
+        Args:
+            df(df): Dataframe containing pickup and dropoff lat/long pairs
+
+        Returns:
+            pickup_zips(np.array): pickup zipcode for each row
+            dropoff_zips(np.array): dropoff zipcode for each row
+            failed(np.array): boolean mask of rows where either the pickup
+                or the dropoff could not be assigned a zipcode
+        """
+        pickup_zips = self.geocode(df['pickup_latitude'].values,
+                                   df['pickup_longitude'].values)
+        dropoff_zips = self.geocode(df['dropoff_latitude'].values,
+                                    df['dropoff_longitude'].values)
+        failed = (pickup_zips == NO_ZIP) | (dropoff_zips == NO_ZIP)
+
+        return pickup_zips, dropoff_zips, failed
@@ -0,0 +1,278 @@
+import os
+import sys
+sys.path.append(os.getcwd())
+import json
+import numpy as np
+from src.clean_data_pipeline.zip_geocoder import ZipGeocoder, GEOJSON_PATH
+from src.clean_data_pipeline.zip_geocoder import NO_ZIP
+from src.tools.tools import zip_code_indexes
+
+ZIP_CODES_PATH = 'data/OrderedZipCodes.json'
+RASTER_PATH = 'data/zip_raster.npy'
+# (min_lat, max_lat, min_long, max_long) used by calc_zipcodes.clean_columns
+BOUNDS = (40.459518, 41.175342, -74.361107, -71.903083)
+RESOLUTION = 0.0002
+NO_ZIP_INDEX = -1
+BOUNDARY = -2
+
+
+class ZipRaster(object):
+    """Class which maps lat/longs to zip code indexes with a lookup grid
+
+    The bounding box is divided into fixed size cells, each holding the
+    index of its zip code in OrderedZipCodes.json, NO_ZIP_INDEX when no
+    ordered zip code covers it or BOUNDARY when a polygon edge crosses it.
+    Looking up a point is then a floor divide and an array gather, only
+    points in BOUNDARY cells fall back to an exact polygon test.
+
+    The grid is saved as a .npy file with a .json file of metadata next to
+    it, so it can be loaded memory mapped and shared between workers.
+    """
+
+    def __init__(self, grid, zip_codes, bounds=BOUNDS, resolution=RESOLUTION,
+                 geojson_path=GEOJSON_PATH):
+        """
+            Args:
+                grid: 2d array of zip indexes, rows are latitude cells and
+                    columns longitude cells
+                zip_codes: ordered list of zip codes the indexes refer to
+                bounds: (min_lat, max_lat, min_long, max_long) of the grid
+                resolution: cell size in degrees
+                geojson_path: path to the zip polygons used for boundary
+                    cells
+        """
+        self.grid = grid
+        self.zip_codes = np.array(zip_codes, dtype=np.int64)
+        self.bounds = tuple(float(bound) for bound in bounds)
+        self.resolution = float(resolution)
+        self.geojson_path = geojson_path
+        self._geocoder = None
+
+    @property
+    def geocoder(self):
+        """Polygon geocoder for boundary cells, only built when needed"""
+        if self._geocoder is None:
+            self._geocoder = ZipGeocoder(self.geojson_path,
+                                         zip_codes=self.zip_codes)
+        return self._geocoder
+
+    @classmethod
+    def build(cls, geojson_path=GEOJSON_PATH, zip_codes_path=ZIP_CODES_PATH,
+              bounds=BOUNDS, resolution=RESOLUTION):
+        """Method which rasterises the zip polygons into a lookup grid
+
+        Polygon edges are sampled at half the cell size and every cell a
+        sample falls in is marked as a boundary. Consecutive samples lie in
+        the same or neighbouring cells, when they are diagonal neighbours
+        both cells sharing their corner are marked too, so no cell an edge
+        passes through is missed. Every other cell lies wholly inside one
+        zip code (or none) and is classified by its centre.
+
+        Args:
+            geojson_path: path to geojson file containing zip polygons
+            zip_codes_path: path to json file with ordered zip codes
+            bounds: (min_lat, max_lat, min_long, max_long) of the grid
+            resolution: cell size in degrees
+
+        Returns:
+            ZipRaster built from the polygons
+        """
+        with open(zip_codes_path) as data_file:
+            zip_codes = json.load(data_file)['ZipCodes']
+
+        n_rows, n_cols = _grid_shape(bounds, resolution)
+        dtype = np.int8 if len(zip_codes) < 127 else np.int16
+        grid = np.full((n_rows, n_cols), NO_ZIP_INDEX, dtype=dtype)
+        raster = cls(grid, zip_codes, bounds, resolution, geojson_path)
+        min_lat, _, min_long, _ = raster.bounds
+
+        geocoder = raster.geocoder
+        boundary = np.zeros((n_rows, n_cols), dtype=bool)
+        for rings in geocoder.rings:
+            for ring in rings:
+                points = _sample_ring(ring, resolution / 2)
+                rows, cols, inside = raster._cells(points[:, 1],
+                                                   points[:, 0])
+                boundary[rows[inside], cols[inside]] = True
+
+                diagonal = ((rows[:-1] != rows[1:]) &
+                            (cols[:-1] != cols[1:]) &
+                            inside[:-1] & inside[1:])
+                boundary[rows[:-1][diagonal], cols[1:][diagonal]] = True
+                boundary[rows[1:][diagonal], cols[:-1][diagonal]] = True
+
+        # Only cells inside the polygons bounding boxes can hold a zip
+        if len(geocoder.bounds):
+            lowest, highest = geocoder.bounds.min(0), geocoder.bounds.max(0)
+            row_0 = max(int((lowest[1] - min_lat) // resolution), 0)
+            row_1 = min(int((highest[3] - min_lat) // resolution) + 1,
+                        n_rows)
+            col_0 = max(int((lowest[0] - min_long) // resolution), 0)
+            col_1 = min(int((highest[2] - min_long) // resolution) + 1,
+                        n_cols)
+
+            rows, cols = np.mgrid[row_0:row_1, col_0:col_1]
+            lats = min_lat + (rows.ravel() + 0.5) * resolution
+            longs = min_long + (cols.ravel() + 0.5) * resolution
+            grid[row_0:row_1, col_0:col_1] = raster._zip_indexes(
+                geocoder.geocode(lats, longs)).reshape(rows.shape)
+
+        grid[boundary] = BOUNDARY
+
+        return raster
+
+    def save(self, path=RASTER_PATH):
+        """Method which saves the grid and its metadata
+
+        Args:
+            path: path of the .npy grid, metadata is saved to a .json file
+                with the same name
+        """
+        np.save(path, self.grid)
+        metadata = {'ZipCodes': self.zip_codes.tolist(),
+                    'bounds': list(self.bounds),
+                    'resolution': self.resolution,
+                    'geojson_path': self.geojson_path}
+
+        with open(_metadata_path(path), 'w') as data_file:
+            json.dump(metadata, data_file)
+
+    @classmethod
+    def load(cls, path=RASTER_PATH, mmap_mode='r'):
+        """Method which loads a saved grid, memory mapped by default
+
+        Args:
+            path: path of the .npy grid
+            mmap_mode: passed to np.load, None reads the grid into memory
+
+        Returns:
+            ZipRaster
+        """
+        with open(_metadata_path(path)) as data_file:
+            metadata = json.load(data_file)
+
+        grid = np.load(path, mmap_mode=mmap_mode)
+        return cls(grid, metadata['ZipCodes'], metadata['bounds'],
+                   metadata['resolution'], metadata['geojson_path'])
+
+    def _cells(self, lats, lons):
+        """Method which finds the grid row and column of each point
+
+        Returns:
+            rows(np.array): row of each point
+            cols(np.array): column of each point
+            inside(np.array): boolean mask, False if outside the grid
+        """
+        min_lat, _, min_long, _ = self.bounds
+        n_rows, n_cols = self.grid.shape
+
+        rows = np.floor((lats - min_lat) / self.resolution)
+        cols = np.floor((lons - min_long) / self.resolution)
+        inside = ((rows >= 0) & (rows < n_rows) &
+                  (cols >= 0) & (cols < n_cols))
+
+        rows = np.where(inside, rows, 0).astype(np.int64)
+        cols = np.where(inside, cols, 0).astype(np.int64)
+
+        return rows, cols, inside
+
+    def _zip_indexes(self, zips):
+        """Method which converts zip codes to indexes, NO_ZIP_INDEX if none"""
+        # zip_code_indexes marks missing zips with -1, i.e. NO_ZIP_INDEX
+        return zip_code_indexes(zips, self.zip_codes)
+
+    def lookup(self, lats, lons):
+        """Method which finds the zip code index of each lat/long pair
+
+        Args:
+            lats(array like): latitudes
+            lons(array like): longitudes
+
+        Returns:
+            indexes(np.array): index into zip_codes, NO_ZIP_INDEX where no
+                ordered zip code covers the point
+        """
+        lats = np.asarray(lats, dtype=float)
+        lons = np.asarray(lons, dtype=float)
+
+        rows, cols, inside = self._cells(lats, lons)
+        indexes = np.where(inside, self.grid[rows, cols],
+                           NO_ZIP_INDEX).astype(np.int64)
+
+        boundary = indexes == BOUNDARY
+        if boundary.any():
+            zips = self.geocoder.geocode(lats[boundary], lons[boundary])
+            indexes[boundary] = self._zip_indexes(zips)
+
+        return indexes
+
+    def geocode(self, lats, lons):
+        """Method which assigns a zip code to each lat/long pair
+
+        Same interface as ZipGeocoder.geocode, so either can be used to
+        clean the data.
+
+        Returns:
+            zips(np.array): int zip codes, NO_ZIP where no polygon matched
+        """
+        indexes = self.lookup(lats, lons)
+        return np.where(indexes == NO_ZIP_INDEX, NO_ZIP,
+                        self.zip_codes[indexes])
+
+    def assign_zips(self, df):
+        """Method which calculates zipcodes for pickup and dropoff lat/longs
+
+        Args:
+            df(df): Dataframe containing pickup and dropoff lat/long pairs
+
+        Returns:
+            pickup_zips(np.array): pickup zipcode for each row
+            dropoff_zips(np.array): dropoff zipcode for each row
+            failed(np.array): boolean mask of rows where either the pickup
+                or the dropoff could not be assigned a zipcode
+        """
+        pickup_zips = self.geocode(df['pickup_latitude'].values,
+                                   df['pickup_longitude'].values)
+        dropoff_zips = self.geocode(df['dropoff_latitude'].values,
+                                    df['dropoff_longitude'].values)
+        failed = (pickup_zips == NO_ZIP) | (dropoff_zips == NO_ZIP)
+
+        return pickup_zips, dropoff_zips, failed
+
+
+def _sample_ring(ring, step):
+    """Method which returns points along a closed ring no more than step
+    apart, the first point is repeated at the end"""
+    next_ring = np.roll(ring, -1, axis=0)
+    lengths = np.hypot(*(next_ring - ring).T)
+    n_samples = np.maximum(np.ceil(lengths / step).astype(np.int64), 1)
+
+    starts = np.repeat(ring, n_samples, axis=0)
+    deltas = np.repeat(next_ring - ring, n_samples, axis=0)
+    offsets = np.arange(n_samples.sum()) - np.repeat(
+        np.cumsum(n_samples) - n_samples, n_samples)
+    fractions = offsets / np.repeat(n_samples, n_samples)
+
+    points = starts + deltas * fractions[:, np.newaxis]
+    return np.vstack([points, ring[:1]])
+
+
+def _grid_shape(bounds, resolution):
+    """Method which returns the (rows, columns) needed to cover bounds"""
+    min_lat, max_lat, min_long, max_long = bounds
+    return (int(np.ceil((max_lat - min_lat) / resolution)),
+            int(np.ceil((max_long - min_long) / resolution)))
+
+
+def _metadata_path(path):
+    """Method which returns the metadata path for a saved grid"""
+    return os.path.splitext(path)[0] + '.json'
+
+
+def build_zip_raster(path=RASTER_PATH):
+    """Method which builds the lookup grid and saves it to path"""
+    ZipRaster.build().save(path)
+
+
+if __name__ == "__main__":
+    build_zip_raster()
@@ -8,11 +8,17 @@ Created on Tue Aug  8 09:59:09 2017
 
 import pandas as pd
 import numpy as np
-from src.tools.tools import unpickle, map_to_period, find_df_period, pickle_obj
+from src.tools.tools import map_to_period, with_df_period
+from src.tools.tools import zip_period_array
+from src.tools.trip_store import load_trips
+from src.tools.artifacts import load_artifact
+from src.tools.array_store import align_zip_array
 
 TIME_PERIODS = 6
 DF_PATH = 'data/zips_manhattan.csv'
 FARE_PATH = 'data/pickled_objects/average_fare_df.pkl'
+COLUMNS = ['pickup_zips', 'dropoff_zips', 'pickup_datetime',
+           'dropoff_datetime', 'fare_amount']
 
 
 class CalculateFare(object):
@@ -21,19 +27,75 @@ class CalculateFare(object):
     """
 
     def __init__(self, load_data=True, time_periods=TIME_PERIODS,
-                 df_path=DF_PATH, fare_path=FARE_PATH):
+                 df_path=DF_PATH, fare_path=FARE_PATH, df=None):
+        """
+            Args:
+                load_data: load the preprocessed fares (True) or the trips
+                    to calculate them from (False)
+                df: trips to use instead of loading df_path, e.g. a frame
+                    shared with the other preprocessing stages
+        """
 
+        self.time_periods = time_periods
         if not load_data:
-            self.df = pd.read_csv(df_path, skipinitialspace=True)
-            self.df = self.df.sort_values(['pickup_zips', 'dropoff_zips'],
-                                          ascending=[1, 1])
+            if df is None:
+                df = load_trips(df_path, COLUMNS)
+                df = df.sort_values(['pickup_zips', 'dropoff_zips'],
+                                    ascending=[1, 1])
+            self.df = df
+
+        else:
+            self.fare_df = load_artifact(fare_path)
+            self.build_lookup()
+
+    @classmethod
+    def from_arrays(cls, zip_codes, average_fares):
+        """Method which builds the lookup from an array store's arrays
+
+        There is no fare_df, so return_average_fare is not available.
+        The number of time periods is the length of the arrays' first
+        axis.
+
+        Args:
+            zip_codes(array like): zip codes indexing the arrays
+            average_fares(np.array): (time_period, zip) average fares
+
+        Returns:
+            CalculateFare
+        """
+        obj = cls.__new__(cls)
+        obj.fare_df = None
+        obj.time_periods = len(average_fares)
+        obj.array_zip_codes = np.asarray(zip_codes)
+        obj.array_fares = average_fares
+        obj.build_lookup()
 
-            self.df.dropoff_datetime = pd.to_datetime(self.df.dropoff_datetime)
-            self.df.pickup_datetime = pd.to_datetime(self.df.pickup_datetime)
-            self.time_periods = time_periods
+        return obj
 
+    def build_lookup(self, zip_codes=None):
+        """Method which builds the array of average fares
+
+        The mean fares in fare_df are held in a contiguous (time_period,
+        zip index) array. Call again if fare_df is replaced.
+
+        Args:
+            zip_codes(array like): zip codes in the order of the zip index,
+                e.g. to share indexes with Transition.zip_codes. Defaults to
+                the sorted zips of fare_df, or the array store's zip codes
+        """
+        if self.fare_df is None:
+            if zip_codes is None:
+                zip_codes = self.array_zip_codes
+            self.average_fares = align_zip_array(
+                self.array_fares, self.array_zip_codes, zip_codes, [1])
         else:
-            self.fare_df = unpickle(fare_path)
+            if zip_codes is None:
+                zip_codes = np.unique(self.fare_df['pickup_zips'])
+            self.average_fares = zip_period_array(
+                self.fare_df, ['pickup_zips'], 'mean_zone_fare', zip_codes,
+                self.time_periods)
+
+        self.zip_codes = np.asarray(zip_codes)
 
     @staticmethod
     def _calc_average_zip_fare(df, pickle_path, time_periods):
@@ -47,7 +109,7 @@ class CalculateFare(object):
 
         """
         p_zips = np.unique(df[['pickup_zips', 'dropoff_zips']])
-        df = find_df_period(df, 'pickup_datetime', time_periods)
+        df = with_df_period(df, 'pickup_datetime', time_periods)
         fare_amounts = []
         pickup_zips = []
         time_period_lst = []
@@ -85,8 +147,19 @@ class CalculateFare(object):
 
         """
         df = self.fare_df
-        time_period = map_to_period(datetime, TIME_PERIODS)
+        time_period = map_to_period(datetime, self.time_periods)
         df = df[df['time_period'] == time_period]
         dct = df.set_index('pickup_zips').T.to_dict('records')[0]
 
         return dct
+
+    def average_fare_vector(self, time_period):
+        """Method given a time period returns the average fare of each zip
+
+        Args:
+            time_period(int): index of the time period of the day
+
+        Returns:
+            average_fares(np.array): average fare aligned to zip_codes
+        """
+        return self.average_fares[time_period]
@@ -6,12 +6,18 @@ Created on Fri Jul 14 11:12:49 2017
 """
 import pandas as pd
 import numpy as np
-from src.tools.tools import unpickle, subset_variables, map_to_period
-from src.tools.tools import find_df_period, pickle_obj
+from src.tools.tools import subset_variables, map_to_period
+from src.tools.tools import with_df_period, minute_period_table
+from src.tools.tools import zip_period_array
+from src.tools.trip_store import load_trips
+from src.tools.artifacts import load_artifact
+from src.tools.array_store import align_zip_array
 
 TIME_PERIODS = 6
 DF_PATH = 'data/zips_manhattan.csv'
 SEARCH_PATH = 'data/pickled_objects/wait_df.pkl'
+COLUMNS = ['medallion', 'pickup_zips', 'dropoff_zips', 'pickup_datetime',
+           'dropoff_datetime']
 
 
 class CalculateSearchTimes(object):
@@ -20,22 +26,82 @@ class CalculateSearchTimes(object):
     """
 
     def __init__(self, load_data=True, time_periods=TIME_PERIODS,
-                 search_path=SEARCH_PATH, df_path=DF_PATH):
+                 search_path=SEARCH_PATH, df_path=DF_PATH, df=None):
+        """
+            Args:
+                load_data: load the preprocessed wait times (True) or the
+                    trips to calculate them from (False)
+                df: trips to use instead of loading df_path, e.g. a frame
+                    shared with the other preprocessing stages
+        """
 
+        self.time_periods = time_periods
         if not load_data:
-            self.df = pd.read_csv(df_path, skipinitialspace=True)
-            self.df = subset_variables(self.df, ['medallion', 'pickup_zips',
-                                                 'dropoff_zips',
-                                                 'pickup_datetime',
-                                                 'dropoff_datetime'])
+            if df is None:
+                df = load_trips(df_path, COLUMNS)
+                df = subset_variables(df, COLUMNS)
+            self.df = df
 
             self.zips = np.unique(self.df[['pickup_zips', 'dropoff_zips']])
-            self.df.dropoff_datetime = pd.to_datetime(self.df.dropoff_datetime)
-            self.df.pickup_datetime = pd.to_datetime(self.df.pickup_datetime)
             self.path = search_path
 
         else:
-            self.search_df = unpickle(search_path)
+            self.search_df = load_artifact(search_path)
+            self.build_lookup()
+
+    @classmethod
+    def from_arrays(cls, zip_codes, average_waits):
+        """Method which builds the lookups from an array store's arrays
+
+        There is no search_df, so the dictionary methods are not available.
+        The number of time periods is the length of the arrays' first
+        axis.
+
+        Args:
+            zip_codes(array like): zip codes indexing the arrays
+            average_waits(np.array): (time_period, zip) average waits
+
+        Returns:
+            CalculateSearchTimes
+        """
+        obj = cls.__new__(cls)
+        obj.search_df = None
+        obj.time_periods = len(average_waits)
+        obj.array_zip_codes = np.asarray(zip_codes)
+        obj.array_waits = average_waits
+        obj.build_lookup()
+
+        return obj
+
+    def build_lookup(self, zip_codes=None):
+        """Method which builds the arrays the simulate methods look up
+
+        The average waits in search_df are held in a contiguous
+        (time_period, zip index) array with a zip -> index dictionary, so a
+        lookup is two indexes rather than filtering search_df. Call again
+        if search_df is replaced.
+
+        Args:
+            zip_codes(array like): zip codes in the order of the zip index,
+                e.g. to share indexes with Transition.zip_codes. Defaults to
+                the sorted zips of search_df, or the array store's zip codes
+        """
+        if self.search_df is None:
+            if zip_codes is None:
+                zip_codes = self.array_zip_codes
+            self.average_waits = align_zip_array(
+                self.array_waits, self.array_zip_codes, zip_codes, [1])
+        else:
+            if zip_codes is None:
+                zip_codes = np.unique(self.search_df['zips'])
+            self.average_waits = zip_period_array(
+                self.search_df, ['zips'], 'average_wait', zip_codes,
+                self.time_periods)
+
+        self.zip_codes = np.asarray(zip_codes)
+        self.zip_index = {zip_code: index for index, zip_code
+                          in enumerate(self.zip_codes.tolist())}
+        self.period_table = minute_period_table(self.time_periods).tolist()
 
     @staticmethod
     def _calc_search_time(df, pickle_path, zips, max_wait_time, time_periods):
@@ -43,7 +109,8 @@ class CalculateSearchTimes(object):
 
         Method calculates waittime, by grouping by medallion number and
         finding instances where drivers dropped someone off and had their next
-        pickup in the same zone.
+        pickup in the same zone. The trips are sorted by medallion and pickup
+        time once and the searches are aggregated in a single groupby.
 
         Args:
             df(df): Dataframe to calculate wait times for
@@ -65,42 +132,34 @@ class CalculateSearchTimes(object):
                                 'total_wait': np.zeros(final_df_length),
                                 'observations': np.zeros(final_df_length)})
 
-        subset_df = df.copy()
-        unique_medallions = np.unique(subset_df['medallion'])
-
-        # For each driver shift df, so dropoff followed by pickup is found.
-        for medallion in unique_medallions:
-            med_df = subset_df.copy()
-            med_df = subset_df[subset_df['medallion'] == medallion]
-            med_df = med_df.sort_values(by='pickup_datetime')
-            med_df.dropoff_zips = med_df.dropoff_zips.shift(1)
-            med_df['backtime'] = med_df.dropoff_datetime.shift(1)
-            med_df['backtime'] = pd.to_datetime(med_df['backtime'])
-            med_df = med_df.fillna(0)
-            med_df['diff'] = med_df.pickup_datetime - med_df.backtime
-            med_df['diff'] = med_df['diff'].dt.total_seconds()
-            med_df = med_df[(med_df['pickup_zips'] == med_df['dropoff_zips'])]
-            med_df = med_df[(med_df['diff'] <= max_wait_time)]
-            med_df = find_df_period(med_df, 'pickup_datetime', time_periods)
-            unique_zips = np.unique(med_df['pickup_zips'])
-
-            # For each dropoff/pickup find zone count, and total wait
-            for zips in unique_zips:
-                zip_df = med_df[med_df['pickup_zips'] == zips]
-                unique_periods = np.unique(zip_df['time_period'])
-
-            # For each time-period add the total wait and the observations
-                for period in unique_periods:
-                    period_df = zip_df[zip_df['time_period'] == period]
-                    total_sum = zip_df['diff'].sum()
-                    obs = len(period_df)
-                    index = wait_df.loc[(wait_df['zips'] == zips) &
-                                        (wait_df['time_period'] == period)]
-                    row_to_update = index.index
-                    total_wait_sum = index['total_wait'] + total_sum
-                    total_obs = index['observations'] + obs
-                    wait_df.loc[row_to_update, 'total_wait'] = total_wait_sum
-                    wait_df.loc[row_to_update, 'observations'] = total_obs
+        # Sort once so each driver's trips are consecutive and in order,
+        # a trip is a search if the previous trip was by the same driver and
+        # dropped off in the zone this one picks up from
+        df = with_df_period(df, 'pickup_datetime', time_periods)
+        df = df.sort_values(['medallion', 'pickup_datetime'], kind='mergesort')
+
+        medallions = pd.factorize(df['medallion'])[0]
+        pickup_zips = df['pickup_zips'].values
+        dropoff_zips = df['dropoff_zips'].values
+        periods = df['time_period'].values
+        wait = ((df['pickup_datetime'].values[1:] -
+                 df['dropoff_datetime'].values[:-1]) / np.timedelta64(1, 's'))
+
+        searches = ((medallions[1:] == medallions[:-1]) &
+                    (pickup_zips[1:] == dropoff_zips[:-1]) &
+                    (wait <= max_wait_time))
+
+        search_df = pd.DataFrame({'zips': pickup_zips[1:][searches],
+                                  'time_period': periods[1:][searches],
+                                  'wait': wait[searches]})
+
+        # Total wait and observations for each zone and time-period
+        totals = search_df.groupby(['zips', 'time_period'])['wait'].agg(
+            ['sum', 'count'])
+        totals = totals.reindex(pd.MultiIndex.from_arrays(
+            [wait_df['zips'], wait_df['time_period']])).fillna(0)
+        wait_df['total_wait'] = totals['sum'].values
+        wait_df['observations'] = totals['count'].values.astype(float)
 
         # Avoid division by zero if there are no obs, replace NaN with zero
         if wait_df['observations'].any() == 0:
@@ -122,13 +181,31 @@ class CalculateSearchTimes(object):
             pickup_zip(int): Pickup Zipcode to find average waittime for
             datetime(datetime): The datetime to find the period for
         """
-        df = self.search_df
-        time_period = map_to_period(datetime, TIME_PERIODS)
-        index = df.loc[(df['zips'] == pickup_zip) &
-                       (df['time_period'] == time_period)]
+        # Midnight (period -1) looks up the last period of the day
+        time_period = self.period_table[datetime.hour * 60 + datetime.minute]
+        return self.simulate_search_in_period(pickup_zip, time_period)
 
-        wait_time = float(index['average_wait'])
-        return wait_time
+    def simulate_search_in_period(self, pickup_zip, time_period):
+        """Method given a pickup_zip and time period returns an average search
+
+        Args:
+            pickup_zip(int): Pickup Zipcode to find average waittime for
+            time_period(int): index of the time period of the day
+        """
+        wait_time = self.average_waits[time_period, self.zip_index[pickup_zip]]
+        return float(wait_time)
+
+    def average_search_vector(self, time_period):
+        """Method given a time period returns the average search of each zip
+
+        Args:
+            time_period(int): index of the time period of the day
+
+        Returns:
+            average_waits(np.array): average search in minutes, aligned to
+                zip_codes, nan for zips with no observations
+        """
+        return self.average_waits[time_period]
 
     def get_time_period_search(self, datetime):
         """Method given a datetime returns a average searchtime
@@ -141,7 +218,7 @@ class CalculateSearchTimes(object):
         """
 
         df = self.search_df
-        time_period = map_to_period(datetime, TIME_PERIODS)
+        time_period = map_to_period(datetime, self.time_periods)
         df = df[(df['time_period'] == time_period)]
         df = df[['zips', 'average_wait']]
         dct = df.set_index('zips').T.to_dict('records')[0]
@@ -160,11 +237,38 @@ class CalculateSearchTimes(object):
                 simulated search time based on exponential distribution in
                 minutes.
         """
-        df = self.search_df
-        time_period = map_to_period(datetime, TIME_PERIODS)
-        index = df.loc[(df['zips'] == pickup_zip) &
-                       (df['time_period'] == time_period)]
+        time_period = self.period_table[datetime.hour * 60 + datetime.minute]
+        return self.stocastic_search_in_period(pickup_zip, time_period)
+
+    def stocastic_search_in_period(self, pickup_zip, time_period):
+        """
+            Simulate a search time stocastically, as stocastic_search but
+            given the time period of the day.
+
+            Args:
+                pickup_zip: zip code search time is calculated for
+                time_period: index of the time period of the day
 
-        wait_time = int(index['average_wait'])
+            Returns:
+                simulated search time based on exponential distribution in
+                minutes.
+        """
+        wait_time = int(self.average_waits[time_period,
+                                           self.zip_index[pickup_zip]])
         wait_time = np.random.exponential(wait_time * (2 / 3))
         return wait_time
+
+    def stocastic_searches(self, zip_indexes, periods, rng=np.random):
+        """
+            Simulate search times for many taxis at once, as stocastic_search
+
+            Args:
+                zip_indexes: index of each taxi's zip code in zip_codes
+                periods: time period of each taxi
+                rng: numpy Generator or RandomState drawing the searches
+
+            Returns:
+                array of simulated search times in minutes
+        """
+        wait_times = np.trunc(self.average_waits[periods, zip_indexes])
+        return rng.exponential(wait_times * (2 / 3))
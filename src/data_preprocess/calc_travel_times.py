@@ -1,14 +1,24 @@
+import warnings
 import pandas as pd
 import numpy as np
-import random
-from src.tools.tools import unpickle, subset_variables, map_to_period
-from src.tools.tools import find_df_period
-from src.tools.tools import haversine_distance
+from src.tools.tools import subset_variables, map_to_period
+from src.tools.tools import with_df_period
+from src.tools.tools import haversine_distance, load_zip_codes, get_centroids
+from src.tools.tools import order_zip_codes, zip_code_indexes
+from src.tools.tools import minute_period_table, zip_period_array
+from src.tools.trip_store import load_trips
+from src.tools.artifacts import load_artifact
+from src.tools.array_store import align_zip_array
 
 TIME_PERIODS = 6
 DF_PATH = 'data/zips_manhattan.csv'
 TRAVEL_DF_PATH = 'data/pickled_objects/travel_time_df.pkl'
 AVERAGE_DF_PATH = 'data/pickled_objects/average_travel_time_df.pkl'
+TRAVEL_TENSOR_PATH = 'data/pickled_objects/travel_time_tensor.pkl'
+ZIP_CODES_PATH = 'data/OrderedZipCodes.json'
+COLUMNS = ['pickup_zips', 'dropoff_zips', 'pickup_datetime',
+           'dropoff_datetime', 'trip_time_in_secs', 'pickup_longitude',
+           'pickup_latitude', 'dropoff_longitude', 'dropoff_latitude']
 
 
 class CalculateTravelTimes(object):
@@ -18,131 +28,190 @@ class CalculateTravelTimes(object):
 
     def __init__(self, load_data=True, time_periods=TIME_PERIODS,
                  travel_df_path=TRAVEL_DF_PATH, df_path=DF_PATH,
-                 average_df_path=AVERAGE_DF_PATH):
+                 average_df_path=AVERAGE_DF_PATH, df=None):
+        """
+            Args:
+                load_data: load the preprocessed travel times (True) or the
+                    trips to calculate them from (False)
+                df: trips to use instead of loading df_path, e.g. a frame
+                    shared with the other preprocessing stages
+        """
 
+        self.time_periods = time_periods
         if not load_data:
-            self.df = pd.read_csv(df_path, skipinitialspace=True)
-            self.df = self.df.sort_values(['pickup_zips', 'dropoff_zips'],
-                                          ascending=[1, 1])
-
-            self.df.dropoff_datetime = pd.to_datetime(self.df.
-                                                      dropoff_datetime)
-            self.df.pickup_datetime = pd.to_datetime(self.df.
-                                                     pickup_datetime)
-
-            self.df = subset_variables(self.df, ['pickup_zips', 'dropoff_zips',
-                                                 'pickup_datetime',
-                                                 'dropoff_datetime',
-                                                 'trip_time_in_secs',
-                                                 'pickup_longitude',
-                                                 'pickup_latitude',
-                                                 'dropoff_longitude',
-                                                 'dropoff_latitude'])
+            if df is None:
+                df = load_trips(df_path, COLUMNS)
+                df = df.sort_values(['pickup_zips', 'dropoff_zips'],
+                                    ascending=[1, 1])
+                df = subset_variables(df, COLUMNS)
+            self.df = df
 
             self.zips = np.unique(self.df[['pickup_zips', 'dropoff_zips']])
 
         else:
-            self.travel_df = unpickle(travel_df_path)
-            self.average_travel_df = unpickle(average_df_path)
+            self.travel_df = load_artifact(travel_df_path)
+            self.average_travel_df = load_artifact(average_df_path)
+            self.build_lookup()
+
+    @classmethod
+    def from_arrays(cls, zip_codes, travel_times, average_trip_times):
+        """Method which builds the lookups from an array store's arrays
+
+        There is no travel_df, so the dictionary methods are not available.
+        The number of time periods is the length of the arrays' first
+        axis.
+
+        Args:
+            zip_codes(array like): zip codes indexing the arrays
+            travel_times(np.array): (time_period, zip, zip) travel times
+            average_trip_times(np.array): (time_period, zip) average trip
+                times
 
-    def _calc_travel_time(self, df, pickle_path, time_period, num_of_samples):
+        Returns:
+            CalculateTravelTimes
+        """
+        obj = cls.__new__(cls)
+        obj.travel_df = None
+        obj.time_periods = len(average_trip_times)
+        obj.array_zip_codes = np.asarray(zip_codes)
+        obj.array_travel_times = travel_times
+        obj.array_trip_times = average_trip_times
+        obj.build_lookup()
+
+        return obj
+
+    def build_lookup(self, zip_codes=None):
+        """Method which builds the arrays simulate_travel_time looks up
+
+        The mean travel times in travel_df are held in a contiguous
+        (time_period, pickup zip index, dropoff zip index) array with a
+        zip -> index dictionary, so a lookup is three indexes rather than
+        filtering travel_df. The average trip times in average_travel_df are
+        held in a (time_period, zip index) array. Call again if travel_df or
+        average_travel_df is replaced.
+
+        Args:
+            zip_codes(array like): zip codes in the order of the zip index,
+                e.g. to share indexes with Transition.zip_codes. Defaults to
+                the sorted zips of travel_df, or the array store's zip
+                codes
+        """
+        if self.travel_df is None:
+            if zip_codes is None:
+                zip_codes = self.array_zip_codes
+            self.travel_times = align_zip_array(
+                self.array_travel_times, self.array_zip_codes, zip_codes,
+                [1, 2])
+            self.average_trip_times = align_zip_array(
+                self.array_trip_times, self.array_zip_codes, zip_codes, [1])
+        else:
+            if zip_codes is None:
+                zip_codes = np.unique(
+                    self.travel_df[['pickup_zips', 'dropoff_zips']])
+            self.travel_times = zip_period_array(
+                self.travel_df, ['pickup_zips', 'dropoff_zips'],
+                'mean_travel_time', zip_codes, self.time_periods)
+            self.average_trip_times = zip_period_array(
+                self.average_travel_df, ['pickup_zips'], 'mean_zone_time',
+                zip_codes, self.time_periods)
+
+        self.zip_codes = np.asarray(zip_codes)
+        self.zip_index = {zip_code: index for index, zip_code
+                          in enumerate(self.zip_codes.tolist())}
+        self.period_table = minute_period_table(self.time_periods).tolist()
+
+    def _calc_travel_time(self, df, pickle_path, time_period,
+                          num_of_samples=None, zip_codes_path=ZIP_CODES_PATH):
         """Method which calculates average travel-time between zones for hour
            of the day.
 
-        Method calculates travel time by going through each pair of pickup
-        and dropoff zips and getting mean travel time between each zone for
-        each time_period.
+        The travel times are calculated as a tensor by _calc_travel_tensor
+        and flattened into one row per pair of zips found in df and
+        time_period.
 
         Args:
             df(df): dataframe containing the trip time in secs
+            num_of_samples(int): deprecated and ignored, unobserved pairs
+                are estimated from zone centroids
 
         Returns:
                 travel_df(df): dataframe containing traveltime in minutes
         """
-        subset_df = df.copy()
-        df = find_df_period(subset_df, 'pickup_datetime', time_period)
-        p_zips = []
-        d_zips = []
-        time_periods = []
-        mean_travel_times = []
-        pickup_zips = np.unique(df['pickup_zips'])
-        dropoff_zips = np.unique(df['dropoff_zips'])
-        zip_pairs = self.get_tuples(df)
-        for period in range(0, time_period):
-            for zips in zip_pairs:
-                p_zip = zips[0]
-                d_zip = zips[1]
-
-                # Combinations with an observed trip for that period
-                if p_zip in pickup_zips and d_zip in dropoff_zips:
-                    full_df = df[(df['pickup_zips'] == p_zip) &
-                                 (df['dropoff_zips'] == d_zip) &
-                                 (df['time_period'] == period)]
-
-                    # If no trips made in that period, use observed mean
-                    if not full_df.empty:
-                        travel_time = np.mean(full_df['trip_time_in_secs'])
-                        travel_time = travel_time / 60
-                        travel_time = randomize_travel_time(travel_time, 0.5)
-
-                    else:
-                        zip_df = df[(df['pickup_zips'] == p_zip) &
-                                    (df['dropoff_zips'] == d_zip)]
-
-                        if not zip_df.empty:
-                            travel_time = np.mean(zip_df['trip_time_in_secs'])
-                            travel_time = travel_time / 60
-                            travel_time = randomize_travel_time(travel_time,
-                                                                0.5)
-                        else:
-                            pickup_df = df[(df['pickup_zips'] == p_zip)]
-                            dropoff_df = df[(df['dropoff_zips'] == d_zip)]
-                            travel_time = get_travel_time(pickup_df,
-                                                          dropoff_df,
-                                                          num_of_samples,
-                                                          'no_pair')
-                            travel_time = np.mean(travel_time)
-                            travel_time = randomize_travel_time(travel_time,
-                                                                0.5)
-
-                # No pickup observed in zone, use travel-time method
-                elif p_zip not in pickup_zips and d_zip in dropoff_zips:
-                    dropoff_df = df[(df['dropoff_zips'] == p_zip)]
-                    fake_df = df[(df['dropoff_zips'] == d_zip)]
-                    travel_time = get_travel_time(dropoff_df, fake_df,
-                                                  num_of_samples, 'no_pzip')
-                    travel_time = np.mean(travel_time)
-                    travel_time = randomize_travel_time(travel_time, 0.5)
-
-                # No dropoff observed in zone, use travel-time method
-                elif d_zip not in dropoff_zips and p_zip in pickup_zips:
-                    pickup_df = df[(df['pickup_zips'] == p_zip)]
-                    fake_df = df[(df['pickup_zips'] == d_zip)]
-                    travel_time = get_travel_time(pickup_df, fake_df,
-                                                  num_of_samples, 'no_dzip')
-                    travel_time = np.mean(travel_time)
-                    travel_time = randomize_travel_time(travel_time, 0.5)
-
-                p_zips.append(p_zip)
-                d_zips.append(d_zip)
-                mean_travel_times.append(travel_time)
-                time_periods.append(period)
-
-        columns = ['pickup_zips', 'dropoff_zips', 'time_period',
-                   'mean_travel_time']
-        travel_df = pd.DataFrame(columns=columns)
-        travel_df['pickup_zips'] = p_zips
-        travel_df['dropoff_zips'] = d_zips
-        travel_df['time_period'] = time_periods
-        travel_df['mean_travel_time'] = mean_travel_times
-
-        return travel_df
+        if num_of_samples is not None:
+            warnings.warn("num_of_samples is deprecated and ignored, "
+                          "unobserved pairs are estimated from zone "
+                          "centroids", DeprecationWarning, stacklevel=2)
+
+        travel_times, zip_codes = self._calc_travel_tensor(
+            df, time_period, zip_codes_path)
+        zips = np.unique(df[['pickup_zips', 'dropoff_zips']])
+
+        return travel_tensor_to_df(travel_times, zip_codes, zips)
+
+    @staticmethod
+    def _calc_travel_tensor(df, time_period, zip_codes_path=ZIP_CODES_PATH):
+        """Method which calculates average travel-time between zones for each
+           time period as a dense tensor.
+
+        Observed mean trip times are found with one groupby over (time_period,
+        pickup zip, dropoff zip) and scattered into the tensor. Pairs with no
+        trip in a period use the pair's mean over all periods. Pairs never
+        observed are estimated from the distance between the zone centroids
+        and the period's average speed. Every travel time is then randomized.
+
+        Args:
+            df(df): dataframe containing the trip time in secs
+            time_period(int): number of time periods to divide the day into
+            zip_codes_path(string): json file with ordered zip codes
+
+        Returns:
+            travel_times(np.array): (time_period, zips, zips) travel times in
+                minutes, indexed by zip_codes, nan for zips not in df
+            zip_codes(np.array): zip codes indexing the tensor, ordered as in
+                zip_codes_path followed by any other zips found in df
+        """
+        df = with_df_period(df, 'pickup_datetime', time_period)
+        zips = np.unique(df[['pickup_zips', 'dropoff_zips']])
+        zip_codes = order_zip_codes(zips, load_zip_codes(zip_codes_path))
+        n = len(zip_codes)
+
+        trips = pd.DataFrame({
+            'time_period': df['time_period'].values,
+            'pickup': zip_code_indexes(df['pickup_zips'].values, zip_codes),
+            'dropoff': zip_code_indexes(df['dropoff_zips'].values, zip_codes),
+            'trip_time': df['trip_time_in_secs'].values})
+
+        # Observed mean for each period, midnight (period -1) is not a period
+        period_means = trips[trips['time_period'] >= 0].groupby(
+            ['time_period', 'pickup', 'dropoff'])['trip_time'].mean()
+        travel_times = np.full((time_period, n, n), np.nan)
+        travel_times[_index_arrays(period_means)] = period_means.values / 60
+
+        # If no trips made in that period, use observed mean
+        pair_means = trips.groupby(['pickup', 'dropoff'])['trip_time'].mean()
+        pair_times = np.full((n, n), np.nan)
+        pair_times[_index_arrays(pair_means)] = pair_means.values / 60
+
+        # Pairs never observed, estimate from the distance between zones
+        centroids = get_zone_centroids(df, zip_codes)
+        distances = haversine_distance(centroids[:, None, 0],
+                                       centroids[:, None, 1],
+                                       centroids[None, :, 0],
+                                       centroids[None, :, 1])
+        speeds = get_period_speeds(df, time_period)
+        estimates = distances[None, :, :] / speeds[:, None, None] * 60
+
+        missing = np.isnan(travel_times)
+        travel_times[missing] = np.where(np.isnan(pair_times)[None, :, :],
+                                         estimates, pair_times)[missing]
+
+        return randomize_travel_time(travel_times), zip_codes
 
     def get_tuples(self, df):
         """Method which calculates the each possible combination of trips
 
         The method is used because it is more robust than itertools
-        permutations. The method is called in _calc_travel_time method.
+        permutations.
 
         Args:
             df(df): Containing all unique zipcodes
@@ -163,8 +232,8 @@ class CalculateTravelTimes(object):
     def simulate_travel_time(self, start_zip, end_zip, datetime):
         """Method given a start_zip, end_zip and datetime returns travel-time
 
-        Method unpickle a preprocessed df, containing calculated traveltime
-        An exception is raised if no observations are contained
+        Method looks up the travel time array built from the preprocessed df
+        A KeyError is raised if a zip has no observations
 
         Args:
             start_zip(int): Trip starting zone
@@ -174,21 +243,71 @@ class CalculateTravelTimes(object):
         Returns:
             travel_time(int): expected travel time from zone to zone at period
         """
-        time_period = map_to_period(datetime, TIME_PERIODS)
+        # Midnight (period -1) looks up the last period of the day
+        time_period = self.period_table[datetime.hour * 60 + datetime.minute]
+        return self.travel_time_in_period(start_zip, end_zip, time_period)
+
+    def travel_time_in_period(self, start_zip, end_zip, time_period):
+        """Method given a start_zip, end_zip and time period returns
+        travel-time
+
+        Args:
+            start_zip(int): Trip starting zone
+            dropoff_zip(int): Trip end point
+            time_period(int): index of the time period of the day
+
+        Returns:
+            travel_time(float): expected travel time from zone to zone
+        """
+        travel_time = self.travel_times[time_period, self.zip_index[start_zip],
+                                        self.zip_index[end_zip]]
+        return float(travel_time)
+
+    def simulate_travel_times(self, start_indexes, end_indexes, periods):
+        """Method which returns the travel-time of many trips at once
+
+        Args:
+            start_indexes(np.array): index of each trip's start zip in
+                zip_codes
+            end_indexes(np.array): index of each trip's end zip in zip_codes
+            periods(np.array): time period of each trip
+
+        Returns:
+            travel_times(np.array): expected travel time of each trip
+        """
+        return self.travel_times[periods, start_indexes, end_indexes]
+
+    def travel_time_matrix(self, time_period):
+        """Method given a time period returns the travel-time between zips
+
+        Args:
+            time_period(int): index of the time period of the day
+
+        Returns:
+            travel_times(np.array): (pickup zip, dropoff zip) expected travel
+                time, aligned to zip_codes
+        """
+        return self.travel_times[time_period]
 
-        index = self.travel_df[(self.travel_df['pickup_zips'] == start_zip) &
-                               (self.travel_df['dropoff_zips'] == end_zip) &
-                               (self.travel_df['time_period'] == time_period)]
+    def average_travel_time_vector(self, time_period):
+        """Method given a time period returns the average trip time of each
+        pickup zip
 
-        travel_time = float(index['mean_travel_time'])
-        return travel_time
+        Args:
+            time_period(int): index of the time period of the day
+
+        Returns:
+            average_trip_times(np.array): average trip time in minutes,
+                aligned to zip_codes
+        """
+        return self.average_trip_times[time_period]
 
     def return_travel_time_dict(self, pickup_zip, datetime):
         """Returns a dictionary of travel-time to each zone at time
 
         """
         travel_df = self.travel_df.copy()
-        time_period = map_to_period(datetime, TIME_PERIODS)
+        time_period = map_to_period(datetime, self.time_periods)
         travel_df = travel_df[(travel_df['time_period'] == time_period)]
         travel_df = travel_df[(travel_df['pickup_zips'] == pickup_zip)]
         travel_df = travel_df[['dropoff_zips', 'mean_travel_time']]
@@ -208,7 +327,7 @@ class CalculateTravelTimes(object):
 
         """
         p_zips = np.unique(df[['pickup_zips', 'dropoff_zips']])
-        df = find_df_period(df, 'pickup_datetime', time_periods)
+        df = with_df_period(df, 'pickup_datetime', time_periods)
         trip_times = []
         pickup_zips = []
         time_period_lst = []
@@ -246,7 +365,7 @@ class CalculateTravelTimes(object):
               dct(dict): dictioanry containing average wait time for zones
 
         """
-        time_period = map_to_period(datetime, TIME_PERIODS)
+        time_period = map_to_period(datetime, self.time_periods)
         df = self.average_travel_df
         df = df[df['time_period'] == time_period]
         dct = df.set_index('pickup_zips').T.to_dict('records')[0]
@@ -254,62 +373,112 @@ class CalculateTravelTimes(object):
         return dct
 
 
-def get_travel_time(pickup_df, dropoff_df, num_of_samples, case_type):
-    """Method to get travel time between zip code centroids
+def get_zone_centroids(df, zip_codes):
+    """Method which calculates the centroid of each zone's trip end points
+
+    The pickups and dropoffs in each zone are pooled, so zones with only
+    pickups or only dropoffs still get a centroid.
+
+    Args:
+        df(df): trips with pickup/dropoff zips and lat/longs
+        zip_codes(np.array): zip codes to calculate centroids for
+
+    Returns:
+        centroids(np.array): (zips, 2) lat/long centroids, nan for zips
+            with no trips
+    """
+    points = pd.DataFrame({
+        'zip_index': np.concatenate([
+            zip_code_indexes(df['pickup_zips'].values, zip_codes),
+            zip_code_indexes(df['dropoff_zips'].values, zip_codes)]),
+        'latitude': np.concatenate([df['pickup_latitude'].values,
+                                    df['dropoff_latitude'].values]),
+        'longitude': np.concatenate([df['pickup_longitude'].values,
+                                     df['dropoff_longitude'].values])})
+
+    centroids = np.full((len(zip_codes), 2), np.nan)
+    for zip_index, zone_df in points[points['zip_index'] >= 0].groupby(
+            'zip_index'):
+        centroids[zip_index] = get_centroids(zone_df, 'latitude', 'longitude')
+
+    return centroids
+
+
+def get_period_speeds(df, time_periods):
+    """Method which estimates the average speed of taxis in each time period
 
-    Method has a local variable average_speed which is the average speed
-    of a medallion in manhattan in kilometres.
+    The speed is the total straight line distance between the pickups and
+    dropoffs over the total trip time, in kilometres per hour. Periods with
+    no trips use the speed over all trips.
 
     Args:
-        pickup_df(df): area where the pickup occured
-        dropoff_df(df): area where the dropoff occured
+        df(df): trips with lat/longs, trip times and a time_period column
+        time_periods(int): number of time periods to divide the day into
 
     Returns:
-        travel_time(float): travel_time between zips
+        speeds(np.array): average speed of each time period
     """
-    average_speed = 13.6955174
-    travel_times = []
-    random.seed(2)
-    for i in range(num_of_samples):
-        length = min(len(pickup_df), len(dropoff_df))
-        index = random.randint(0, length - 1)
-        subset_pickup_df = pickup_df.iloc[index]
-        subset_dropoff_df = dropoff_df.iloc[index]
-
-        if case_type == 'no_pzip':
-            lat_one = subset_pickup_df['dropoff_latitude']
-            lon_one = subset_pickup_df['dropoff_longitude']
-            lat_two = subset_dropoff_df['dropoff_latitude']
-            lon_two = subset_dropoff_df['dropoff_longitude']
-
-        elif case_type == 'no_dzip':
-            lat_one = subset_pickup_df['pickup_latitude']
-            lon_one = subset_pickup_df['pickup_longitude']
-            lat_two = subset_dropoff_df['pickup_latitude']
-            lon_two = subset_dropoff_df['pickup_longitude']
-
-        elif case_type == 'no_pair':
-            lat_one = subset_pickup_df['pickup_latitude']
-            lon_one = subset_pickup_df['pickup_longitude']
-            lat_two = subset_dropoff_df['dropoff_latitude']
-            lon_two = subset_dropoff_df['dropoff_longitude']
-
-        dist = haversine_distance(lat_one, lon_one, lat_two, lon_two)
-        travel_time = dist / average_speed
-        travel_time = travel_time * 60
-        travel_times.append(travel_time)
-
-    return travel_times
-
-
-def randomize_travel_time(travel_time, random_cut_off):
-    number_1 = np.random.uniform()
-    number_2 = np.random.uniform(0, 0.6)
-
-    if number_1 < random_cut_off:
-        travel_time = travel_time - travel_time * number_2
-
-    else:
-        travel_time = travel_time - travel_time * number_2
-
-    return travel_time
+    distances = haversine_distance(df['pickup_latitude'].values,
+                                   df['pickup_longitude'].values,
+                                   df['dropoff_latitude'].values,
+                                   df['dropoff_longitude'].values)
+    hours = df['trip_time_in_secs'].values / 3600
+    periods = df['time_period'].values
+    in_day = (periods >= 0) & (hours > 0)
+
+    total_distances = np.bincount(periods[in_day], distances[in_day],
+                                  minlength=time_periods)[:time_periods]
+    total_hours = np.bincount(periods[in_day], hours[in_day],
+                              minlength=time_periods)[:time_periods]
+    overall_speed = distances[hours > 0].sum() / hours[hours > 0].sum()
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        speeds = total_distances / total_hours
+
+    return np.where(total_hours > 0, speeds, overall_speed)
+
+
+def _index_arrays(series):
+    """Method which returns the levels of a grouped series' index as a
+    tuple of arrays, to scatter its values into a numpy array"""
+    return tuple(series.index.get_level_values(level).values
+                 for level in range(series.index.nlevels))
+
+
+def travel_tensor_to_df(travel_times, zip_codes, zips):
+    """Method which flattens a travel time tensor into a travel_df
+
+    Args:
+        travel_times(np.array): (time_period, zips, zips) travel times
+        zip_codes(np.array): zip codes indexing the tensor
+        zips(array like): zip codes to include, in the order of the rows
+
+    Returns:
+        travel_df(df): one row per time period, pickup and dropoff zip
+    """
+    time_period = travel_times.shape[0]
+    zips = np.asarray(zips)
+    indexes = zip_code_indexes(zips, zip_codes)
+    sub_tensor = travel_times[:, indexes][:, :, indexes]
+
+    columns = ['pickup_zips', 'dropoff_zips', 'time_period',
+               'mean_travel_time']
+    travel_df = pd.DataFrame(columns=columns)
+    travel_df['pickup_zips'] = np.tile(np.repeat(zips, len(zips)),
+                                       time_period)
+    travel_df['dropoff_zips'] = np.tile(zips, len(zips) * time_period)
+    travel_df['time_period'] = np.repeat(np.arange(time_period),
+                                         len(zips) * len(zips))
+    travel_df['mean_travel_time'] = sub_tensor.ravel()
+
+    return travel_df
+
+
+def randomize_travel_time(travel_time):
+    """Method which randomly shortens travel times by up to 60%
+
+    Works on a single time or an array of times, each gets its own draw.
+    """
+    number_2 = np.random.uniform(0, 0.6, np.shape(travel_time))
+
+    return travel_time - travel_time * number_2
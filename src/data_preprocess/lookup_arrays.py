@@ -0,0 +1,85 @@
+import numpy as np
+from src.data_preprocess.calc_travel_times import CalculateTravelTimes
+from src.data_preprocess.calc_mean_fare import CalculateFare
+from src.data_preprocess.calc_search_time import CalculateSearchTimes
+from src.data_preprocess.transition import Transition
+from src.tools.tools import load_zip_codes, zip_period_array
+from src.tools.array_store import save_array_store, load_array_store
+from src.tools.array_store import align_zip_array
+
+ARRAY_STORE_PATH = 'data/lookup_arrays'
+ZIP_CODES_PATH = 'data/OrderedZipCodes.json'
+TIME_PERIODS = 6
+
+
+def save_lookup_arrays(array_path, travel_times, travel_zip_codes,
+                       average_df, wait_df, fare_df, transition,
+                       time_periods, build_params):
+    """Method which saves the preprocessed results as an array store
+
+    Every array is aligned to the zip codes of the transition matrices
+    (ZIP_CODES_PATH), nan where a stage has no result for a zip code.
+
+    Args:
+        array_path(string): directory the array store is written to
+        travel_times(np.array): travel time tensor of _calc_travel_tensor
+        travel_zip_codes(np.array): zip codes indexing travel_times
+        average_df(df): average trip times of _get_mean_zip_time
+        wait_df(df): average waits of _calc_search_time
+        fare_df(df): average fares of _calc_average_zip_fare
+        transition(Transition): calculated transition matrices
+        time_periods(int): number of time periods the day is divided into
+        build_params(dict): parameters of the build saved in the header
+
+    Returns:
+        array_path(string): directory the array store was written to
+    """
+    zip_codes = transition.zip_codes
+
+    arrays = {
+        'travel_times': align_zip_array(travel_times, travel_zip_codes,
+                                        zip_codes, [1, 2]),
+        'average_trip_times': zip_period_array(
+            average_df, ['pickup_zips'], 'mean_zone_time', zip_codes,
+            time_periods),
+        'average_waits': zip_period_array(
+            wait_df, ['zips'], 'average_wait', zip_codes, time_periods),
+        'average_fares': zip_period_array(
+            fare_df, ['pickup_zips'], 'mean_zone_fare', zip_codes,
+            time_periods),
+        'transition_matrices': np.asarray(transition.matrices, dtype=float)}
+
+    return save_array_store(array_path, arrays, zip_codes, time_periods,
+                            build_params)
+
+
+def load_lookup_arrays(array_path=ARRAY_STORE_PATH,
+                       zip_codes_path=ZIP_CODES_PATH,
+                       time_periods=TIME_PERIODS, mmap_mode='r'):
+    """Method which loads the simulation lookups from an array store
+
+    The store must have been built for the zip codes in zip_codes_path and
+    for time_periods, otherwise a ValueError is raised. With the default
+    mmap_mode the arrays are memory mapped and shared between processes.
+
+    Args:
+        array_path(string): array store directory
+        zip_codes_path(string): json file with ordered zip codes
+        time_periods(int): number of time periods to divide the day into
+        mmap_mode: passed to np.load
+
+    Returns:
+        transition(Transition), search_times(CalculateSearchTimes),
+        travel_times(CalculateTravelTimes), fares(CalculateFare)
+    """
+    zip_codes = load_zip_codes(zip_codes_path)
+    arrays, _ = load_array_store(array_path, zip_codes, time_periods,
+                                 mmap_mode)
+
+    return (Transition.from_arrays(zip_codes, arrays['transition_matrices']),
+            CalculateSearchTimes.from_arrays(zip_codes,
+                                             arrays['average_waits']),
+            CalculateTravelTimes.from_arrays(zip_codes,
+                                             arrays['travel_times'],
+                                             arrays['average_trip_times']),
+            CalculateFare.from_arrays(zip_codes, arrays['average_fares']))
@@ -8,10 +8,23 @@ Created on Fri Aug 25 11:47:17 2017
 import os
 import sys
 sys.path.append(os.getcwd())
+import time
+import resource
+import numpy as np
+import pandas as pd
 from src.data_preprocess.calc_travel_times import CalculateTravelTimes
+from src.data_preprocess.calc_travel_times import COLUMNS as TRAVEL_COLUMNS
+from src.data_preprocess.calc_travel_times import travel_tensor_to_df
+from src.data_preprocess.calc_travel_times import TRAVEL_TENSOR_PATH
 from src.data_preprocess.calc_mean_fare import CalculateFare
+from src.data_preprocess.calc_mean_fare import COLUMNS as FARE_COLUMNS
 from src.data_preprocess.calc_search_time import CalculateSearchTimes
+from src.data_preprocess.calc_search_time import COLUMNS as SEARCH_COLUMNS
 from src.data_preprocess.transition import Transition
+from src.tools.trip_store import convert_csv_to_store, load_trips
+from src.tools.tools import find_df_period, pickle_obj
+from src.data_preprocess.lookup_arrays import save_lookup_arrays
+from src.data_preprocess.lookup_arrays import ARRAY_STORE_PATH
 DF_PATH = 'data/zips_manhattan.csv'
 TRAVEL_DF_PATH = 'data/pickled_objects/travel_time_df.pkl'
 AVERAGE_DF_PATH = 'data/pickled_objects/average_travel_time_df.pkl'
@@ -20,33 +33,138 @@ FARE_PATH = 'data/pickled_objects/average_fare_df.pkl'
 CSV_PATH = 'data/zips_manhattan.csv'
 ZIP_CODES_PATH = 'data/OrderedZipCodes.json'
 PICKLE_PATH = 'data/trasition_matrices.pickle'
+STORE_PATH = 'data/trip_store'
 MAX_WAIT_TIME = 30
 TIME_PERIODS = 6
 
 
-def make_calculations():
-    travel_time_obj = CalculateTravelTimes(load_data=False)
-    travel_time_obj._calc_travel_time(travel_time_obj.df,
-                                      pickle_path=TRAVEL_DF_PATH,
-                                      time_period=TIME_PERIODS)
+def load_shared_frame(store_path=STORE_PATH, time_periods=TIME_PERIODS):
+    """Method which loads the trips every preprocessing stage needs, once
 
-    travel_time_obj._get_mean_zip_time(travel_time_obj.df,
-                                       pickle_path=AVERAGE_DF_PATH,
-                                       time_periods=TIME_PERIODS)
+    The frame holds the union of the columns of all stages, is sorted by
+    pickup and dropoff zip and has its time_period column computed, so the
+    stages can use it without reloading, resorting or recomputing periods.
 
-    search_time_obj = CalculateSearchTimes(load_data=False)
+    Args:
+        store_path(string): trip store directory or csv file
+        time_periods(int): number of time periods to divide the day into
 
-    search_time_obj._calc_search_time(search_time_obj.df,
-                                      pickle_path=SEARCH_PATH,
-                                      zips=search_time_obj.zips,
-                                      max_wait_time=MAX_WAIT_TIME,
-                                      time_periods=TIME_PERIODS)
+    Returns:
+        df(df): shared trips frame
+    """
+    columns = list(TRAVEL_COLUMNS)
+    for column in SEARCH_COLUMNS + FARE_COLUMNS:
+        if column not in columns:
+            columns.append(column)
 
-    calc_fare_obj = CalculateFare(load_data=False)
-    calc_fare_obj._calc_average_zip_fare(calc_fare_obj.df,
-                                         pickle_path=FARE_PATH,
-                                         time_periods=TIME_PERIODS)
-    Transition(load_data=False)
+    df = load_trips(store_path, columns)
+    df = df.sort_values(['pickup_zips', 'dropoff_zips'], ascending=[1, 1])
+    df = find_df_period(df, 'pickup_datetime', time_periods)
+
+    return df
+
+
+def _peak_rss_mb():
+    """Returns the peak resident memory of the process so far in MB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+
+def _run_stage(report, name, func, *args, **kwargs):
+    """Runs one stage, recording its wall time and peak resident memory
+
+    Memory is read from the process' peak resident set size, which adds no
+    overhead to the timed stage. peak_rss_growth_mb is how far the stage
+    raised that peak, 0 if it stayed below the peak of an earlier stage.
+    """
+    peak_before = _peak_rss_mb()
+    start = time.time()
+
+    result = func(*args, **kwargs)
+
+    wall_time = time.time() - start
+    peak_after = _peak_rss_mb()
+
+    report.append({'stage': name, 'wall_time_s': wall_time,
+                   'peak_rss_mb': peak_after,
+                   'peak_rss_growth_mb': peak_after - peak_before})
+    return result
+
+
+def make_calculations(csv_path=CSV_PATH, store_path=STORE_PATH,
+                      time_periods=TIME_PERIODS, max_wait_time=MAX_WAIT_TIME,
+                      array_path=ARRAY_STORE_PATH):
+    """Method which calculates and saves all the preprocessed data in one run
+
+    The trips are parsed once into the trip store, loaded once into a
+    shared frame and fed to the travel time, search time, fare and
+    transition stages. The results are saved as pickles and as an array
+    store. Each stage's wall time and peak memory is printed at the end.
+
+    Args:
+        csv_path(string): trip csv to preprocess
+        store_path(string): directory the trip store is written to
+        time_periods(int): number of time periods to divide the day into
+        max_wait_time(int): maximum minutes between a dropoff and the next
+            pickup to count as a search
+        array_path(string): directory the array store is written to
+
+    Returns:
+        report(df): wall time and peak memory of each stage
+    """
+    report = []
+
+    _run_stage(report, 'convert', convert_csv_to_store, csv_path,
+               store_path, ZIP_CODES_PATH)
+    df = _run_stage(report, 'load', load_shared_frame, store_path,
+                    time_periods)
+
+    travel_time_obj = CalculateTravelTimes(load_data=False, df=df)
+    travel_times, zip_codes = _run_stage(
+        report, 'travel_time', travel_time_obj._calc_travel_tensor, df,
+        time_period=time_periods, zip_codes_path=ZIP_CODES_PATH)
+    pickle_obj({'zip_codes': zip_codes, 'travel_times': travel_times},
+               TRAVEL_TENSOR_PATH)
+    pickle_obj(travel_tensor_to_df(travel_times, zip_codes,
+                                   travel_time_obj.zips), TRAVEL_DF_PATH)
+
+    average_df = _run_stage(report, 'average_travel_time',
+                            travel_time_obj._get_mean_zip_time, df,
+                            pickle_path=AVERAGE_DF_PATH,
+                            time_periods=time_periods)
+    pickle_obj(average_df, AVERAGE_DF_PATH)
+
+    zips = np.unique(df[['pickup_zips', 'dropoff_zips']])
+    wait_df = _run_stage(report, 'search_time',
+                         CalculateSearchTimes._calc_search_time, df,
+                         pickle_path=SEARCH_PATH, zips=zips,
+                         max_wait_time=max_wait_time,
+                         time_periods=time_periods)
+    pickle_obj(wait_df, SEARCH_PATH)
+
+    fare_df = _run_stage(report, 'fare',
+                         CalculateFare._calc_average_zip_fare, df,
+                         pickle_path=FARE_PATH, time_periods=time_periods)
+    pickle_obj(fare_df, FARE_PATH)
+
+    transition = _run_stage(report, 'transition', Transition,
+                            load_data=False, pickle_path=PICKLE_PATH,
+                            time_periods=time_periods,
+                            zip_codes_path=ZIP_CODES_PATH, data_frame=df)
+
+    build_params = {'csv_path': csv_path, 'max_wait_time': max_wait_time,
+                    'zip_codes_path': ZIP_CODES_PATH}
+    _run_stage(report, 'array_store', save_lookup_arrays, array_path,
+               travel_times, zip_codes, average_df, wait_df, fare_df,
+               transition, time_periods, build_params)
+
+    report = pd.DataFrame(report, columns=['stage', 'wall_time_s',
+                                           'peak_rss_mb',
+                                           'peak_rss_growth_mb'])
+    print(report.to_string(index=False))
+
+    return report
 
 
 if __name__ == "__main__":
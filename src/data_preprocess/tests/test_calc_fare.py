@@ -54,6 +54,20 @@ class CalcTravelTimeTestCase(unittest.TestCase):
         self.assertTrue(result4[10029] == 0)
         self.assertTrue(result5[10030] == 240)
 
+    def test_average_fare_vector(self):
+        """Method to test the fares are aligned to the given zip codes
+
+        """
+        obj = CalculateFare(fare_path=FARE_PATH)
+        obj.build_lookup([10030, 10026, 10028])
+        dt2 = dt.datetime(2017, 8, 9, 11, 56, 40, 796658)
+
+        result = obj.return_average_fare(dt2)
+        vector = obj.average_fare_vector(2)
+
+        self.assertTrue(vector.tolist() ==
+                        [result[10030], result[10026], result[10028]])
+
 
 if __name__ == '__main__':
     unittest.main()
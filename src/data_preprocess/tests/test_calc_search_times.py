@@ -35,6 +35,31 @@ class CalcSearchTimeTestCase(unittest.TestCase):
         self.assertTrue(np.max(search_df['average_wait']) ==
                         1666.6666666666667)
 
+    def test_calc_search_time_per_period(self):
+        """Test searches are summed per zone and time period and that a
+            search only follows a dropoff of the same medallion
+        """
+        datetimes = pd.to_datetime([
+            '2013-01-01 09:00', '2013-01-01 09:10',
+            '2013-01-01 09:20', '2013-01-01 09:30',
+            '2013-01-01 13:00', '2013-01-01 13:10',
+            '2013-01-01 09:40', '2013-01-01 09:50'])
+        df = pd.DataFrame({
+            'medallion': ['a', 'a', 'a', 'b'],
+            'pickup_zips': [10001, 10001, 10001, 10001],
+            'dropoff_zips': [10001, 10001, 10001, 10002],
+            'pickup_datetime': datetimes[::2],
+            'dropoff_datetime': datetimes[1::2]})
+
+        search_df = CalculateSearchTimes._calc_search_time(
+            df, None, [10001, 10002], 30, TIME_PERIODS)
+        search_df = search_df.set_index(['zips', 'time_period'])
+
+        self.assertTrue(search_df.loc[(10001, 2), 'observations'] == 1)
+        self.assertTrue(search_df.loc[(10001, 2), 'average_wait'] == 10)
+        self.assertTrue(search_df.loc[(10001, 3), 'observations'] == 0)
+        self.assertTrue(np.sum(search_df['observations']) == 1)
+
     def test_find_df_period(self):
         """Test if a df datetime column is correctly converted to time periods
 
@@ -1,7 +1,13 @@
 import unittest
 from src.data_preprocess.calc_travel_times import CalculateTravelTimes
+from src.data_preprocess.calc_travel_times import get_period_speeds
+from src.data_preprocess.calc_travel_times import get_zone_centroids
 import datetime as dt
 import numpy as np
+import pandas as pd
+import json
+import os
+import tempfile
 
 TIME_PERIODS = 6
 NUM_SAMPLES = 4
@@ -32,6 +38,69 @@ class CalcTravelTimeTestCase(unittest.TestCase):
         self.assertTrue(len(travel_df) == unique_zips * unique_zips *
                         TIME_PERIODS)
     
+    def test__calc_travel_tensor(self):
+        """Test observed travel times are scattered in OrderedZipCodes order
+            and unobserved periods fall back to the pair's mean
+        """
+        datetimes = pd.to_datetime(['2017-08-09 09:00', '2017-08-09 09:30',
+                                    '2017-08-09 13:00'])
+        df = pd.DataFrame({
+            'pickup_zips': [10027, 10027, 10026],
+            'dropoff_zips': [10026, 10026, 10027],
+            'pickup_datetime': datetimes,
+            'trip_time_in_secs': [120, 240, 600],
+            'pickup_latitude': [40.81, 40.81, 40.80],
+            'pickup_longitude': [-73.95, -73.95, -73.95],
+            'dropoff_latitude': [40.80, 40.80, 40.81],
+            'dropoff_longitude': [-73.95, -73.95, -73.95]})
+
+        handle, zip_codes_path = tempfile.mkstemp(suffix='.json')
+        with os.fdopen(handle, 'w') as data_file:
+            json.dump({'ZipCodes': [10027, 10026, 10001]}, data_file)
+
+        try:
+            travel_times, zip_codes = CalculateTravelTimes._calc_travel_tensor(
+                df, TIME_PERIODS, zip_codes_path)
+        finally:
+            os.remove(zip_codes_path)
+
+        self.assertTrue(zip_codes.tolist() == [10027, 10026, 10001])
+        self.assertTrue(travel_times.shape == (TIME_PERIODS, 3, 3))
+
+        # Travel times are randomly shortened by up to 60%
+        observed = travel_times[2, 0, 1]
+        self.assertTrue(0.4 * 3 <= observed <= 3)
+        fallback = travel_times[:, 1, 0]
+        self.assertTrue(np.all((0.4 * 10 <= fallback) & (fallback <= 10)))
+
+        self.assertTrue(np.isfinite(travel_times[:, :2, :2]).all())
+        self.assertTrue(np.isnan(travel_times[:, 2]).all())
+
+    def test_unobserved_fallbacks(self):
+        """Test zone centroids pool pickups and dropoffs and that period
+            speeds fall back to the overall speed
+        """
+        df = pd.DataFrame({
+            'pickup_zips': [10026, 10026],
+            'dropoff_zips': [10027, 10027],
+            'time_period': [2, 3],
+            'trip_time_in_secs': [1800, 3600],
+            'pickup_latitude': [40.80, 40.80],
+            'pickup_longitude': [-73.95, -73.95],
+            'dropoff_latitude': [40.90, 40.90],
+            'dropoff_longitude': [-73.95, -73.95]})
+
+        centroids = get_zone_centroids(df, np.array([10027, 10026, 10001]))
+        self.assertTrue(np.allclose(centroids[:2], [[40.90, -73.95],
+                                                    [40.80, -73.95]]))
+        self.assertTrue(np.isnan(centroids[2]).all())
+
+        speeds = get_period_speeds(df, TIME_PERIODS)
+        distance = 6371 * np.radians(0.1)
+        self.assertTrue(np.isclose(speeds[2], 2 * distance))
+        self.assertTrue(np.isclose(speeds[3], distance))
+        self.assertTrue(np.allclose(speeds[[0, 1, 4, 5]], 4 * distance / 3))
+
     def test_simulate_travel_time(self):
         """ Method to test simulate search
         """
@@ -56,6 +125,19 @@ class CalcTravelTimeTestCase(unittest.TestCase):
         result3 = obj.simulate_travel_time(zip_1, zip_4, dt2)
         self.assertTrue(result3 == 2.1717798852931)
 
+    def test_simulate_travel_time_matches_travel_df(self):
+        """Test the lookup array holds every row of travel_df
+        """
+        obj = CalculateTravelTimes(TIME_PERIODS,
+                                   travel_df_path=TRAVEL_DF_PATH)
+        hours = [2, 6, 10, 14, 18, 22]
+
+        for row in obj.travel_df.itertuples():
+            datetime = dt.datetime(2017, 8, 9, hours[row.time_period], 30)
+            result = obj.simulate_travel_time(row.pickup_zips,
+                                              row.dropoff_zips, datetime)
+            self.assertTrue(result == row.mean_travel_time)
+
     def test_return_travel_time_dict(self):
         """Method to test if travel_time dict is looked up correctly
         """
@@ -0,0 +1,121 @@
+import unittest
+import os
+import tempfile
+from datetime import datetime
+from src.data_preprocess.lookup_arrays import save_lookup_arrays
+from src.data_preprocess.lookup_arrays import load_lookup_arrays
+from src.data_preprocess.lookup_arrays import ZIP_CODES_PATH
+from src.data_preprocess.transition import Transition
+from src.data_preprocess.calc_search_time import CalculateSearchTimes
+from src.data_preprocess.calc_travel_times import CalculateTravelTimes
+from src.data_preprocess.calc_mean_fare import CalculateFare
+from src.taxi_environment.monte_carlo import load_fleet
+from src.tools.array_store import save_array_store
+from src.tools.tools import load_zip_codes
+import numpy as np
+
+TIME_PERIODS = 6
+
+
+class LookupArraysTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.array_path = os.path.join(tempfile.mkdtemp(), 'lookup_arrays')
+
+        self.transition = Transition()
+        self.search_times = CalculateSearchTimes()
+        self.travel_times = CalculateTravelTimes()
+        self.fares = CalculateFare()
+
+        save_lookup_arrays(self.array_path, self.travel_times.travel_times,
+                           self.travel_times.zip_codes,
+                           self.travel_times.average_travel_df,
+                           self.search_times.search_df, self.fares.fare_df,
+                           self.transition, TIME_PERIODS, {})
+
+    def assert_lookups_equal(self, array_models, zip_codes):
+        transition, search_times, travel_times, fares = array_models
+        for obj in [self.search_times, self.travel_times, self.fares]:
+            obj.build_lookup(zip_codes)
+
+        self.assertTrue(np.array_equal(search_times.average_waits,
+                                       self.search_times.average_waits,
+                                       equal_nan=True))
+        self.assertTrue(np.array_equal(travel_times.travel_times,
+                                       self.travel_times.travel_times,
+                                       equal_nan=True))
+        self.assertTrue(np.array_equal(travel_times.average_trip_times,
+                                       self.travel_times.average_trip_times,
+                                       equal_nan=True))
+        self.assertTrue(np.array_equal(fares.average_fares,
+                                       self.fares.average_fares,
+                                       equal_nan=True))
+
+    def test_loaded_lookups_match_dataframes(self):
+        array_models = load_lookup_arrays(self.array_path)
+        transition = array_models[0]
+
+        self.assertTrue(np.array_equal(transition.zip_codes,
+                                       self.transition.zip_codes))
+        self.assertTrue(np.array_equal(transition.cdfs,
+                                       self.transition.cdfs))
+        self.assert_lookups_equal(array_models, self.transition.zip_codes)
+
+    def test_build_lookup_realigns_arrays(self):
+        array_models = load_lookup_arrays(self.array_path)
+        zip_codes = sorted(self.transition.zip_codes.tolist())[::-1]
+        zip_codes.append(99999)
+
+        for obj in array_models[1:]:
+            obj.build_lookup(zip_codes)
+
+        self.assertTrue(np.isnan(array_models[1].average_waits[:, -1]).all())
+        self.assert_lookups_equal(array_models, zip_codes)
+
+    def test_store_with_other_time_periods(self):
+        array_path = os.path.join(tempfile.mkdtemp(), 'lookup_arrays')
+        zip_codes = load_zip_codes(ZIP_CODES_PATH)
+        n = len(zip_codes)
+        arrays = {'travel_times': np.arange(4. * n * n).reshape(4, n, n),
+                  'average_trip_times': np.arange(4. * n).reshape(4, n),
+                  'average_waits': np.arange(4. * n).reshape(4, n),
+                  'average_fares': np.arange(4. * n).reshape(4, n),
+                  'transition_matrices': np.tile(np.eye(n), (4, 1, 1))}
+        save_array_store(array_path, arrays, zip_codes, 4)
+
+        with self.assertRaises(ValueError):
+            load_lookup_arrays(array_path)
+
+        transition, search_times, travel_times, fares = load_lookup_arrays(
+            array_path, time_periods=4)
+        # 22:00 is in the last of 4 periods, not the 6 period default
+        date_time = datetime(2013, 1, 5, 22)
+
+        for obj in [transition, search_times, travel_times, fares]:
+            self.assertTrue(obj.time_periods == 4)
+        self.assertTrue(search_times.simulate_search(zip_codes[1], date_time)
+                        == arrays['average_waits'][3, 1])
+        self.assertTrue(travel_times.simulate_travel_time(
+            zip_codes[1], zip_codes[2], date_time) ==
+            arrays['travel_times'][3, 1, 2])
+
+    def test_fleet_from_store_matches_pickles(self):
+        start_date = datetime(2013, 1, 16, 8)
+        end_date = datetime(2013, 1, 16, 11)
+
+        total_fares = []
+        # A path without an array store falls back to the pickles
+        missing_path = os.path.join(tempfile.mkdtemp(), 'lookup_arrays')
+        for array_path in [None, missing_path, self.array_path]:
+            fleet = load_fleet(array_path=array_path)
+            total_fares.append(fleet.run(
+                10001, start_date, end_date,
+                lambda zip_indexes, periods: zip_indexes,
+                rng=np.random.default_rng(5), n_taxis=50))
+
+        self.assertTrue(np.array_equal(total_fares[0], total_fares[1]))
+        self.assertTrue(np.array_equal(total_fares[0], total_fares[2]))
+
+
+if __name__ == '__main__':
+    unittest.main()
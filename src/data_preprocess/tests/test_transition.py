@@ -39,6 +39,25 @@ class TransitionTestCase(unittest.TestCase):
         correct_matrix = [[0.5, 0.5], [0, 1]]
         self.assertTrue(np.array_equal(matrix, correct_matrix))
 
+    # test all period matrices are counted at once and midnight trips are
+    # left out like in map_to_period
+    def test_calculate_matrices_counts_every_period_at_once(self):
+        df = pd.DataFrame({
+            'pickup_zips': [10, 10, 20, 20, 10],
+            'dropoff_zips': [20, 10, 20, 10, 20],
+            'pickup_datetime': pd.to_datetime([
+                '2013-01-01 01:00', '2013-01-01 11:00', '2013-01-01 13:00',
+                '2013-01-01 23:59', '2013-01-01 00:00'])})
+        zip_code_dict = {20: 0, 10: 1}
+
+        obj = Transition.__new__(Transition)
+        matrices = obj.calculate_matrices(None, zip_code_dict, 2,
+                                          data_frame=df)
+
+        correct_matrices = [[[0., 0.], [0.5, 0.5]],
+                            [[0.5, 0.5], [0., 0.]]]
+        self.assertTrue(np.array_equal(matrices, correct_matrices))
+
     # test calculate matrices returns correct probabilities for different
     # time periods
     def test_calculate_matrices_correct_probabilities_diff_time_periods(self):
@@ -88,6 +107,63 @@ class TransitionTestCase(unittest.TestCase):
         new_dropoff = obj.simulate_new_dropoff_zone(10026, test_date, 0.01)
         self.assertTrue(new_dropoff == 10026)
 
+    def test_precomputed_lookups_match_matrices(self):
+        obj = Transition(
+            load_data=True,
+            zip_codes_path=TEST_DATA_PATH + 'DummyZipCodes.json',
+            pickle_path=TEST_DATA_PATH + 'dummy_matrices.pickle',
+            time_periods=2)
+        zip_codes = list(obj.zip_dict.keys())
+
+        for hour, matrix in zip([6, 18], obj.matrices):
+            test_date = datetime(1994, 4, 3, hour, 0, 0)
+            for zip_code, probabilities in zip(zip_codes, matrix):
+                no_observations = all(prob == 0 for prob in probabilities)
+                self.assertTrue(obj.no_observations(zip_code, test_date) ==
+                                no_observations)
+
+                for rand in [0, 0.25, 0.5, 0.75, 1]:
+                    index = np.argmax(np.cumsum(probabilities) > rand)
+                    self.assertTrue(obj.simulate_new_dropoff_zone(
+                        zip_code, test_date, rand) == zip_codes[index])
+
+    def test_simulate_new_dropoff_zones_matches_single_trips(self):
+        obj = Transition(
+            load_data=True,
+            zip_codes_path=TEST_DATA_PATH + 'DummyZipCodes.json',
+            pickle_path=TEST_DATA_PATH + 'dummy_matrices.pickle',
+            time_periods=2)
+        zip_codes = list(obj.zip_dict.keys())
+        hours = {-1: 0, 0: 6, 1: 18}
+
+        zip_indexes, periods, rands = np.array(
+            [(zip_index, period, rand) for zip_index in [0, 1]
+             for period in [-1, 0, 1] for rand in [0, 0.3, 1]]).T
+        zip_indexes = zip_indexes.astype(int)
+        periods = periods.astype(int)
+
+        dropoffs = obj.simulate_new_dropoff_zones(zip_indexes, periods, rands)
+
+        for zip_index, period, rand, dropoff in zip(zip_indexes, periods,
+                                                    rands, dropoffs):
+            test_date = datetime(1994, 4, 3, hours[period], 0, 0)
+            self.assertTrue(obj.simulate_new_dropoff_zone(
+                zip_codes[zip_index], test_date, rand) == dropoff)
+
+    def test_from_arrays_matches_loaded_matrices(self):
+        obj = Transition(
+            load_data=True,
+            zip_codes_path=TEST_DATA_PATH + 'DummyZipCodes.json',
+            pickle_path=TEST_DATA_PATH + 'dummy_matrices.pickle',
+            time_periods=2)
+
+        array_obj = Transition.from_arrays(obj.zip_codes,
+                                           np.asarray(obj.matrices))
+
+        self.assertTrue(array_obj.time_periods == 2)
+        self.assertTrue(array_obj.zip_dict == obj.zip_dict)
+        self.assertTrue(np.array_equal(array_obj.cdfs, obj.cdfs))
+
     def test_no_observations_returns_correct_boolean(self):
         obj = Transition(
             load_data=False,
@@ -1,13 +1,16 @@
-import pandas as pd
 import numpy as np
-from sklearn.preprocessing import normalize
 import json
 import pickle
+from src.tools.tools import minute_period_table, zip_code_indexes
+from src.tools.tools import map_to_period, datetime_periods
+from src.tools.trip_store import load_trips
+from src.tools.artifacts import load_artifact
 
 TIME_PERIODS_IN_DAY = 6
 CSV_PATH = 'data/zips_manhattan.csv'
 ZIP_CODES_PATH = 'data/OrderedZipCodes.json'
 PICKLE_PATH = 'data/trasition_matrices.pickle'
+COLUMNS = ['pickup_zips', 'dropoff_zips', 'pickup_datetime']
 
 
 class Transition():
@@ -29,18 +32,20 @@ class Transition():
 
     def __init__(self, load_data=True, csv_path=CSV_PATH,
                  pickle_path=PICKLE_PATH, time_periods=TIME_PERIODS_IN_DAY,
-                 zip_codes_path=ZIP_CODES_PATH):
+                 zip_codes_path=ZIP_CODES_PATH, data_frame=None):
         """
             Args:
                 load_data: boolean should the probabilites be loaded from a
                 pickle file (True) or calculated from a csv file(False)
                 (if false will save to pickle path and override old file)
-                csv_path: path to csv file with trip data
+                csv_path: path to csv file or trip store with trip data
                 pickle_path: path to pickle file where probabilites should be
                 loaded from/ saved to.
                 time_periods: How many time periods do we divide the day into
                 and calculate seperate probability matrices  for.
                 zip_codes_path: path to json file with ordered zip codes
+                data_frame: trips to use instead of loading csv_path, e.g.
+                a frame shared with the other preprocessing stages
 
             Attr:
                 zip_dict: dictionary mapping zip codes to ordered indexes
@@ -58,7 +63,7 @@ class Transition():
         # calculate probabilities
         if not load_data:
             self.matrices = self.calculate_matrices(
-                csv_path, self.zip_dict, time_periods)
+                csv_path, self.zip_dict, time_periods, data_frame)
             with open(pickle_path, 'wb') as handle:
                 pickle.dump(self.matrices, handle,
                             protocol=pickle.HIGHEST_PROTOCOL)
@@ -67,15 +72,65 @@ class Transition():
 
         # load previously saved probability matrices
         else:
-            with open(pickle_path, 'rb') as handle:
-                self.matrices = pickle.load(handle)
+            self.matrices = load_artifact(pickle_path)
 
             assert len(self.matrices) == time_periods, \
                 "Loaded probabilites divide time periods into a different" \
                 + "number of periods than was specified on initialisation"
             self.time_periods = time_periods
 
-    def calculate_matrices(self, csv_path, zip_dict, time_periods):
+        self.build_lookup()
+
+    @classmethod
+    def from_arrays(cls, zip_codes, matrices):
+        """Builds the transition lookups from an array store's arrays
+
+            Args:
+                zip_codes: zip code at each matrix index
+                matrices: (time_period, zip, zip) transition probabilities
+
+            Returns:
+                Transition
+        """
+        obj = cls.__new__(cls)
+        zip_codes = np.asarray(zip_codes).tolist()
+        obj.zip_dict = dict(zip(zip_codes, np.arange(len(zip_codes))))
+        obj.matrices = matrices
+        obj.time_periods = len(matrices)
+        obj.build_lookup()
+
+        return obj
+
+    def build_lookup(self):
+        """Precomputes what simulating a dropoff needs from the matrices
+
+            Call again if the matrices are replaced.
+
+            Attr:
+                zip_codes: zip code at each matrix index
+                cdfs: cumulative probabilities of each (period, zip) row
+                cdf_values: sorted distinct values of cdfs
+                stacked_cdf_ranks: rank of each cdf value in cdf_values,
+                flattened with the ranks of row r shifted by r * (number of
+                cdf_values + 1), so one searchsorted can search many rows
+                no_observations_mask: (period, zip) rows without any trips
+                period_table: time period of every minute of the day
+        """
+        matrices = np.asarray(self.matrices, dtype=float)
+
+        self.zip_codes = np.array(list(self.zip_dict.keys()))
+        self.cdfs = np.cumsum(matrices, axis=-1)
+        self.cdf_values = np.unique(self.cdfs)
+        ranks = self.cdf_values.searchsorted(self.cdfs)
+        n_rows = self.cdfs.shape[0] * self.cdfs.shape[1]
+        row_offsets = (len(self.cdf_values) + 1) * np.arange(n_rows)
+        self.stacked_cdf_ranks = (ranks.reshape(n_rows, -1) +
+                                  row_offsets[:, None]).ravel()
+        self.no_observations_mask = (matrices == 0).all(axis=-1)
+        self.period_table = minute_period_table(self.time_periods).tolist()
+
+    def calculate_matrices(self, csv_path, zip_dict, time_periods,
+                           data_frame=None):
         """Calculates all the probability transition matrices for each time
             period of the day.
 
@@ -85,31 +140,32 @@ class Transition():
             trip at time period x.
 
             Args:
-                csv_path: path to csv file of past trips where probability
-                matrices are calculated from.
+                csv_path: path to csv file or trip store of past trips where
+                probability matrices are calculated from.
                 zip_dict: ordered dictionary of zipcodes to indexes, used
                 to keep track of the indexes that the probabilites are
                 located at in the matrices
                 time_periods: number of matrices created for different time
                 periods.
+                data_frame: trips to use instead of loading csv_path, its
+                time_period column is used if it has one
 
             Returns:
                 List of transition probability matrices ordered by time period
         """
 
-        csv_data = pd.read_csv(csv_path, skipinitialspace=True)
-        # Need datetime not string
-        csv_data['pickup_datetime'] = pd.to_datetime(
-            csv_data['pickup_datetime'])
+        if data_frame is None:
+            data_frame = load_trips(csv_path, COLUMNS)
 
-        csv_data['period'] = csv_data['pickup_datetime'].map(
-            lambda datetime: self.map_to_period(datetime, time_periods))
+        if 'time_period' in data_frame:
+            periods = data_frame['time_period'].values
+        else:
+            periods = datetime_periods(data_frame['pickup_datetime'],
+                                       time_periods)
 
-        matrices = []
-        for i in range(time_periods):
-            sub_period = csv_data[csv_data['period'] == i]
-            matrices.append(self.calculate_matrix(sub_period, zip_dict))
-        return matrices
+        counts = self.count_transitions(data_frame, zip_dict, periods,
+                                        time_periods)
+        return list(self.normalize_counts(counts))
 
     @staticmethod
     def calculate_matrix(data_frame, zip_dict):
@@ -128,28 +184,72 @@ class Transition():
             Returns:
                 Matrix of transition probabilities
         """
+        periods = np.zeros(len(data_frame), dtype=np.int64)
+        counts = Transition.count_transitions(data_frame, zip_dict, periods, 1)
+        return Transition.normalize_counts(counts)[0]
+
+    @staticmethod
+    def count_transitions(data_frame, zip_dict, periods, time_periods):
+        """Counts the trips from each zip code to each other zip code in
+            every time period at once.
+
+            The (period, pickup index, dropoff index) of every trip is
+            flattened into one index and counted with a single bincount.
+            Trips in period -1 (midnight) are not counted.
+
+            Args:
+                data_frame: pandas dataframe containing taxi trips
+                zip_dict: dictionary of zipcode -> index order
+                periods: time period of each trip
+                time_periods: number of time periods
+
+            Returns:
+                (time_periods, zips, zips) array of trip counts
+        """
         n = len(zip_dict)
-        transition_matrix = np.zeros(shape=(n, n))
+        pickups = Transition.zip_indexes(data_frame['pickup_zips'], zip_dict)
+        dropoffs = Transition.zip_indexes(data_frame['dropoff_zips'],
+                                          zip_dict)
 
-        def add_to_transition(row):
-            """Helper function that takes in a past trip as an arg and
-                updates the transition matrix selecting the location
-                -> row that the taxi picked up
-                -> column the taxi dropped off to
-                and adding 1 to that location
-            """
-            pickup_zip = row['pickup_zips']
-            dropoff_zip = row['dropoff_zips']
+        periods = np.asarray(periods, dtype=np.int64)
+        in_day = (periods >= 0) & (periods < time_periods)
+        flat_index = (periods[in_day] * n + pickups[in_day]) * n
+        flat_index += dropoffs[in_day]
 
-            matrix_row_index = zip_dict[pickup_zip]
-            matrix_col_index = zip_dict[dropoff_zip]
+        counts = np.bincount(flat_index, minlength=time_periods * n * n)
+        return counts.reshape(time_periods, n, n).astype(float)
 
-            transition_matrix[matrix_row_index][matrix_col_index] += 1
+    @staticmethod
+    def normalize_counts(counts):
+        """Normalizes the trip counts row wise to get probabilities, rows
+            without trips stay zero.
+        """
+        totals = counts.sum(axis=-1, keepdims=True)
+        return counts / np.where(totals > 0, totals, 1)
 
-        data_frame.apply(add_to_transition, axis=1)
-        # Transition matrix now contains raw counts of trips
-        # we normalize row wise to get probabilites
-        return normalize(transition_matrix, axis=1, norm='l1')
+    @staticmethod
+    def zip_indexes(zips, zip_dict):
+        """Looks up the matrix index of every zip code at once
+
+            Args:
+                zips: zip codes to look up
+                zip_dict: dictionary of zipcode -> index order
+
+            Returns:
+                numpy array of indexes
+
+            Raises:
+                KeyError: if a zip code is not in zip_dict
+        """
+        zip_codes = np.array(list(zip_dict.keys()), dtype=np.int64)
+        indexes = np.array(list(zip_dict.values()), dtype=np.int64)
+        zips = np.asarray(zips, dtype=np.int64)
+
+        positions = zip_code_indexes(zips, zip_codes)
+        if (positions < 0).any():
+            raise KeyError(zips[positions < 0][0])
+
+        return indexes[positions]
 
     def simulate_new_dropoff_zone(self, current_zip_code, date_time, rand):
         """Returns the zip code where a passenger wants to travel to
@@ -171,19 +271,82 @@ class Transition():
                 drop_off_zip_code: new zip code passenger travels to
         """
 
-        assert rand >= 0 and rand <= 1, "Random Number must be 0-1 scale"
-        matrix_index = self.map_to_period(date_time, self.time_periods)
-        time_period_matrix = self.matrices[matrix_index]
+        matrix_index = self.period_table[date_time.hour * 60 +
+                                         date_time.minute]
+        return self.simulate_dropoff_in_period(current_zip_code, matrix_index,
+                                               rand)
 
-        vector_index = self.zip_dict[current_zip_code]
-        zip_code_probabilities = time_period_matrix[vector_index]
+    def simulate_dropoff_in_period(self, current_zip_code, time_period, rand):
+        """Returns the zip code where a passenger wants to travel to, as
+            simulate_new_dropoff_zone but given the time period of the day.
 
-        cdf = np.cumsum(zip_code_probabilities)
-        new_vector_index = np.argmax(cdf > rand)
+            Args:
+                current_zip_code: the zip code where the taxi driver picks up
+                the passenger from
+                time_period: index of the time period of the day
+                rand: random number between 0 and 1
 
-        drop_off_zip_code = list(self.zip_dict.keys())[new_vector_index]
+            Returns:
+                drop_off_zip_code: new zip code passenger travels to
+        """
+        assert rand >= 0 and rand <= 1, "Random Number must be 0-1 scale"
+        cdf = self.cdfs[time_period, self.zip_dict[current_zip_code]]
+
+        # First index where the cdf exceeds rand, the first zip if none does
+        new_vector_index = cdf.searchsorted(rand, side='right')
+        if new_vector_index == len(cdf):
+            new_vector_index = 0
+
+        drop_off_zip_code = self.zip_codes[new_vector_index]
         return drop_off_zip_code
 
+    def sample_dropoff_indexes(self, zip_indexes, periods, rands):
+        """Simulates the dropoff zip index of many trips at once.
+
+            Each rand is converted to the rank of the first cdf value that
+            exceeds it and shifted by its (period, zip) row's offset, so one
+            searchsorted over stacked_cdf_ranks finds the first cdf
+            exceeding it in its own row. Working on integer ranks keeps the
+            result identical to simulate_new_dropoff_zone, including
+            returning the first zip when no cdf exceeds rand.
+
+            Args:
+                zip_indexes: matrix index of each trip's pickup zip
+                periods: time period of each trip, -1 (midnight) is the last
+                period as in simulate_new_dropoff_zone
+                rands: random number between 0 and 1 for each trip
+
+            Returns:
+                numpy array of dropoff zip indexes
+        """
+        n_periods, n_zips = self.cdfs.shape[:2]
+        rows = (np.asarray(periods) % n_periods) * n_zips
+        rows += np.asarray(zip_indexes)
+
+        ranks = self.cdf_values.searchsorted(np.asarray(rands, dtype=float),
+                                             side='right')
+        positions = self.stacked_cdf_ranks.searchsorted(
+            ranks + (len(self.cdf_values) + 1) * rows)
+        indexes = positions - rows * n_zips
+        indexes[indexes == n_zips] = 0
+
+        return indexes
+
+    def simulate_new_dropoff_zones(self, zip_indexes, periods, rands):
+        """Returns the zip codes passengers want to travel to for many trips
+            at once, see sample_dropoff_indexes.
+
+            Args:
+                zip_indexes: matrix index of each trip's pickup zip
+                periods: time period of each trip
+                rands: random number between 0 and 1 for each trip
+
+            Returns:
+                numpy array of dropoff zip codes
+        """
+        return self.zip_codes[self.sample_dropoff_indexes(zip_indexes,
+                                                          periods, rands)]
+
     def no_observations(self, zip_code, date_time):
         """Method is used to see if there are any past observations for a
             given zip code.
@@ -206,13 +369,11 @@ class Transition():
             Returns:
                 boolean: no observations
         """
-        matrix_index = self.map_to_period(date_time, self.time_periods)
-        time_period_matrix = self.matrices[matrix_index]
-
+        matrix_index = self.period_table[date_time.hour * 60 +
+                                         date_time.minute]
         vector_index = self.zip_dict[zip_code]
-        zip_code_probabilities = time_period_matrix[vector_index]
 
-        return all(prob == 0 for prob in zip_code_probabilities)
+        return bool(self.no_observations_mask[matrix_index, vector_index])
 
     @staticmethod
     def map_to_period(datetime, time_periods):
@@ -226,6 +387,4 @@ class Transition():
             Returns:
                 index of time period: 0 -> time_periods - 1 (int)
         """
-        decimal_hour = datetime.hour + (datetime.minute / 60)
-        cut_offs = np.linspace(0, 24, time_periods + 1)
-        return np.argmax(cut_offs >= decimal_hour) - 1
+        return map_to_period(datetime, time_periods)
@@ -1,5 +1,9 @@
 import numpy as np
+from datetime import datetime as dt
+from src.tools.tools import minute_period_table, load_zip_codes
 ZIP_CODES_PATH = 'data/OrderedZipCodes.json'
+TIME_PERIODS = 6
+TILE_SIZE = 4096
 
 
 class HighestEpm():
@@ -9,7 +13,8 @@ class HighestEpm():
     """
 
     def __init__(self, average_search_dict_func, distance_dict_func,
-                 average_fare_dict_func, average_journey_length_func):
+                 average_fare_dict_func, average_journey_length_func,
+                 precompute=False, time_periods=TIME_PERIODS):
         """
             Args:
                 average_search_dict_function: takes in a datetime and returns
@@ -23,12 +28,200 @@ class HighestEpm():
                 average_journey_length: takes a datetime and returns a
                     dictionary of the average journey length for all zip
                     codes
+                precompute: answer choose from a (time period, zip) table
+                    of decisions, built on the first call. The functions
+                    must only depend on the time period of the datetime
+                time_periods: number of time periods the functions divide
+                    the day into
         """
         self.average_search_dict_func = average_search_dict_func
         self.distance_dict_func = distance_dict_func
         self.average_fare_dict_func = average_fare_dict_func
         self.average_journey_length_func = average_journey_length_func
 
+        self.precompute = precompute
+        self.time_periods = time_periods
+        self.period_table = minute_period_table(time_periods).tolist()
+        self.providers = None
+        self.zip_codes = None
+        self.zip_index = None
+        self.invalidate_table()
+
+    @classmethod
+    def from_providers(cls, search_times, travel_times, fares,
+                       zip_codes=None, precompute=False,
+                       time_periods=TIME_PERIODS):
+        """
+            Builds a HighestEpm which reads numpy arrays from the loaded
+            preprocessing objects rather than dictionaries.
+
+            The lookups of every provider are rebuilt in the order of
+            zip_codes and checked once here, so choose needs no sorting or
+            alignment of keys.
+
+            Args:
+                search_times: CalculateSearchTimes with loaded data
+                travel_times: CalculateTravelTimes with loaded data
+                fares: CalculateFare with loaded data
+                zip_codes: zip codes the arrays are aligned to, those in
+                    ZIP_CODES_PATH if None
+                precompute: as in __init__
+                time_periods: as in __init__
+
+            Returns:
+                HighestEpm
+        """
+        if zip_codes is None:
+            zip_codes = load_zip_codes(ZIP_CODES_PATH)
+
+        obj = cls(search_times.get_time_period_search,
+                  travel_times.return_travel_time_dict,
+                  fares.return_average_fare,
+                  travel_times.return_average_travel_time,
+                  precompute, time_periods)
+        obj.set_providers(search_times, travel_times, fares, zip_codes)
+
+        return obj
+
+    def set_providers(self, search_times, travel_times, fares, zip_codes):
+        """
+            Aligns the providers' arrays to zip_codes and checks them.
+
+            Args:
+                search_times: exposes average_search_vector(time_period)
+                travel_times: exposes travel_time_matrix(time_period) and
+                    average_travel_time_vector(time_period)
+                fares: exposes average_fare_vector(time_period)
+                zip_codes: zip codes the arrays are aligned to
+        """
+        zip_codes = np.asarray(zip_codes)
+        n = len(zip_codes)
+
+        for provider in [search_times, travel_times, fares]:
+            provider.build_lookup(zip_codes)
+            if not np.array_equal(provider.zip_codes, zip_codes):
+                raise ValueError("%s is not aligned to the zip codes" %
+                                 type(provider).__name__)
+
+        for period in range(self.time_periods):
+            shapes = [search_times.average_search_vector(period).shape,
+                      travel_times.travel_time_matrix(period).shape,
+                      fares.average_fare_vector(period).shape,
+                      travel_times.average_travel_time_vector(period).shape]
+            if shapes != [(n,), (n, n), (n,), (n,)]:
+                raise ValueError("Provider arrays of time period %d do not "
+                                 "match %d zip codes" % (period, n))
+
+        self.providers = (search_times, travel_times, fares)
+        self.zip_codes = zip_codes
+        self.zip_index = {zip_code: index for index, zip_code
+                          in enumerate(zip_codes.tolist())}
+        # Candidates in ascending zip order, so ties go to the smallest zip
+        # code as with the sorted dictionaries
+        self.sorted_indexes = np.argsort(zip_codes, kind='mergesort')
+        self.invalidate_table()
+
+    def invalidate_table(self):
+        """
+            Marks the decision table as out of date, e.g. after the data
+            behind the functions changed. It is rebuilt on the next choose.
+        """
+        self.best_zips = None
+        self.best_zip_indexes = None
+        self.best_epms = None
+
+    def earnings_per_minute(self, time_period, zip_index=None):
+        """
+            Calculates the earnings per minute of moving to each zip code
+            from the provider arrays.
+
+            Args:
+                time_period: index of the time period of the day
+                zip_index: index of the zip code the taxi is in, all zip
+                    codes if None
+
+            Returns:
+                (zip) earnings per minute of each destination, or
+                (zip, zip) for every current zip code. Nan where a provider
+                has no data
+        """
+        search_times, travel_times, fares = self.providers
+        travel_time = travel_times.travel_time_matrix(time_period)
+        if zip_index is not None:
+            travel_time = travel_time[zip_index]
+
+        total_time = (search_times.average_search_vector(time_period) +
+                      travel_time +
+                      travel_times.average_travel_time_vector(time_period))
+
+        return fares.average_fare_vector(time_period) / total_time
+
+    def _best_indexes(self, earnings_per_minute):
+        """
+            Finds the index of the highest earnings per minute along the last
+            axis, ignoring nan and breaking ties to the smallest zip code.
+        """
+        earnings_per_minute = earnings_per_minute[..., self.sorted_indexes]
+        earnings_per_minute = np.where(np.isnan(earnings_per_minute),
+                                       -np.inf, earnings_per_minute)
+
+        return self.sorted_indexes[np.argmax(earnings_per_minute, axis=-1)]
+
+    def build_table(self):
+        """
+            Builds the (time period, zip) table of the zip code with the
+            highest earnings per minute and its earnings per minute.
+
+            With providers each time period is one (zip, zip) array
+            operation, otherwise the functions are evaluated once for each
+            time period, at its first minute.
+
+            Attr:
+                zip_codes: zip codes indexing the table
+                zip_index: dictionary of zip code -> table index
+                best_zips: (time_period, zip) zip codes to move to
+                best_zip_indexes: (time_period, zip) their indexes in
+                    zip_codes, only with providers
+                best_epms: (time_period, zip) their earnings per minute
+        """
+        if self.providers is not None:
+            n = len(self.zip_codes)
+            best_zip_indexes = np.zeros((self.time_periods, n),
+                                        dtype=np.int64)
+            best_epms = np.zeros((self.time_periods, n))
+
+            for period in range(self.time_periods):
+                epms = self.earnings_per_minute(period)
+                best_zip_indexes[period] = self._best_indexes(epms)
+                best_epms[period] = epms[np.arange(n),
+                                         best_zip_indexes[period]]
+
+            self.best_zips = self.zip_codes[best_zip_indexes]
+            self.best_zip_indexes = best_zip_indexes
+            self.best_epms = best_epms
+            return
+
+        zip_codes = None
+
+        for period in range(self.time_periods):
+            datetime = self._period_datetime(period)
+            if zip_codes is None:
+                zip_codes = np.array(sorted(
+                    self.average_search_dict_func(datetime).keys()))
+                best_zips = np.zeros((self.time_periods, len(zip_codes)),
+                                     dtype=zip_codes.dtype)
+                best_epms = np.zeros((self.time_periods, len(zip_codes)))
+
+            for index, zip_code in enumerate(zip_codes):
+                best_zips[period, index], best_epms[period, index] = \
+                    self._highest_epm(zip_code, datetime)
+
+        self.zip_codes = zip_codes
+        self.zip_index = {zip_code: index for index, zip_code
+                          in enumerate(zip_codes.tolist())}
+        self.best_zips = best_zips
+        self.best_epms = best_epms
+
     def choose(self, zip_code, datetime):
         """
             Choose the zip code we expect will make us the most money in the
@@ -45,7 +238,121 @@ class HighestEpm():
             Returns:
                 zip code with highest earnings per minute
         """
+        if self.precompute or self.providers is not None:
+            # Midnight (period -1) uses the last period of the day
+            period = self.period_table[datetime.hour * 60 + datetime.minute]
+            return self.choose_in_period(zip_code, period)
+
+        return self._highest_epm(zip_code, datetime)[0]
+
+    def choose_in_period(self, zip_code, time_period):
+        """
+            Choose the zip code to move to in a time period, as choose.
+
+            Takes the index of the time period instead of a datetime, so it
+            can be the decision function of TaxiEnvironment(fast=True).
+            Without precompute or providers the functions are evaluated at
+            the first minute of the time period.
+
+            Args:
+                zip_code: zip code where the taxi currently is
+                time_period: index of the time period of the day, -1 is the
+                    last period
+
+            Returns:
+                zip code with highest earnings per minute
+        """
+        if self.precompute:
+            if self.best_zips is None:
+                self.build_table()
+
+            return self.best_zips[time_period, self.zip_index[zip_code]]
+
+        if self.providers is not None:
+            epms = self.earnings_per_minute(time_period,
+                                            self.zip_index[zip_code])
+            return self.zip_codes[self._best_indexes(epms)]
+
+        return self._highest_epm(zip_code,
+                                 self._period_datetime(time_period))[0]
+
+    def choose_many(self, zip_indexes, periods, tile_size=TILE_SIZE):
+        """
+            Choose the zip code to move to for many taxis at once, as choose.
+
+            The earnings per minute of every (taxi, zip code) pair are
+            evaluated with one broadcast per tile of tile_size taxis, which
+            bounds the memory used for large fleets. With precompute the
+            choices are read from the decision table instead.
 
+            Zip indexes are positions in zip_codes, the order the providers
+            were aligned to, so choose_many can be the decision function of
+            FleetEnvironment.run when both use the same zip codes.
+
+            Args:
+                zip_indexes: index of each taxi's zip code in zip_codes
+                periods: time period of each taxi, -1 is the last period
+                tile_size: number of taxis evaluated together
+
+            Returns:
+                indexes in zip_codes of the zip codes with highest earnings
+                per minute
+        """
+        if self.providers is None:
+            raise ValueError("choose_many needs providers, see "
+                             "from_providers")
+
+        zip_indexes = np.asarray(zip_indexes)
+        periods = np.asarray(periods)
+
+        if self.precompute:
+            if self.best_zip_indexes is None:
+                self.build_table()
+
+            return self.best_zip_indexes[periods, zip_indexes]
+
+        search_times, travel_times, fares = self.providers
+        period_range = range(self.time_periods)
+        average_searches = np.stack([search_times.average_search_vector(period)
+                                     for period in period_range])
+        travel_time = np.stack([travel_times.travel_time_matrix(period)
+                                for period in period_range])
+        journey_times = np.stack([
+            travel_times.average_travel_time_vector(period)
+            for period in period_range])
+        average_fares = np.stack([fares.average_fare_vector(period)
+                                  for period in period_range])
+
+        best = np.empty(len(zip_indexes), dtype=np.int64)
+        for start in range(0, len(zip_indexes), tile_size):
+            tile = slice(start, start + tile_size)
+            tile_periods = periods[tile]
+
+            # (taxi, zip) time to drive, search and drop passenger off
+            total_time = (average_searches[tile_periods] +
+                          travel_time[tile_periods, zip_indexes[tile]] +
+                          journey_times[tile_periods])
+            best[tile] = self._best_indexes(average_fares[tile_periods] /
+                                            total_time)
+
+        return best
+
+    def _period_datetime(self, time_period):
+        """
+            Returns a datetime at the first minute of the time period.
+        """
+        minute = self.period_table.index(time_period)
+        return dt(2013, 1, 1, minute // 60, minute % 60)
+
+    def _highest_epm(self, zip_code, datetime):
+        """
+            Finds the zip code with the highest earnings per minute from the
+            dictionaries of the functions.
+
+            Returns:
+                zip code with highest earnings per minute and its earnings
+                per minute
+        """
         average_search = self.average_search_dict_func(datetime)
         distances = self.distance_dict_func(zip_code, datetime)
         average_fare = self.average_fare_dict_func(datetime)
@@ -72,4 +379,4 @@ class HighestEpm():
 
         highest_index = np.argmax(earnings_per_minute)
 
-        return keys[0][highest_index]
+        return keys[0][highest_index], earnings_per_minute[highest_index]
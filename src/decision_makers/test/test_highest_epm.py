@@ -1,6 +1,46 @@
 import unittest
+import numpy as np
 from datetime import datetime
 from decision_makers.highest_epm import HighestEpm
+from src.taxi_environment.fleet_environment import FleetEnvironment
+from src.taxi_environment.taxi_environment import TaxiEnvironment
+
+
+class FakeProvider(object):
+    """Provider of the same statistics as the fake dict functions, as arrays
+    ordered by zip_codes"""
+
+    def __init__(self, zip_codes):
+        self.all_zip_codes = zip_codes
+        self.build_lookup(zip_codes)
+
+    def build_lookup(self, zip_codes=None):
+        self.zip_codes = np.asarray(zip_codes)
+        order = [self.all_zip_codes.index(zip_code)
+                 for zip_code in zip_codes]
+        distances = np.array([[1, 10], [10, 1]])
+        self.arrays = {'search': np.array([5, 8])[order],
+                       'travel': distances[order][:, order],
+                       'fare': np.array([22, 18])[order],
+                       'journey': np.array([11, 8])[order]}
+
+    def average_search_vector(self, time_period):
+        return self.arrays['search']
+
+    def travel_time_matrix(self, time_period):
+        return self.arrays['travel']
+
+    def average_fare_vector(self, time_period):
+        return self.arrays['fare']
+
+    def average_travel_time_vector(self, time_period):
+        return self.arrays['journey']
+
+    def get_time_period_search(self, datetime):
+        return {}
+
+    return_travel_time_dict = return_average_fare = None
+    return_average_travel_time = None
 
 
 class HighestEpmTestCase(unittest.TestCase):
@@ -41,6 +81,11 @@ class HighestEpmTestCase(unittest.TestCase):
                               fake_distance_dict_func,
                               fake_average_fare_dict_func,
                               fake_average_journey_length)
+        self.table_obj = HighestEpm(fake_average_search_dict_func,
+                                    fake_distance_dict_func,
+                                    fake_average_fare_dict_func,
+                                    fake_average_journey_length,
+                                    precompute=True)
 
     def test_choose_picks_highest_earnings_per_minute(self):
         test_date = datetime(1999, 4, 3, 2, 44, 1)
@@ -53,6 +98,129 @@ class HighestEpmTestCase(unittest.TestCase):
 
         self.assertTrue(choice == 10027)
 
+    def test_precomputed_choose_matches_choose(self):
+        self.assertTrue(self.table_obj.best_zips is None)
+
+        for hour in [0, 2, 13, 23]:
+            test_date = datetime(1999, 4, 3, hour, 44, 1)
+            for zip_code in [10026, 10027]:
+                self.assertTrue(self.table_obj.choose(zip_code, test_date) ==
+                                self.obj.choose(zip_code, test_date))
+
+        self.assertTrue(self.table_obj.best_zips.shape == (6, 2))
+        self.assertTrue(self.table_obj.best_epms[0].tolist() ==
+                        [22 / 17, 18 / 17])
+
+        self.table_obj.invalidate_table()
+        self.assertTrue(self.table_obj.best_zips is None)
+
+    def test_providers_match_choose(self):
+        provider = FakeProvider([10026, 10027])
+
+        for precompute in [False, True]:
+            obj = HighestEpm.from_providers(provider, provider, provider,
+                                            zip_codes=[10027, 10026],
+                                            precompute=precompute)
+            for hour in [0, 2, 13]:
+                test_date = datetime(1999, 4, 3, hour, 44, 1)
+                for zip_code in [10026, 10027]:
+                    self.assertTrue(obj.choose(zip_code, test_date) ==
+                                    self.obj.choose(zip_code, test_date))
+
+        epms = obj.earnings_per_minute(0)
+        self.assertTrue(np.array_equal(epms, [[18 / 17, 22 / 26],
+                                              [18 / 26, 22 / 17]]))
+        self.assertTrue(np.array_equal(obj.earnings_per_minute(0, 1),
+                                       epms[1]))
+
+    def test_choose_many_matches_choose(self):
+        provider = FakeProvider([10026, 10027])
+        obj = HighestEpm.from_providers(provider, provider, provider,
+                                        zip_codes=[10027, 10026])
+        table_obj = HighestEpm.from_providers(provider, provider, provider,
+                                              zip_codes=[10027, 10026],
+                                              precompute=True)
+        zip_indexes = np.array([0, 1, 1, 0, 1])
+        periods = np.array([0, 3, -1, 5, 2])
+        expected = [obj.choose(obj.zip_codes[zip_index],
+                               datetime(1999, 4, 3, 2, 44, 1))
+                    for zip_index in zip_indexes]
+
+        for choices in [obj.choose_many(zip_indexes, periods, tile_size=2),
+                        table_obj.choose_many(zip_indexes, periods)]:
+            self.assertTrue(obj.zip_codes[choices].tolist() == expected)
+
+        with self.assertRaises(ValueError):
+            self.obj.choose_many(zip_indexes, periods)
+
+    def test_choose_many_drives_fleet_environment(self):
+        provider = FakeProvider([10026, 10027])
+        zip_codes = [10027, 10026]
+        chosen = []
+
+        for precompute in [False, True]:
+            obj = HighestEpm.from_providers(provider, provider, provider,
+                                            zip_codes=zip_codes,
+                                            precompute=precompute)
+
+            def decision_func(zip_indexes, periods):
+                choices = obj.choose_many(zip_indexes, periods)
+                chosen.extend(zip(zip_indexes.tolist(), choices.tolist()))
+                return choices
+
+            # Customers always stay in the zone they are picked up in
+            fleet = FleetEnvironment(
+                zip_codes, lambda zips, periods, rands: zips,
+                lambda zips, periods, rng: np.full(len(zips), 5.),
+                lambda starts, ends, periods: np.full(len(starts), 10.))
+            total_fares = fleet.run([10026, 10027],
+                                    datetime(1999, 4, 3, 13, 44, 1),
+                                    datetime(1999, 4, 3, 14, 44, 1),
+                                    decision_func)
+
+            self.assertTrue(total_fares.tolist() == [20, 20])
+
+        self.assertTrue(set(chosen) == {(0, 0), (1, 1)})
+
+    def test_choose_in_period_drives_fast_taxi_environment(self):
+        provider = FakeProvider([10026, 10027])
+        provider_obj = HighestEpm.from_providers(provider, provider, provider,
+                                                 zip_codes=[10027, 10026])
+
+        # Customers always stay in the zone they are picked up in
+        def trip_func(zip_code, datetime, rand):
+            return zip_code
+
+        for obj in [self.obj, self.table_obj, provider_obj]:
+            histories = []
+            total_fares = []
+            for fast, decision_func in [(False, obj.choose),
+                                        (True, obj.choose_in_period)]:
+                env = TaxiEnvironment(trip_func,
+                                      lambda zip_code, datetime: 5,
+                                      lambda start, end, datetime: 10,
+                                      fast=fast)
+                total_fares.append(env.run(10027,
+                                           datetime(1999, 4, 3, 13, 44, 1),
+                                           datetime(1999, 4, 3, 14, 44, 1),
+                                           decision_func))
+                histories.append(list(env.zip_code_travel_history))
+
+            self.assertTrue(total_fares == [20, 20])
+            self.assertTrue(histories[0] == histories[1])
+            self.assertTrue(histories[1] == [10027] * 6)
+
+        self.assertTrue(self.obj.choose_in_period(10026, -1) == 10026)
+
+    def test_providers_must_be_aligned(self):
+        provider = FakeProvider([10026, 10027])
+        unaligned = FakeProvider([10026, 10027])
+        unaligned.build_lookup = lambda zip_codes: None
+
+        with self.assertRaises(ValueError):
+            HighestEpm.from_providers(provider, unaligned, provider,
+                                      zip_codes=[10027, 10026])
+
 
 if __name__ == '__main__':
     unittest.main()
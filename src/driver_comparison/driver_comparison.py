@@ -1,8 +1,18 @@
+import os
+from multiprocessing import Pool
+import numpy as np
 import pandas as pd
 from datetime import timedelta
+from src.tools.trip_store import load_trips
 
 CSV_PATH = 'data/zips_manhattan.csv'
 VOID_TAXI_PARAM = 35
+COLUMNS = ['medallion', 'pickup_datetime', 'dropoff_datetime',
+           'trip_time_in_secs', 'fare_amount']
+POOL_MIN_SHIFTS = 500
+
+# DriverComparison of the current worker process
+_comparison = None
 
 
 class DriverComparison():
@@ -19,8 +29,8 @@ class DriverComparison():
 
     def __init__(self, csv_path=CSV_PATH, void_taxi_param=VOID_TAXI_PARAM):
         """
-            On initialisation past booking data from a csv file is loaded
-            and processed in a pandas dataframe.
+            On initialisation past booking data from a csv file or trip
+            store is loaded and processed in a pandas dataframe.
 
             Args:
                 csv_path: string path to past booking data
@@ -30,17 +40,85 @@ class DriverComparison():
 
             Attributes:
                 data: pandas dataframe containing past booking data
-                    with datetime columns
+                    with datetime columns, sorted by pickup time
                 void_taxi_param: see above
         """
-        self.data = pd.read_csv(csv_path, skipinitialspace=True)
-        self.data['pickup_datetime'] = pd.to_datetime(
-            self.data['pickup_datetime'])
-        self.data['dropoff_datetime'] = pd.to_datetime(
-            self.data['dropoff_datetime'])
-        self.data = self.data.sort_values(by='pickup_datetime')
+        self.data = load_trips(csv_path, COLUMNS)
+        self.data = self.data.sort_values(by='pickup_datetime',
+                                          kind='mergesort')
 
         self.void_taxi_param = void_taxi_param
+        self.build_index()
+
+    def build_index(self):
+        """
+            Builds the index shift_trips and medallion_trips slice data
+            with. Call again if data is replaced.
+
+            Attributes:
+                pickup_times: numpy datetimes of the pickups in data, sorted
+                medallions: medallion of each medallion code
+                medallion_codes: dictionary of medallion -> medallion code
+                row_codes: medallion code of each row of data
+                medallion_order: positions of the rows of data grouped by
+                    medallion code, in pickup order within each medallion
+                medallion_offsets: medallion_order[medallion_offsets[code]:
+                    medallion_offsets[code + 1]] are a medallion's rows
+        """
+        self.pickup_times = self.data['pickup_datetime'].values
+        codes, self.medallions = pd.factorize(self.data['medallion'])
+        self.row_codes = codes
+        self.medallion_codes = {medallion: code for code, medallion
+                                in enumerate(self.medallions)}
+
+        self.medallion_order = np.argsort(codes, kind='mergesort')
+        self.medallion_offsets = np.searchsorted(
+            codes[self.medallion_order], np.arange(len(self.medallions) + 1))
+
+    def shift_trips(self, start_shift, end_shift):
+        """
+            Returns the rows of data picked up between two datetimes, as
+            filter_date(data, start_shift, end_shift), by binary search of
+            the sorted pickup times rather than a scan of data.
+
+            Args:
+                start_shift: datetime shift started at
+                end_shift: datetime shift ended at
+
+            Returns:
+                pandas dataframe slice of data
+        """
+        first = np.searchsorted(self.pickup_times, np.datetime64(start_shift),
+                                side='right')
+        last = np.searchsorted(self.pickup_times, np.datetime64(end_shift),
+                               side='left')
+
+        return self.data.iloc[first:max(first, last)]
+
+    def medallion_trips(self, medallion, start_shift, end_shift):
+        """
+            Returns the rows of data for one medallion picked up between two
+            datetimes.
+
+            Args:
+                medallion: taxi license number
+                start_shift: datetime shift started at
+                end_shift: datetime shift ended at
+
+            Returns:
+                pandas dataframe of the medallion's trips
+        """
+        code = self.medallion_codes[medallion]
+        rows = self.medallion_order[self.medallion_offsets[code]:
+                                    self.medallion_offsets[code + 1]]
+        pickup_times = self.pickup_times[rows]
+
+        first = np.searchsorted(pickup_times, np.datetime64(start_shift),
+                                side='right')
+        last = np.searchsorted(pickup_times, np.datetime64(end_shift),
+                               side='left')
+
+        return self.data.iloc[rows[first:max(first, last)]]
 
     def average_earnings(self, start_shift, end_shift):
         """
@@ -53,7 +131,7 @@ class DriverComparison():
                 end_shift: datetime the taxi driver should at least be working
                     up to
         """
-        filtered_df = self.filter_date(self.data, start_shift, end_shift)
+        filtered_df = self.shift_trips(start_shift, end_shift)
         filtered_df = self.filter_void_medallions(filtered_df,
                                                   start_shift,
                                                   end_shift)
@@ -65,7 +143,7 @@ class DriverComparison():
         return filtered_df['fare_amount'].sum() / n_medallions
 
     def total_trip_time(self, start_shift, end_shift):
-        filtered_df = self.filter_date(self.data, start_shift, end_shift)
+        filtered_df = self.shift_trips(start_shift, end_shift)
         filtered_df = self.filter_void_medallions(filtered_df,
                                                   start_shift,
                                                   end_shift)
@@ -77,7 +155,7 @@ class DriverComparison():
         return (filtered_df['trip_time_in_secs'].sum() / n_medallions) / 60
 
     def compare(self, start_shift, end_shift):
-        filtered_df = self.filter_date(self.data, start_shift, end_shift)
+        filtered_df = self.shift_trips(start_shift, end_shift)
         filtered_df = self.filter_void_medallions(filtered_df,
                                                   start_shift,
                                                   end_shift)
@@ -99,9 +177,107 @@ class DriverComparison():
                 'n_medallions': n_medallions,
                 'average_drive_time': average_driving_time,
                 'average_fare': average_fare,
-                'medallions': (filtered_df.groupby('medallion')[['trip_time_in_secs', 'fare_amount']].sum())
+                'medallions': (filtered_df.groupby(
+                    'medallion', observed=True)[
+                        ['trip_time_in_secs', 'fare_amount']].sum())
             }
 
+    def compare_many(self, shifts, n_workers=1):
+        """
+            Compares the drivers of many shifts, as compare, without
+            building a dataframe for each shift.
+
+            Each shift is sliced from the pickup-sorted columns of data with
+            shift_trips' binary search and evaluated on numpy arrays.
+
+            Args:
+                shifts: list of (start_shift, end_shift) datetimes
+                n_workers: number of worker processes, os.cpu_count() if
+                    None. Lists shorter than POOL_MIN_SHIFTS run in this
+                    process
+
+            Returns:
+                results: dataframe with a row for each shift of
+                    start_shift, end_shift, n_medallions, average_fare and
+                    average_drive_time
+                medallions: dataframe with a row for each working medallion
+                    of each shift of shift (row of results), medallion,
+                    trip_time_in_secs and fare_amount summed over the shift
+        """
+        n_workers = n_workers or os.cpu_count()
+        shifts = list(shifts)
+
+        if n_workers == 1 or len(shifts) < POOL_MIN_SHIFTS:
+            compared = [self._compare_shift(start_shift, end_shift)
+                        for start_shift, end_shift in shifts]
+        else:
+            with Pool(n_workers, initializer=_init_worker,
+                      initargs=(self,)) as pool:
+                compared = pool.map(_compare_shift, shifts,
+                                    chunksize=len(shifts) // n_workers + 1)
+
+        results = pd.DataFrame(
+            [tuple(shift) + result[:3]
+             for shift, result in zip(shifts, compared)],
+            columns=['start_shift', 'end_shift', 'n_medallions',
+                     'average_fare', 'average_drive_time'])
+
+        shift_indexes = np.repeat(np.arange(len(shifts)),
+                                  [len(result[3]) for result in compared])
+        codes = np.concatenate([result[3] for result in compared] +
+                               [np.zeros(0, dtype=np.int64)])
+        medallions = pd.DataFrame({
+            'shift': shift_indexes,
+            'medallion': np.asarray(self.medallions)[codes],
+            'trip_time_in_secs': np.concatenate(
+                [result[4] for result in compared] + [np.zeros(0)]),
+            'fare_amount': np.concatenate(
+                [result[5] for result in compared] + [np.zeros(0)])})
+
+        return results, medallions
+
+    def _compare_shift(self, start_shift, end_shift):
+        """
+            Compares the drivers of one shift on numpy arrays.
+
+            Returns:
+                n_medallions, average_fare, average_drive_time and the
+                medallion codes, trip time and fare totals of the working
+                medallions
+        """
+        first = np.searchsorted(self.pickup_times, np.datetime64(start_shift),
+                                side='right')
+        last = max(first, np.searchsorted(
+            self.pickup_times, np.datetime64(end_shift), side='left'))
+
+        codes = self.row_codes[first:last]
+        working = working_rows(
+            codes, self.pickup_times[first:last],
+            self.data['dropoff_datetime'].values[first:last], start_shift,
+            end_shift, self.void_taxi_param)
+        codes = codes[working]
+        # Missing values count as 0, as in a dataframe sum
+        trip_times = np.nan_to_num(self.data['trip_time_in_secs'].values[
+            first:last][working].astype(float))
+        fares = np.nan_to_num(self.data['fare_amount'].values[first:last][
+            working].astype(float))
+
+        # Totals of the rows with a medallion, for each medallion
+        medallion_codes, inverse = np.unique(codes, return_inverse=True)
+        n_medallions = len(medallion_codes)
+        has_medallion = medallion_codes >= 0
+        trip_time_totals = np.bincount(inverse, trip_times,
+                                       minlength=n_medallions)
+        fare_totals = np.bincount(inverse, fares, minlength=n_medallions)
+
+        if n_medallions < 1:
+            return (0, 0, 0, medallion_codes, trip_time_totals, fare_totals)
+
+        return (n_medallions, fares.sum() / n_medallions,
+                (trip_times.sum() / n_medallions) / 60,
+                medallion_codes[has_medallion],
+                trip_time_totals[has_medallion], fare_totals[has_medallion])
+
     @staticmethod
     def filter_date(data, start_shift, end_shift):
         """
@@ -124,8 +300,10 @@ class DriverComparison():
             2)Did not make a pickup within start shift + void_taxi_param
             3)Did not make a pickup within end shift - void_taxi_param
 
-            These conditions are checked with the 3 static functions found
-            below this method.
+            The conditions are those of the 3 static functions found below
+            this method, checked for every medallion at once. The rows are
+            stably sorted by medallion, so each medallion's rows stay in the
+            order of data as with a subset of data.
 
             Args:
                 start_shift: datetime shift started at
@@ -134,22 +312,12 @@ class DriverComparison():
             Returns:
                 pandas dataframe with void taxis filtered out
         """
+        codes = pd.factorize(data['medallion'])[0]
+        working = working_rows(codes, data['pickup_datetime'].values,
+                               data['dropoff_datetime'].values, start_shift,
+                               end_shift, self.void_taxi_param)
 
-        void_list = []
-
-        for med in data['medallion'].unique():
-            subset = data[data['medallion'] == med]
-
-            max_break = self.void_taxi_param
-            pass_conditions = \
-                [self.shift_started_on_time(subset, start_shift, max_break),
-                 self.shift_ended_on_time(subset, end_shift, max_break),
-                 not self.high_breaks(subset, max_break)]
-
-            if not all(pass_conditions):
-                void_list.append(med)
-
-        return data[~data['medallion'].isin(void_list)]
+        return data[working]
 
     @staticmethod
     def high_breaks(medallion_subset, max_break):
@@ -203,3 +371,64 @@ class DriverComparison():
         must_end_by = end_shift - timedelta(minutes=max_break)
         last_trip = medallion_subset.iloc[-1]['dropoff_datetime']
         return last_trip >= must_end_by
+
+
+def _init_worker(comparison):
+    """Holds the DriverComparison of a worker process, once"""
+    global _comparison
+    _comparison = comparison
+
+
+def _compare_shift(shift):
+    """Compares the drivers of one shift in a worker process"""
+    return _comparison._compare_shift(*shift)
+
+
+def working_rows(codes, pickups, dropoffs, start_shift, end_shift,
+                 max_break):
+    """
+        Finds the rows of medallions considered to be working the shift, as
+        DriverComparison.filter_void_medallions.
+
+        Args:
+            codes: medallion code of each row, -1 rows are always kept
+            pickups: numpy datetimes of the pickups
+            dropoffs: numpy datetimes of the dropoffs
+            start_shift: datetime shift started at
+            end_shift: datetime shift ended at
+            max_break: void_taxi_param in minutes
+
+        Returns:
+            boolean array, True for rows of working medallions
+    """
+    if len(codes) == 0:
+        return np.zeros(0, dtype=bool)
+
+    max_break = timedelta(minutes=max_break)
+    order = np.argsort(codes, kind='mergesort')
+    codes_sorted = codes[order]
+    pickups = pickups[order]
+    dropoffs = dropoffs[order]
+
+    same_medallion = codes_sorted[1:] == codes_sorted[:-1]
+    firsts = np.flatnonzero(np.r_[True, ~same_medallion])
+    lasts = np.r_[firsts[1:] - 1, len(codes_sorted) - 1]
+
+    # Gap between each dropoff and the medallion's next pickup
+    time_searching = pickups[1:] - dropoffs[:-1]
+    high_break = same_medallion & (time_searching >
+                                   np.timedelta64(max_break))
+    high_breaks = np.logical_or.reduceat(np.r_[high_break, False], firsts)
+
+    must_start_by = np.datetime64(start_shift + max_break)
+    must_end_by = np.datetime64(end_shift - max_break)
+    void = ~((pickups[firsts] <= must_start_by) &
+             (dropoffs[lasts] >= must_end_by) &
+             ~high_breaks)
+
+    # Rows without a medallion (code -1) are kept
+    void_medallions = np.zeros(codes_sorted[-1] + 2, dtype=bool)
+    void_medallions[codes_sorted[firsts]] = void
+    void_medallions[-1] = False
+
+    return ~void_medallions[codes]
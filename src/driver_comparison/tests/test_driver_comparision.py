@@ -1,6 +1,9 @@
 import unittest
+from unittest import mock
+import numpy as np
 import pandas as pd
 from datetime import datetime
+from driver_comparison import driver_comparison
 from driver_comparison.driver_comparison import DriverComparison
 
 TEST_DATA_PATH = 'src/driver_comparison/tests/driver_comparison_test_data/'
@@ -172,5 +175,136 @@ class DriverComparisionTestCase(unittest.TestCase):
         self.assertFalse(on_time)
 
 
+def dummy_shift_data():
+    """Trips of a shift, a works the shift, b starts late, c has a long
+    break and d ends early. Rows are not grouped by medallion"""
+    trips = [('a', (18, 25), (18, 50)), ('b', (19, 10), (19, 40)),
+             ('c', (18, 20), (18, 40)), ('a', (19, 0), (19, 30)),
+             ('d', (18, 10), (18, 30)), ('c', (19, 20), (20, 50)),
+             ('b', (19, 50), (20, 50)), ('a', (19, 55), (20, 45))]
+
+    return pd.DataFrame({
+        'medallion': [trip[0] for trip in trips],
+        'pickup_datetime': [datetime(2013, 1, 5, *trip[1])
+                            for trip in trips],
+        'dropoff_datetime': [datetime(2013, 1, 5, *trip[2])
+                             for trip in trips]})
+
+
+class FilterVoidMedallionsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.obj = DriverComparison.__new__(DriverComparison)
+        self.obj.void_taxi_param = 30
+        self.data = dummy_shift_data()
+
+    def test_filter_void_medallions_matches_conditions(self):
+        start_time = datetime(2013, 1, 5, 18, 0, 0)
+        end_time = datetime(2013, 1, 5, 21, 0, 0)
+
+        for max_break in [30, 45, 60]:
+            self.obj.void_taxi_param = max_break
+            kept = []
+            for med in self.data['medallion'].unique():
+                subset = self.data[self.data['medallion'] == med]
+                if (self.obj.shift_started_on_time(subset, start_time,
+                                                   max_break) and
+                        self.obj.shift_ended_on_time(subset, end_time,
+                                                     max_break) and
+                        not self.obj.high_breaks(subset, max_break)):
+                    kept.append(med)
+
+            result = self.obj.filter_void_medallions(self.data, start_time,
+                                                     end_time)
+            expected = self.data[self.data['medallion'].isin(kept)]
+            self.assertTrue(result.equals(expected))
+
+        self.obj.void_taxi_param = 30
+        result = self.obj.filter_void_medallions(self.data, start_time,
+                                                 end_time)
+        self.assertTrue(result['medallion'].unique().tolist() == ['a'])
+
+
+class TripIndexTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.obj = DriverComparison.__new__(DriverComparison)
+        data = dummy_shift_data()
+        data['trip_time_in_secs'] = [1500, 1800, 1200, 1800, 1200, 5400,
+                                     3600, 3000]
+        data['fare_amount'] = [10., 12., 8., 11., 9., 30., 25., 20.]
+        self.obj.data = data.sort_values(by='pickup_datetime',
+                                         kind='mergesort')
+        self.obj.void_taxi_param = 60
+        self.obj.build_index()
+
+    def test_shift_trips_matches_filter_date(self):
+        times = [datetime(2013, 1, 5, 18, 0, 0),
+                 datetime(2013, 1, 5, 18, 20, 0),
+                 datetime(2013, 1, 5, 19, 10, 0),
+                 datetime(2013, 1, 5, 21, 0, 0)]
+
+        for start_time in times:
+            for end_time in times:
+                expected = self.obj.filter_date(self.obj.data, start_time,
+                                                end_time)
+                result = self.obj.shift_trips(start_time, end_time)
+                self.assertTrue(result.equals(expected))
+
+    def test_medallion_trips(self):
+        start_time = datetime(2013, 1, 5, 18, 25, 0)
+        end_time = datetime(2013, 1, 5, 21, 0, 0)
+
+        result = self.obj.medallion_trips('a', start_time, end_time)
+        self.assertTrue(result['pickup_datetime'].tolist() ==
+                        [datetime(2013, 1, 5, 19, 0, 0),
+                         datetime(2013, 1, 5, 19, 55, 0)])
+        self.assertTrue((result['medallion'] == 'a').all())
+
+    def test_compare_many_matches_compare(self):
+        shifts = [(datetime(2013, 1, 5, 18, 0, 0),
+                   datetime(2013, 1, 5, 21, 0, 0)),
+                  (datetime(2013, 1, 5, 18, 15, 0),
+                   datetime(2013, 1, 5, 20, 0, 0)),
+                  (datetime(2013, 1, 5, 22, 0, 0),
+                   datetime(2013, 1, 5, 23, 0, 0))]
+
+        results, medallions = self.obj.compare_many(shifts)
+
+        self.assertTrue(results['n_medallions'].tolist() == [2, 3, 0])
+        for index, (start_time, end_time) in enumerate(shifts):
+            expected = self.obj.compare(start_time, end_time)
+            result = results.iloc[index]
+            self.assertTrue(result['n_medallions'] ==
+                            expected['n_medallions'])
+            self.assertTrue(result['average_fare'] ==
+                            expected['average_fare'])
+            self.assertTrue(result['average_drive_time'] ==
+                            expected['average_drive_time'])
+
+            if expected['n_medallions']:
+                shift_medallions = medallions[medallions['shift'] == index]
+                shift_medallions = shift_medallions.set_index('medallion')
+                self.assertTrue(np.array_equal(
+                    shift_medallions[['trip_time_in_secs',
+                                      'fare_amount']].sort_index().values,
+                    expected['medallions'].sort_index().values))
+
+    def test_pooled_compare_many_matches_serial(self):
+        shifts = [(datetime(2013, 1, 5, 18, 0, 0),
+                   datetime(2013, 1, 5, 21, 0, 0)),
+                  (datetime(2013, 1, 5, 18, 15, 0),
+                   datetime(2013, 1, 5, 20, 0, 0)),
+                  (datetime(2013, 1, 5, 22, 0, 0),
+                   datetime(2013, 1, 5, 23, 0, 0))] * 2
+
+        serial = self.obj.compare_many(shifts, n_workers=1)
+        with mock.patch.object(driver_comparison, 'POOL_MIN_SHIFTS', 2):
+            pooled = self.obj.compare_many(shifts, n_workers=2)
+
+        for serial_df, pooled_df in zip(serial, pooled):
+            self.assertTrue(pooled_df.equals(serial_df))
+
+
 if __name__ == '__main__':
     unittest.main()
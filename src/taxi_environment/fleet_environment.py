@@ -0,0 +1,168 @@
+import numpy as np
+from src.tools.tools import minute_period_table, zip_code_indexes
+
+CASH_RATE = 1
+TIME_PERIODS = 6
+MINUTES_IN_DAY = 24 * 60
+ONE_MINUTE = np.timedelta64(1, 'm')
+
+
+class FleetEnvironment():
+    """The purpose of this class is to simulate many independent taxis of
+        the taxi environment at once.
+
+        Each taxi follows the same steps as TaxiEnvironment.run, but the
+        fleet is held as numpy arrays (zip index, clock in minutes, total
+        fare and done mask) and every step advances all taxis still on shift
+        with one call to each batched callback.
+    """
+
+    def __init__(self, zip_codes, simulate_trips_func, simulate_waits_func,
+                 simulate_travels_func, cash_rate=CASH_RATE,
+                 time_periods=TIME_PERIODS):
+        """
+            zip_codes: zip code at each zip index used by the callbacks
+            simulate_trips_func: given arrays of zip indexes, time periods
+                and random numbers returns the zip indexes customers travel
+                to, e.g. Transition.sample_dropoff_indexes
+            simulate_waits_func: given arrays of zip indexes and time periods
+                and a numpy random generator returns the minutes spent
+                searching for a customer, e.g.
+                CalculateSearchTimes.stocastic_searches
+            simulate_travels_func: given arrays of start zip indexes, end zip
+                indexes and time periods returns the minutes to travel
+                between them, e.g. CalculateTravelTimes.simulate_travel_times
+            cash_rate: fare per minute
+            time_periods: number of time periods the callbacks divide the
+                day into
+        """
+
+        self.zip_codes = np.asarray(zip_codes)
+        self.cash_rate = cash_rate
+
+        self.simulate_trips_func = simulate_trips_func
+        self.new_waits = simulate_waits_func
+        self.new_travel_times = simulate_travels_func
+        self.period_table = minute_period_table(time_periods)
+
+    @classmethod
+    def from_models(cls, transition, search_times, travel_times,
+                    cash_rate=CASH_RATE):
+        """Builds a fleet environment from loaded preprocessing objects
+
+            The search and travel time lookups are rebuilt in the zip order
+            of the transition matrices, so all callbacks share zip indexes.
+
+            Args:
+                transition: Transition
+                search_times: CalculateSearchTimes with loaded data
+                travel_times: CalculateTravelTimes with loaded data
+                cash_rate: fare per minute
+
+            Returns:
+                FleetEnvironment
+        """
+        search_times.build_lookup(transition.zip_codes)
+        travel_times.build_lookup(transition.zip_codes)
+
+        return cls(transition.zip_codes, transition.sample_dropoff_indexes,
+                   search_times.stocastic_searches,
+                   travel_times.simulate_travel_times, cash_rate,
+                   transition.time_periods)
+
+    def run(self, start_zips, start_datetimes, end_datetimes, decision_func,
+            rng=None, n_taxis=1):
+        """Run the simulation of a fleet of taxis in the new york taxi
+            environment
+
+            Each of start_zips, start_datetimes and end_datetimes is either
+            one value shared by every taxi or one value per taxi.
+
+            Args:
+                start_zips: zip codes taxis start in
+                start_datetimes: times taxis begin their shift at
+                end_datetimes: times taxis end their shift at
+                decision_func: given arrays of zip indexes and time periods
+                    returns the zip indexes taxis should move to next
+                rng: numpy random Generator, a new unseeded one if None
+                n_taxis: number of taxis when every argument is shared
+
+            Returns:
+                total_fares: the total money each taxi driver earned over the
+                    course of the journeys
+        """
+        if rng is None:
+            rng = np.random.default_rng()
+
+        start_datetimes = np.asarray(start_datetimes, dtype='datetime64[us]')
+        end_datetimes = np.asarray(end_datetimes, dtype='datetime64[us]')
+
+        # Clock in minutes since midnight of each taxi's start day
+        start_days = start_datetimes.astype('datetime64[D]')
+        start_minutes = (start_datetimes - start_days) / ONE_MINUTE
+        end_minutes = (end_datetimes - start_days) / ONE_MINUTE
+        start_indexes = zip_code_indexes(np.atleast_1d(start_zips),
+                                         self.zip_codes)
+        if (start_indexes < 0).any():
+            raise KeyError("Start zip codes missing from zip_codes")
+
+        zip_indexes, clock, end_minutes = np.broadcast_arrays(
+            start_indexes, np.asarray(start_minutes, dtype=float),
+            np.asarray(end_minutes, dtype=float), np.empty(n_taxis))[:3]
+
+        return self.run_minutes(zip_indexes, clock, end_minutes,
+                                decision_func, rng)
+
+    def run_minutes(self, zip_indexes, clock, end_minutes, decision_func,
+                    rng):
+        """Run the simulation with the fleet state given as arrays
+
+            Args:
+                zip_indexes: zip index each taxi starts in
+                clock: minutes since midnight each taxi starts at
+                end_minutes: minutes since midnight each taxi ends at, can
+                    be more than a day
+                decision_func: given arrays of zip indexes and time periods
+                    returns the zip indexes taxis should move to next
+                rng: numpy random Generator
+
+            Returns:
+                total_fares: the total money each taxi driver earned
+        """
+        zip_indexes = np.array(zip_indexes, dtype=np.int64)
+        clock = np.array(clock, dtype=float)
+        end_minutes = np.asarray(end_minutes, dtype=float)
+        total_fares = np.zeros(len(zip_indexes))
+        active = np.arange(len(zip_indexes))
+
+        while len(active):
+            current_zips = zip_indexes[active]
+            current_clock = clock[active]
+            minutes = np.floor(current_clock).astype(np.int64)
+            periods = self.period_table[minutes % MINUTES_IN_DAY]
+
+            zip_choices = decision_func(current_zips, periods)
+
+            # Travel to zip, wait for customer and take trip with customer
+            travel_times = self.new_travel_times(current_zips, zip_choices,
+                                                 periods)
+            wait_times = self.new_waits(zip_choices, periods, rng)
+            new_zips = self.simulate_trips_func(zip_choices, periods,
+                                                rng.random(len(active)))
+            trip_times = self.new_travel_times(zip_choices, new_zips,
+                                               periods)
+
+            current_clock = (current_clock + travel_times + wait_times +
+                             trip_times)
+            if np.isnan(current_clock).any():
+                raise ValueError("Callbacks returned no time for a zip code")
+
+            done = current_clock > end_minutes[active]
+            total_fares[active[~done]] += (trip_times[~done] *
+                                           self.cash_rate)
+
+            zip_indexes[active] = new_zips
+            clock[active] = current_clock
+            active = active[~done]
+
+        return total_fares
@@ -0,0 +1,127 @@
+import os
+from multiprocessing import Pool
+import numpy as np
+from src.data_preprocess.transition import Transition
+from src.data_preprocess.transition import PICKLE_PATH, ZIP_CODES_PATH
+from src.data_preprocess.calc_search_time import CalculateSearchTimes
+from src.data_preprocess.calc_search_time import SEARCH_PATH
+from src.data_preprocess.calc_travel_times import CalculateTravelTimes
+from src.data_preprocess.calc_travel_times import TRAVEL_DF_PATH
+from src.data_preprocess.calc_travel_times import AVERAGE_DF_PATH
+from src.data_preprocess.lookup_arrays import load_lookup_arrays
+from src.data_preprocess.lookup_arrays import ARRAY_STORE_PATH
+from src.tools.array_store import is_array_store
+from src.taxi_environment.fleet_environment import FleetEnvironment
+
+RUNS = 10
+ARTIFACT_PATHS = {'transition_path': PICKLE_PATH,
+                  'zip_codes_path': ZIP_CODES_PATH,
+                  'search_path': SEARCH_PATH,
+                  'travel_df_path': TRAVEL_DF_PATH,
+                  'average_df_path': AVERAGE_DF_PATH,
+                  'array_path': ARRAY_STORE_PATH}
+
+# Fleet environment and policy of the current worker process
+_fleet = None
+_policy = None
+
+
+def load_fleet(transition_path=PICKLE_PATH, zip_codes_path=ZIP_CODES_PATH,
+               search_path=SEARCH_PATH, travel_df_path=TRAVEL_DF_PATH,
+               average_df_path=AVERAGE_DF_PATH, array_path=ARRAY_STORE_PATH):
+    """Method which loads the lookup artifacts into a fleet environment
+
+    When array_path is an array store written by make_calculations the
+    lookups are memory mapped from it, so worker processes share its pages,
+    and the pickle paths are not used. Otherwise the pickles are loaded.
+
+    Args:
+        transition_path(string): pickled transition matrices
+        zip_codes_path(string): json file with ordered zip codes
+        search_path(string): pickled average search times
+        travel_df_path(string): pickled travel times
+        average_df_path(string): pickled average trip times
+        array_path(string): array store directory, pickles if None or
+            not an array store
+
+    Returns:
+        fleet(FleetEnvironment): environment in the transition zip order
+    """
+    if array_path is not None and is_array_store(array_path):
+        transition, search_times, travel_times, _ = load_lookup_arrays(
+            array_path, zip_codes_path)
+        return FleetEnvironment.from_models(transition, search_times,
+                                            travel_times)
+
+    transition = Transition(pickle_path=transition_path,
+                            zip_codes_path=zip_codes_path)
+    search_times = CalculateSearchTimes(search_path=search_path)
+    travel_times = CalculateTravelTimes(travel_df_path=travel_df_path,
+                                        average_df_path=average_df_path)
+
+    return FleetEnvironment.from_models(transition, search_times,
+                                        travel_times)
+
+
+def _init_worker(artifact_paths, policy):
+    """Loads the lookup artifacts and policy of a worker process, once"""
+    global _fleet, _policy
+    _fleet = load_fleet(**artifact_paths)
+    _policy = policy
+
+
+def _run_shift(args):
+    """Simulates every run of one shift in a worker process
+
+    Returns:
+        total fare of each run
+    """
+    start_zip, start_datetime, end_datetime, runs, seed = args
+    rng = np.random.default_rng(seed)
+
+    return _fleet.run(start_zip, start_datetime, end_datetime, _policy,
+                      rng=rng, n_taxis=runs)
+
+
+def run_monte_carlo(shifts, policy, runs=RUNS, n_workers=None, seed=None,
+                    artifact_paths=None):
+    """Method which simulates every shift runs times over a process pool
+
+    Each worker loads the lookup artifacts once. Every shift gets its own
+    random generator, spawned from one SeedSequence in the order of shifts,
+    and its runs are simulated together as a fleet. Results for a seed are
+    therefore the same however many workers are used.
+
+    Args:
+        shifts(list): (start_zip, start_datetime, end_datetime) tuples
+        policy: picklable decision function given arrays of zip indexes and
+            time periods returning the zip indexes taxis should move to
+            next, e.g. a module level function
+        runs(int): number of simulations of each shift
+        n_workers(int): number of worker processes, os.cpu_count() if None,
+            1 runs in this process
+        seed: entropy of the SeedSequence, fresh entropy if None
+        artifact_paths(dict): load_fleet arguments, ARTIFACT_PATHS if None
+
+    Returns:
+        total_fares(np.array): (shifts, runs) total fare of every run, so
+            total_fares.mean(axis=1) is the average performance of a shift
+    """
+    n_workers = n_workers or os.cpu_count()
+    artifact_paths = artifact_paths or ARTIFACT_PATHS
+
+    seeds = np.random.SeedSequence(seed).spawn(len(shifts))
+    tasks = [(start_zip, start_datetime, end_datetime, runs, shift_seed)
+             for (start_zip, start_datetime, end_datetime), shift_seed
+             in zip(shifts, seeds)]
+
+    if n_workers == 1:
+        _init_worker(artifact_paths, policy)
+        results = list(map(_run_shift, tasks))
+
+    else:
+        with Pool(n_workers, initializer=_init_worker,
+                  initargs=(artifact_paths, policy)) as pool:
+            results = pool.map(_run_shift, tasks)
+
+    return np.array(results).reshape(len(shifts), runs)
@@ -1,7 +1,28 @@
 import numpy as np
 from datetime import timedelta
+from src.tools.tools import minute_period_table
 
 CASH_RATE = 1
+TIME_PERIODS = 6
+HISTORY_SIZE = 256
+MINUTES_IN_DAY = 24 * 60
+
+
+class Observation(object):
+    """Record of a step, reused between steps of the fast path
+
+        Fields can be read as attributes or, like the observation
+        dictionaries, as items (obs['done']).
+    """
+    __slots__ = ('time', 'fare', 'done')
+
+    def __init__(self, time=0, fare=0, done=False):
+        self.time = time
+        self.fare = fare
+        self.done = done
+
+    def __getitem__(self, key):
+        return getattr(self, key)
 
 
 class TaxiEnvironment():
@@ -10,7 +31,9 @@ class TaxiEnvironment():
     """
 
     def __init__(self, simulate_trip_func, simulate_wait_func,
-                 simulate_travel_func, cash_rate=CASH_RATE):
+                 simulate_travel_func, cash_rate=CASH_RATE, fast=False,
+                 time_periods=TIME_PERIODS, record_history=True,
+                 history_size=HISTORY_SIZE):
         """
             simulate_trip_func: given a zip code and the datetime returns
                 a new zip code (representing a customer trip to that zip code)
@@ -21,6 +44,19 @@ class TaxiEnvironment():
                 how long it would take to travel form the first zip code to
                 the second
             cash_rate: fare per minute
+            fast: keep the clock as minutes since midnight and pass the
+                callbacks and decision function the index of the time period
+                instead of a datetime, e.g.
+                Transition.simulate_dropoff_in_period,
+                CalculateSearchTimes.stocastic_search_in_period and
+                CalculateTravelTimes.travel_time_in_period, with
+                HighestEpm.choose_in_period as decision function
+            time_periods: number of time periods the fast path divides the
+                day into
+            record_history: fast path only, record the zip code and time
+                histories
+            history_size: fast path only, initial length of the preallocated
+                history arrays, doubled when full
 
         """
 
@@ -31,6 +67,14 @@ class TaxiEnvironment():
         self.new_travel_time = simulate_travel_func
         self.zip_code_travel_history = []
 
+        self.fast = fast
+        self.record_history = record_history
+        self.period_table = minute_period_table(time_periods).tolist()
+        self.observation = Observation()
+        if fast and record_history:
+            self._zip_history = np.zeros(history_size, dtype=np.int64)
+            self._minute_history = np.zeros(history_size)
+
     def run(self, start_zip, start_datetime, end_datetime, decision_func,
             rand_generator=np.random.rand):
         """Run the simulation of the new york taxi environment
@@ -49,6 +93,10 @@ class TaxiEnvironment():
                     course of the journeys
 
         """
+        if self.fast:
+            return self._run_fast(start_zip, start_datetime, end_datetime,
+                                  decision_func, rand_generator)
+
         self.zip_code_travel_history = []
         self.time_history = []
 
@@ -128,3 +176,91 @@ class TaxiEnvironment():
             })
 
             return observation
+
+    def _run_fast(self, start_zip, start_datetime, end_datetime,
+                  decision_func, rand_generator):
+        """Runs the simulation with the clock in minutes since midnight of
+            start_datetime. The time period is found once per step and
+            passed to the callbacks and decision_func.
+
+            When recording history zip_code_travel_history and time_history
+            are views of preallocated arrays, time_history holding minutes
+            since midnight of start_datetime.
+        """
+        start_of_day = start_datetime.replace(hour=0, minute=0, second=0,
+                                              microsecond=0)
+        self.current_minutes = ((start_datetime - start_of_day) /
+                                timedelta(minutes=1))
+        self.end_minutes = (end_datetime - start_of_day) / timedelta(minutes=1)
+        self.current_zip = start_zip
+
+        n_zips = 0
+        n_times = 0
+        total_fare = 0
+        done = False
+
+        while(not done):
+            if self.record_history:
+                if n_zips + 2 > len(self._zip_history):
+                    self._grow_history()
+                self._zip_history[n_zips] = self.current_zip
+
+            period = self.period_table[int(self.current_minutes) %
+                                       MINUTES_IN_DAY]
+            zip_choice = decision_func(self.current_zip, period)
+
+            obs = self._step_fast(zip_choice, period, rand_generator)
+
+            if self.record_history:
+                self._zip_history[n_zips + 1] = zip_choice
+                self._minute_history[n_times] = self.current_minutes
+                n_zips += 2
+                n_times += 1
+
+            done = obs.done
+            total_fare += obs.fare
+
+        self.current_time = start_of_day + timedelta(
+            minutes=self.current_minutes)
+        if self.record_history:
+            self.zip_code_travel_history = self._zip_history[:n_zips].copy()
+            self.time_history = self._minute_history[:n_times].copy()
+
+        return total_fare
+
+    def _step_fast(self, zip_code, period, rand_generator):
+        """Takes the next step of the fast path in the given time period,
+            filling and returning the reused observation
+        """
+        # Travel to zip, wait for customer and take trip with customer
+        time_traveling_to_new_zone = self.new_travel_time(self.current_zip,
+                                                          zip_code, period)
+        time_waiting_for_customer = self.new_wait(zip_code, period)
+        new_zip = self.simulate_trip_func(zip_code, period, rand_generator())
+
+        self.current_zip = new_zip
+        time_trip_time = self.new_travel_time(zip_code, new_zip, period)
+
+        total_time = (time_traveling_to_new_zone
+                      + time_waiting_for_customer
+                      + time_trip_time)
+        self.current_minutes += total_time
+
+        observation = self.observation
+        if self.current_minutes > self.end_minutes:
+            observation.time = 0
+            observation.fare = 0
+            observation.done = True
+        else:
+            observation.time = total_time
+            observation.fare = time_trip_time * self.cash_rate
+            observation.done = False
+
+        return observation
+
+    def _grow_history(self):
+        """Doubles the length of the preallocated history arrays"""
+        self._zip_history = np.concatenate(
+            [self._zip_history, np.zeros_like(self._zip_history)])
+        self._minute_history = np.concatenate(
+            [self._minute_history, np.zeros_like(self._minute_history)])
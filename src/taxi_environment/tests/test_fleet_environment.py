@@ -0,0 +1,89 @@
+import unittest
+import numpy as np
+from src.taxi_environment.fleet_environment import FleetEnvironment
+from src.taxi_environment.taxi_environment import TaxiEnvironment
+from datetime import datetime, timedelta
+
+ZIP_CODES = [10026, 10027]
+
+
+class FleetEnvironmentTestCase(unittest.TestCase):
+
+    def setUp(self):
+        # Set up mock dependencies, every step takes 25 minutes and earns 5
+        def fake_trips_func(zip_indexes, periods, rands):
+            return 1 - zip_indexes
+
+        def fake_waits_func(zip_indexes, periods, rng):
+            return np.full(len(zip_indexes), 5.)
+
+        def fake_travels_func(start_indexes, end_indexes, periods):
+            return np.full(len(start_indexes), 10.)
+
+        self.obj = FleetEnvironment(ZIP_CODES, fake_trips_func,
+                                    fake_waits_func, fake_travels_func,
+                                    cash_rate=0.5)
+
+    def test_run_taxis_with_different_shifts(self):
+        start_date = datetime(1994, 4, 3, 13, 44, 1)
+        end_dates = [start_date, start_date + timedelta(minutes=26),
+                     start_date + timedelta(minutes=66)]
+
+        total_fares = self.obj.run(10026, start_date, end_dates,
+                                   lambda zip_indexes, periods: zip_indexes)
+        self.assertTrue(total_fares.tolist() == [0, 5, 10])
+
+    def test_run_shared_shift(self):
+        start_date = datetime(1994, 4, 3, 23, 44, 1)
+        end_date = datetime(1994, 4, 4, 0, 50, 1)
+
+        total_fares = self.obj.run(10027, start_date, end_date,
+                                   lambda zip_indexes, periods: zip_indexes,
+                                   n_taxis=4)
+        self.assertTrue(total_fares.tolist() == [10, 10, 10, 10])
+
+    def test_run_matches_taxi_environment(self):
+        start_date = datetime(1994, 4, 3, 13, 44, 1)
+        end_date = datetime(1994, 4, 3, 18, 44, 1)
+        periods = []
+
+        def trips_func(zip_indexes, periods, rands):
+            return (rands * 2).astype(int)
+
+        def travels_func(start_indexes, end_indexes, periods):
+            return 3. + 7 * start_indexes + 11 * end_indexes + periods
+
+        def decision_func(zip_indexes, time_periods):
+            periods.extend(time_periods)
+            return 1 - zip_indexes
+
+        fleet = FleetEnvironment(ZIP_CODES, trips_func,
+                                 lambda zips, periods, rng: zips * 2.,
+                                 travels_func)
+        total_fare = fleet.run(10026, start_date, end_date, decision_func,
+                               rng=np.random.default_rng(3))
+
+        def trip_func(zip_code, datetime, rand):
+            return ZIP_CODES[int(rand * 2)]
+
+        def travel_func(zip_code_start, zip_code_end, datetime):
+            period = fleet.period_table[datetime.hour * 60 + datetime.minute]
+            return (3. + 7 * ZIP_CODES.index(zip_code_start) +
+                    11 * ZIP_CODES.index(zip_code_end) + period)
+
+        rng = np.random.default_rng(3)
+        taxi = TaxiEnvironment(
+            trip_func, lambda zip_code, datetime: ZIP_CODES.index(zip_code) * 2.,
+            travel_func)
+        expected_fare = taxi.run(10026, start_date, end_date,
+                                 lambda zip_code, datetime: ZIP_CODES[
+                                     1 - ZIP_CODES.index(zip_code)],
+                                 rand_generator=rng.random)
+
+        self.assertTrue(np.isclose(total_fare[0], expected_fare))
+        self.assertTrue(len(periods) == len(taxi.time_history))
+        self.assertTrue(set(periods) == {3, 4})
+
+
+if __name__ == '__main__':
+    unittest.main()
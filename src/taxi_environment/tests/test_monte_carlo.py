@@ -0,0 +1,37 @@
+import unittest
+import numpy as np
+from src.taxi_environment.monte_carlo import run_monte_carlo
+from datetime import datetime
+
+SHIFTS = [(10001, datetime(2013, 1, 16, 8), datetime(2013, 1, 16, 11)),
+          (10003, datetime(2013, 1, 16, 17), datetime(2013, 1, 16, 20)),
+          (10011, datetime(2013, 1, 16, 20), datetime(2013, 1, 16, 23))]
+
+
+def stay_policy(zip_indexes, periods):
+    return zip_indexes
+
+
+class MonteCarloTestCase(unittest.TestCase):
+
+    def test_results_do_not_depend_on_workers(self):
+        in_process = run_monte_carlo(SHIFTS, stay_policy, runs=50,
+                                     n_workers=1, seed=7)
+        pooled = run_monte_carlo(SHIFTS, stay_policy, runs=50,
+                                 n_workers=2, seed=7)
+
+        self.assertTrue(in_process.shape == (len(SHIFTS), 50))
+        self.assertTrue(np.array_equal(in_process, pooled))
+        self.assertTrue((in_process > 0).any())
+
+    def test_seed_changes_results(self):
+        first = run_monte_carlo(SHIFTS, stay_policy, runs=50, n_workers=1,
+                                seed=7)
+        second = run_monte_carlo(SHIFTS, stay_policy, runs=50, n_workers=1,
+                                 seed=8)
+
+        self.assertFalse(np.array_equal(first, second))
+
+
+if __name__ == '__main__':
+    unittest.main()
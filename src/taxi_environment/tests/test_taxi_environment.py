@@ -1,6 +1,7 @@
 import unittest
 from taxi_environment.taxi_environment import TaxiEnvironment
 from datetime import datetime
+import numpy as np
 
 
 class TaxiEnvironmentTestCase(unittest.TestCase):
@@ -94,6 +95,46 @@ class TaxiEnvironmentTestCase(unittest.TestCase):
                                   fake_decision_func)
         self.assertTrue(total_fare == 10)
 
+    def test_fast_run_two_trips(self):
+        start_date = datetime(1994, 4, 3, 13, 44, 1)
+        end_date = datetime(1994, 4, 3, 14, 50, 1)
+        periods = []
+
+        def fake_decision_func(zip_code, period):
+            periods.append(period)
+            if zip_code == 10026:
+                return 10027
+            else:
+                return 10026
+
+        obj = TaxiEnvironment(self.obj.simulate_trip_func,
+                              self.obj.new_wait, self.obj.new_travel_time,
+                              cash_rate=0.5, fast=True, history_size=2)
+        total_fare = obj.run(10026, start_date, end_date, fake_decision_func)
+        self.assertTrue(total_fare == 10)
+        self.assertTrue(periods == [3, 3, 3])
+
+        self.assertTrue(list(obj.zip_code_travel_history) ==
+                        [10026, 10027, 10, 10026, 10, 10026])
+        self.assertTrue(np.allclose(obj.time_history,
+                                    [824 + 1 / 60 + 25 * step
+                                     for step in range(1, 4)]))
+        end_time = datetime(1994, 4, 3, 14, 59, 1)
+        self.assertTrue(abs((obj.current_time - end_time).total_seconds()) <
+                        0.001)
+
+    def test_fast_run_without_history(self):
+        start_date = datetime(1994, 4, 3, 13, 44, 1)
+        end_date = datetime(1994, 4, 3, 14, 10, 1)
+
+        obj = TaxiEnvironment(self.obj.simulate_trip_func,
+                              self.obj.new_wait, self.obj.new_travel_time,
+                              cash_rate=0.5, fast=True, record_history=False)
+        total_fare = obj.run(10026, start_date, end_date,
+                             lambda zip_code, period: 10027)
+        self.assertTrue(total_fare == 5)
+        self.assertTrue(obj.zip_code_travel_history == [])
+
 
 if __name__ == '__main__':
     unittest.main()
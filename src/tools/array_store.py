@@ -0,0 +1,150 @@
+import os
+import json
+import numpy as np
+from src.tools.tools import zip_code_indexes
+
+ARRAY_STORE_VERSION = 1
+HEADER_NAME = 'header.json'
+
+
+def is_array_store(path):
+    """Method which checks if path is an array store directory"""
+    return os.path.isfile(os.path.join(path, HEADER_NAME))
+
+
+def save_array_store(path, arrays, zip_codes, time_periods,
+                     build_params=None):
+    """Method which saves lookup arrays as .npy files with a json header
+
+    Every array has a leading time period axis followed by one or more zip
+    code axes in the order of zip_codes, e.g. (time_period, zip, zip)
+    travel times. The header records the format version, zip codes,
+    time_periods and build parameters so load_array_store can reject arrays
+    built for a different setup.
+
+    Args:
+        path(string): directory the store is written to
+        arrays(dict): name -> numpy array
+        zip_codes(array like): zip codes indexing the zip axes
+        time_periods(int): number of time periods the day is divided into
+        build_params(dict): json serialisable parameters of the build
+
+    Returns:
+        path(string): directory the store was written to
+    """
+    zip_codes = np.asarray(zip_codes, dtype=np.int64)
+    if not os.path.isdir(path):
+        os.makedirs(path)
+
+    header = {'version': ARRAY_STORE_VERSION,
+              'zip_codes': zip_codes.tolist(),
+              'time_periods': int(time_periods),
+              'build_params': build_params or {},
+              'arrays': {}}
+
+    for name, values in arrays.items():
+        values = np.ascontiguousarray(values)
+        _check_shape(name, values.shape, len(zip_codes), time_periods)
+        np.save(os.path.join(path, name + '.npy'), values)
+        header['arrays'][name] = {'shape': list(values.shape),
+                                  'dtype': values.dtype.str}
+
+    # Header last, so a store is only recognised once its arrays are saved
+    with open(os.path.join(path, HEADER_NAME), 'w') as data_file:
+        json.dump(header, data_file)
+
+    return path
+
+
+def load_array_store(path, zip_codes=None, time_periods=None,
+                     mmap_mode='r'):
+    """Method which loads the arrays of an array store
+
+    With mmap_mode='r' the arrays are read-only memory maps, so processes
+    loading the same store share its pages rather than each holding a copy.
+
+    Args:
+        path(string): array store directory
+        zip_codes(array like): zip code order the arrays must be built in,
+            not checked if None
+        time_periods(int): number of time periods the arrays must be built
+            for, not checked if None
+        mmap_mode: passed to np.load
+
+    Returns:
+        arrays(dict): name -> numpy array
+        header(dict): version, zip_codes, time_periods, build_params and
+            the shape and dtype of every array
+
+    Raises:
+        ValueError: if the store's version, zip codes, time periods or
+            arrays do not match
+    """
+    with open(os.path.join(path, HEADER_NAME)) as data_file:
+        header = json.load(data_file)
+
+    if header.get('version') != ARRAY_STORE_VERSION:
+        raise ValueError("Array store %s has version %s, expected %d" %
+                         (path, header.get('version'), ARRAY_STORE_VERSION))
+
+    if time_periods is not None and header['time_periods'] != time_periods:
+        raise ValueError("Array store %s was built for %d time periods, "
+                         "expected %d" % (path, header['time_periods'],
+                                          time_periods))
+
+    if zip_codes is not None and not np.array_equal(
+            np.asarray(zip_codes, dtype=np.int64), header['zip_codes']):
+        raise ValueError("Array store %s was built for a different zip code "
+                         "order" % path)
+
+    arrays = {}
+    for name, info in header['arrays'].items():
+        values = np.load(os.path.join(path, name + '.npy'),
+                         mmap_mode=mmap_mode)
+        if (list(values.shape) != info['shape'] or
+                values.dtype.str != info['dtype']):
+            raise ValueError("Array %s of store %s does not match its "
+                             "header" % (name, path))
+        _check_shape(name, values.shape, len(header['zip_codes']),
+                     header['time_periods'])
+
+        # A plain ndarray view of the memory map
+        arrays[name] = np.asarray(values)
+
+    return arrays, header
+
+
+def align_zip_array(values, zip_codes, new_zip_codes, zip_axes):
+    """Method which reorders the zip axes of an array to new zip codes
+
+    Args:
+        values(np.array): array with zip axes indexed by zip_codes
+        zip_codes(array like): zip codes indexing the zip axes
+        new_zip_codes(array like): zip codes to index the result by
+        zip_axes(list): the zip axes of values
+
+    Returns:
+        values(np.array): values, unchanged if the zip codes are equal, or
+            a copy indexed by new_zip_codes, nan for zips not in zip_codes
+    """
+    if np.array_equal(zip_codes, new_zip_codes):
+        return values
+
+    indexes = zip_code_indexes(new_zip_codes, zip_codes)
+    for axis in zip_axes:
+        # Index -1 picks the appended nan slice
+        shape = list(values.shape)
+        shape[axis] = 1
+        values = np.concatenate([values, np.full(shape, np.nan)], axis=axis)
+        values = np.take(values, indexes, axis=axis)
+
+    return values
+
+
+def _check_shape(name, shape, n_zip_codes, time_periods):
+    """Raises ValueError unless shape is (time_periods, zips[, zips...])"""
+    if (len(shape) < 2 or shape[0] != time_periods or
+            any(size != n_zip_codes for size in shape[1:])):
+        raise ValueError("Array %s has shape %s, expected %d time periods "
+                         "and %d zip codes" % (name, tuple(shape),
+                                               time_periods, n_zip_codes))
@@ -0,0 +1,90 @@
+import os
+import threading
+import numpy as np
+import pandas as pd
+from src.tools.tools import unpickle
+
+
+class ArtifactRegistry(object):
+    """Class which loads each preprocessed artifact once per process
+
+    Artifacts are loaded on first access and cached by path. The file's
+    modification time and size are checked on every access, so an artifact
+    rewritten by make_calculations is loaded again. Every consumer gets a
+    read-only view of the cached object rather than its own copy.
+    """
+
+    def __init__(self):
+        self.artifacts = {}
+        self.lock = threading.Lock()
+
+    def get(self, path, loader=unpickle):
+        """Method which returns a read-only view of the artifact at path
+
+        Args:
+            path(string): artifact file
+            loader: function given path returning the artifact, only called
+                when path is not cached or has changed
+
+        Returns:
+            read_only_view(object): numpy arrays are read-only views,
+                DataFrames shallow copies sharing the cached values, which
+                must not be modified in place
+        """
+        key = os.path.abspath(path)
+        stat = os.stat(key)
+        version = (stat.st_mtime_ns, stat.st_size)
+
+        with self.lock:
+            cached = self.artifacts.get(key)
+            if cached is None or cached[0] != version:
+                cached = (version, loader(key))
+                self.artifacts[key] = cached
+
+        return read_only_view(cached[1])
+
+    def clear(self):
+        """Method which drops every cached artifact"""
+        with self.lock:
+            self.artifacts.clear()
+
+
+# Registry shared by every consumer in the process
+REGISTRY = ArtifactRegistry()
+
+
+def load_artifact(path, loader=unpickle):
+    """Method which loads an artifact through the process-wide registry
+
+    Args:
+        path(string): artifact file
+        loader: function given path returning the artifact
+
+    Returns:
+        read-only view of the artifact, see ArtifactRegistry.get
+    """
+    return REGISTRY.get(path, loader)
+
+
+def read_only_view(obj):
+    """Method which returns a view of obj its consumers cannot change
+
+    Args:
+        obj(object): numpy array, DataFrame or Series, or a list, tuple or
+            dict of them
+
+    Returns:
+        view of obj, other objects are returned as they are
+    """
+    if isinstance(obj, np.ndarray):
+        view = obj.view()
+        view.setflags(write=False)
+        return view
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        return obj.copy(deep=False)
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(read_only_view(item) for item in obj)
+    if isinstance(obj, dict):
+        return {key: read_only_view(value) for key, value in obj.items()}
+
+    return obj
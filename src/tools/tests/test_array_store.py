@@ -0,0 +1,68 @@
+import unittest
+import os
+import json
+import tempfile
+from src.tools.array_store import save_array_store, load_array_store
+from src.tools.array_store import align_zip_array, is_array_store
+import numpy as np
+
+ZIP_CODES = [10027, 10026, 10030]
+
+
+class ArrayStoreTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), 'lookup_arrays')
+        self.arrays = {'average_waits': np.arange(6.).reshape(2, 3),
+                       'travel_times': np.arange(18.).reshape(2, 3, 3)}
+
+        save_array_store(self.path, self.arrays, ZIP_CODES, 2,
+                         {'max_wait_time': 30})
+
+    def test_store_round_trip(self):
+        self.assertTrue(is_array_store(self.path))
+
+        arrays, header = load_array_store(self.path, ZIP_CODES, 2)
+
+        self.assertTrue(header['build_params'] == {'max_wait_time': 30})
+        for name, values in self.arrays.items():
+            self.assertTrue(np.array_equal(arrays[name], values))
+            self.assertFalse(arrays[name].flags.writeable)
+
+    def test_mismatched_store_is_rejected(self):
+        with self.assertRaises(ValueError):
+            load_array_store(self.path, ZIP_CODES, 6)
+
+        with self.assertRaises(ValueError):
+            load_array_store(self.path, sorted(ZIP_CODES), 2)
+
+        with self.assertRaises(ValueError):
+            save_array_store(self.path, {'average_waits': np.zeros((2, 4))},
+                             ZIP_CODES, 2)
+
+        header_path = os.path.join(self.path, 'header.json')
+        with open(header_path) as data_file:
+            header = json.load(data_file)
+        header['version'] = 0
+        with open(header_path, 'w') as data_file:
+            json.dump(header, data_file)
+
+        with self.assertRaises(ValueError):
+            load_array_store(self.path)
+
+    def test_align_zip_array(self):
+        travel_times = self.arrays['travel_times']
+
+        aligned = align_zip_array(travel_times, ZIP_CODES,
+                                  [10026, 10027, 10031], [1, 2])
+
+        self.assertTrue(aligned.shape == (2, 3, 3))
+        self.assertTrue(aligned[1, 0, 1] == travel_times[1, 1, 0])
+        self.assertTrue(np.isnan(aligned[:, 2]).all())
+        self.assertTrue(np.isnan(aligned[:, :, 2]).all())
+        self.assertTrue(align_zip_array(travel_times, ZIP_CODES, ZIP_CODES,
+                                        [1, 2]) is travel_times)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+import os
+import tempfile
+from src.tools.artifacts import ArtifactRegistry
+from src.tools.tools import pickle_obj
+import pandas as pd
+import numpy as np
+
+
+class ArtifactRegistryTestCase(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.path = os.path.join(directory, 'artifact.pkl')
+        self.registry = ArtifactRegistry()
+        self.loads = []
+
+        pickle_obj({'matrix': np.eye(2),
+                    'df': pd.DataFrame({'zips': [10026, 10027]})},
+                   self.path)
+
+    def loader(self, path):
+        self.loads.append(path)
+        return pd.read_pickle(path)
+
+    def test_artifact_is_loaded_once(self):
+        first = self.registry.get(self.path, self.loader)
+        second = self.registry.get(self.path, self.loader)
+
+        self.assertTrue(len(self.loads) == 1)
+        self.assertTrue(np.shares_memory(first['matrix'], second['matrix']))
+        self.assertTrue(np.shares_memory(first['df']['zips'].values,
+                                         second['df']['zips'].values))
+
+    def test_views_are_read_only(self):
+        artifact = self.registry.get(self.path, self.loader)
+
+        with self.assertRaises(ValueError):
+            artifact['matrix'][0, 0] = 5
+
+        artifact['df']['time_period'] = 0
+        artifact = self.registry.get(self.path, self.loader)
+        self.assertTrue('time_period' not in artifact['df'])
+
+    def test_changed_artifact_is_reloaded(self):
+        self.registry.get(self.path, self.loader)
+
+        pickle_obj({'matrix': np.zeros(3)}, self.path)
+        stat = os.stat(self.path)
+        os.utime(self.path, ns=(stat.st_atime_ns,
+                                stat.st_mtime_ns + 10 ** 9))
+        artifact = self.registry.get(self.path, self.loader)
+
+        self.assertTrue(len(self.loads) == 2)
+        self.assertTrue(artifact['matrix'].tolist() == [0, 0, 0])
+
+
+if __name__ == '__main__':
+    unittest.main()
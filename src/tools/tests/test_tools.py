@@ -0,0 +1,38 @@
+import unittest
+from datetime import datetime
+from src.tools.tools import map_to_period, find_df_period, datetime_periods
+import pandas as pd
+import numpy as np
+
+
+class PeriodTestCase(unittest.TestCase):
+
+    def test_datetime_periods_matches_cut_offs(self):
+        # 4:00 is the last minute of period 0, midnight is period -1 and
+        # seconds are ignored
+        datetimes = [datetime(2013, 1, 5, 0, 0, 0),
+                     datetime(2013, 1, 5, 0, 1, 0),
+                     datetime(2013, 1, 5, 4, 0, 59),
+                     datetime(2013, 1, 5, 4, 1, 0),
+                     datetime(2013, 1, 5, 23, 59, 59),
+                     datetime(1969, 12, 31, 20, 30, 0)]
+
+        periods = datetime_periods(datetimes, 6)
+
+        self.assertTrue(periods.tolist() == [-1, 0, 0, 1, 5, 5])
+        self.assertTrue([map_to_period(date, 6) for date in datetimes] ==
+                        periods.tolist())
+
+    def test_find_df_period(self):
+        df = pd.DataFrame({'pickup_datetime': ['2013-01-05 12:00:00',
+                                               '2013-01-05 12:01:00', None]})
+
+        df = find_df_period(df, 'pickup_datetime', 2)
+
+        self.assertTrue(df['time_period'].tolist() == [0, 1, -1])
+        self.assertTrue(np.issubdtype(df['pickup_datetime'].dtype,
+                                      np.datetime64))
+
+
+if __name__ == '__main__':
+    unittest.main()
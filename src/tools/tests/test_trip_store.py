@@ -0,0 +1,65 @@
+import unittest
+import os
+import tempfile
+from src.tools.trip_store import convert_csv_to_store, load_trips
+from src.tools.trip_store import is_trip_store
+import pandas as pd
+import numpy as np
+
+ZIP_CODES_PATH = 'src/data_preprocess/tests/transition_test_data/'
+ZIP_CODES_PATH += 'DummyZipCodes.json'
+
+
+class TripStoreTestCase(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.csv_path = os.path.join(directory, 'trips.csv')
+        self.store_path = os.path.join(directory, 'trip_store')
+
+        df = pd.DataFrame({
+            'medallion': ['b', 'a', 'b'],
+            'pickup_zips': [10027, 10026, 10030],
+            'dropoff_zips': [10026, 10027, 10027],
+            'pickup_datetime': ['2013-01-05 09:21:00', '2013-01-05 10:02:00',
+                                '2013-01-05 23:59:00'],
+            'dropoff_datetime': ['2013-01-05 09:31:00',
+                                 '2013-01-05 10:13:00',
+                                 '2013-01-06 00:10:00'],
+            'fare_amount': [10.5, 7.0, 12.25]})
+        df.to_csv(self.csv_path, index=False)
+
+        convert_csv_to_store(self.csv_path, self.store_path, ZIP_CODES_PATH)
+
+    def test_store_matches_csv(self):
+        self.assertTrue(is_trip_store(self.store_path))
+        self.assertFalse(is_trip_store(self.csv_path))
+
+        columns = ['fare_amount', 'medallion', 'pickup_zips',
+                   'pickup_datetime']
+        store_df = load_trips(self.store_path, columns)
+        csv_df = load_trips(self.csv_path, columns)
+
+        self.assertTrue(list(store_df.columns) == columns)
+        self.assertTrue(list(csv_df.columns) == columns)
+        for column in columns:
+            self.assertTrue((np.asarray(store_df[column]) ==
+                             np.asarray(csv_df[column])).all())
+
+    def test_store_types(self):
+        df = load_trips(self.store_path, zip_index=True)
+
+        self.assertTrue(str(df['medallion'].dtype) == 'category')
+        self.assertTrue(df['pickup_zips'].tolist() == [10027, 10026, 10030])
+        # Ordered zip codes come first, unknown zip codes are appended
+        self.assertTrue(df['pickup_zips_index'].tolist() == [1, 0, 2])
+        self.assertTrue(df['dropoff_datetime'].iloc[2] ==
+                        pd.Timestamp('2013-01-06 00:10:00'))
+
+        self.assertTrue(np.load(os.path.join(self.store_path,
+                                             'pickup_zips.npy')).itemsize
+                        == 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
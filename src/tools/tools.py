@@ -1,6 +1,10 @@
 import pandas as pd
 import numpy as np
 import pickle
+import json
+
+# minute_period_table of each number of time periods
+_PERIOD_TABLES = {}
 
 
 def read_data(name):
@@ -26,7 +30,8 @@ def pickle_obj(obj, name):
         obj(object): Python object to be serialised
         name(string): Name of serialised object
     """
-    pickle.dump(obj, open(name, "wb"))
+    with open(name, "wb") as handle:
+        pickle.dump(obj, handle)
 
     
 def merge_dfs(df1, df2):
@@ -45,7 +50,8 @@ def unpickle(name):
     Returns:
           obj(object): Python object to be unserialised
     """
-    obj = pickle.load(open(name, "rb"))
+    with open(name, "rb") as handle:
+        obj = pickle.load(handle)
 
     return obj
 
@@ -165,9 +171,56 @@ def map_to_period(datetime, time_periods):
     Returns:
            index of time period: 0 -> time_periods - 1 (int)
         """
-    decimal_hour = datetime.hour + (datetime.minute / 60)
-    cut_offs = np.linspace(0, 24, time_periods + 1)
-    return np.argmax(cut_offs >= decimal_hour) - 1
+    table = minute_period_table(time_periods)
+    return table[datetime.hour * 60 + datetime.minute]
+
+
+def minute_period_table(time_periods):
+    """
+    Returns the time period of every minute of the day
+
+    A period ends at its cut off, np.linspace(0, 24, time_periods + 1), so
+    a time exactly on a cut off is in the earlier period and midnight maps
+    to period -1. Seconds are ignored. The table is built once for each
+    number of time_periods and shared, so it is read-only.
+
+    Args:
+        time_periods: number of time periods to divide the day into
+
+    Returns:
+           table(np.array): 1440 periods, one per minute of the day
+    """
+    if time_periods not in _PERIOD_TABLES:
+        minutes = np.arange(24 * 60)
+        decimal_hours = minutes // 60 + (minutes % 60) / 60
+        cut_offs = np.linspace(0, 24, time_periods + 1)
+        table = np.searchsorted(cut_offs, decimal_hours, side='left') - 1
+        table.setflags(write=False)
+        _PERIOD_TABLES[time_periods] = table
+
+    return _PERIOD_TABLES[time_periods]
+
+
+def datetime_periods(datetimes, time_periods):
+    """
+    Maps an array of datetimes to their time periods, as map_to_period,
+    with one lookup in minute_period_table
+
+    Args:
+        datetimes(array like): datetimes, e.g. a df column
+        time_periods(int): number of time periods to divide the day into
+
+    Returns:
+        periods(np.array): time period of each datetime, -1 for missing
+            datetimes
+    """
+    minutes = np.asarray(pd.to_datetime(np.asarray(datetimes)),
+                         dtype='datetime64[m]')
+    missing = np.isnat(minutes)
+    minute_of_day = minutes.astype(np.int64) % (24 * 60)
+    periods = minute_period_table(time_periods)[minute_of_day]
+
+    return np.where(missing, -1, periods)
 
 
 def find_df_period(df, column_name, time_periods):
@@ -182,18 +235,32 @@ def find_df_period(df, column_name, time_periods):
     Returns:
         df(df): df containing new columns 'time_periods'
     """
-    intervals = []
     df[column_name] = pd.to_datetime(df[column_name])
-    datetimes = df[column_name].tolist()
-    for datetime in datetimes:
-        decimal_hour = datetime.hour + (datetime.minute / 60)
-        cut_offs = np.linspace(0, 24, time_periods + 1)
-        intervals.append(np.argmax(cut_offs >= decimal_hour) - 1)
-
-    df['time_period'] = intervals
+    df['time_period'] = datetime_periods(df[column_name], time_periods)
     return df
 
 
+def with_df_period(df, column_name, time_periods):
+    """
+    Returns a df with a 'time_period' column, only computing it if missing
+
+    Lets a frame whose periods were computed once (for the same number of
+    time_periods) be shared between preprocessing stages. When the column
+    is missing it is added to a copy, the given df is left untouched.
+
+    Args:
+        df(df): df containing column to find the period for
+        column_name(string): the datetime column to find time-periods for
+        time_periods(int): number of time periods to divide the day into
+
+    Returns:
+        df(df): df containing column 'time_period'
+    """
+    if 'time_period' in df:
+        return df
+    return find_df_period(df.copy(), column_name, time_periods)
+
+
 def haversine_distance(lat_one, lon_one, lat_two, lon_two):
     """
         Computes the haversine distances between two vectors in miles.
@@ -248,3 +315,87 @@ def get_centroids(df, lat_column, lon_column):
         sum_lat = np.sum(points[:, 0])
 
         return (sum_lat / n, sum_lon / n)
+
+
+def load_zip_codes(path):
+    """Method which loads the ordered list of zip codes from a json file
+
+    Args:
+        path(string): json file with a ZipCodes list
+
+    Returns:
+        zip_codes(list): ordered zip codes
+    """
+    with open(path) as data_file:
+        return json.load(data_file)['ZipCodes']
+
+
+def order_zip_codes(zips, zip_codes):
+    """Method which orders zip codes found in data by a reference order
+
+    Zip codes in the reference order come first, in that order, followed by
+    any zip codes only found in the data in ascending order. Indexes into
+    the result are therefore stable for the reference zip codes.
+
+    Args:
+        zips(array like): zip codes found in the data
+        zip_codes(list): reference order, e.g. from OrderedZipCodes.json
+
+    Returns:
+        ordered(np.array): ordered zip codes
+    """
+    known = set(zip_codes)
+    extra = sorted(set(int(zip_code) for zip_code in np.unique(zips))
+                   - known)
+    return np.array(list(zip_codes) + extra, dtype=np.int64)
+
+
+def zip_code_indexes(zips, zip_codes):
+    """Method which finds the index of each zip code in an ordered list
+
+    Args:
+        zips(array like): zip codes to look up
+        zip_codes(array like): ordered zip codes, e.g. from order_zip_codes
+
+    Returns:
+        indexes(np.array): index of each zip in zip_codes, -1 if missing
+    """
+    zip_codes = np.asarray(zip_codes, dtype=np.int64)
+    zips = np.asarray(zips, dtype=np.int64)
+    order = np.argsort(zip_codes)
+    positions = np.searchsorted(zip_codes[order], zips)
+    positions = np.minimum(positions, len(zip_codes) - 1)
+    found = zip_codes[order][positions] == zips
+
+    return np.where(found, order[positions], -1)
+
+
+def zip_period_array(df, zip_columns, value_column, zip_codes, time_periods):
+    """Method which scatters a (time_period, zips..., value) df into an array
+
+    Args:
+        df(df): df with a time_period column, zip columns and a value column
+        zip_columns(list): one or two zip columns, e.g. ['zips'] or
+            ['pickup_zips', 'dropoff_zips']
+        value_column(string): column holding the values
+        zip_codes(array like): zip codes indexing the zip axes
+        time_periods(int): length of the time period axis
+
+    Returns:
+        values(np.array): (time_period, zips[, zips]) array of values, nan
+            where df has no row
+    """
+    n = len(zip_codes)
+    values = np.full((time_periods,) + (n,) * len(zip_columns), np.nan)
+    indexes = [df['time_period'].values.astype(np.int64)]
+    indexes += [zip_code_indexes(df[column].values, zip_codes)
+                for column in zip_columns]
+
+    found = (indexes[0] >= 0) & (indexes[0] < time_periods)
+    for index in indexes[1:]:
+        found &= index >= 0
+
+    values[tuple(index[found] for index in indexes)] = \
+        df[value_column].values[found].astype(float)
+
+    return values
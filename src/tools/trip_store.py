@@ -0,0 +1,133 @@
+import os
+import json
+import pandas as pd
+import numpy as np
+from src.tools.tools import load_zip_codes, order_zip_codes
+from src.tools.tools import zip_code_indexes
+
+CSV_PATH = 'data/zips_manhattan.csv'
+STORE_PATH = 'data/trip_store'
+ZIP_CODES_PATH = 'data/OrderedZipCodes.json'
+HEADER_NAME = 'store.json'
+ZIP_COLUMNS = ['pickup_zips', 'dropoff_zips']
+CATEGORY_COLUMNS = ['medallion', 'hack_license', 'vendor_id',
+                    'store_and_fwd_flag', 'payment_type']
+
+
+def is_trip_store(path):
+    """Method which checks if path is a converted trip store directory"""
+    return os.path.isfile(os.path.join(path, HEADER_NAME))
+
+
+def convert_csv_to_store(csv_path=CSV_PATH, store_path=STORE_PATH,
+                         zip_codes_path=ZIP_CODES_PATH):
+    """Method which converts a trip csv into a typed columnar store
+
+    The csv is parsed once and each column is saved as its own .npy file,
+    so later loads only read the columns they need and skip parsing:
+        datetimes: int64 seconds since the epoch
+        zip codes: small int index into the store's zip code list
+        strings (e.g. medallion): int32 codes into a category list
+        numbers: saved as parsed
+
+    Args:
+        csv_path(string): trip csv to convert
+        store_path(string): directory the store is written to
+        zip_codes_path(string): json file with ordered zip codes
+
+    Returns:
+        store_path(string): directory the store was written to
+    """
+    df = pd.read_csv(csv_path, skipinitialspace=True)
+    if not os.path.isdir(store_path):
+        os.makedirs(store_path)
+
+    zip_columns = [column for column in ZIP_COLUMNS if column in df]
+    zip_codes = order_zip_codes(df[zip_columns].values.ravel(),
+                                load_zip_codes(zip_codes_path))
+    zip_dtype = np.int8 if len(zip_codes) < 127 else np.int16
+
+    header = {'n_rows': len(df), 'zip_codes': zip_codes.tolist(),
+              'columns': {}, 'categories': {}}
+
+    for column in df.columns:
+        values = df[column]
+        if column.endswith('_datetime'):
+            kind = 'datetime'
+            values = pd.to_datetime(values)
+            data = values.values.astype('datetime64[s]').astype(np.int64)
+        elif column in zip_columns:
+            kind = 'zip'
+            data = zip_code_indexes(values.values, zip_codes).astype(zip_dtype)
+        elif (column in CATEGORY_COLUMNS or
+              not pd.api.types.is_numeric_dtype(values)):
+            kind = 'category'
+            categorical = pd.Categorical(values)
+            data = categorical.codes.astype(np.int32)
+            header['categories'][column] = [
+                str(category) for category in categorical.categories]
+        else:
+            kind = 'numeric'
+            data = values.values
+
+        header['columns'][column] = kind
+        np.save(os.path.join(store_path, column + '.npy'), data)
+
+    with open(os.path.join(store_path, HEADER_NAME), 'w') as data_file:
+        json.dump(header, data_file)
+
+    return store_path
+
+
+def load_trips(path, columns=None, zip_index=False, mmap_mode=None):
+    """Method which loads trips from a trip store or a csv file
+
+    When path is a store created by convert_csv_to_store only the requested
+    columns are read, datetimes are rebuilt from their int64 seconds and
+    zip codes from their indexes. A csv path is read with the same columns
+    and its datetime columns are parsed, so callers can use either.
+
+    Args:
+        path(string): trip store directory or csv file
+        columns(list): columns to load, all if None
+        zip_index(bool): also add <column>_index columns holding the zip
+            code indexes into the store's zip code list (store only)
+        mmap_mode: passed to np.load when reading a store
+
+    Returns:
+        df(df): trips with parsed datetime columns
+    """
+    if not is_trip_store(path):
+        df = pd.read_csv(path, skipinitialspace=True, usecols=columns)
+        for column in df.columns:
+            if column.endswith('_datetime'):
+                df[column] = pd.to_datetime(df[column])
+        # usecols keeps the csv order, return the columns as requested
+        return df if columns is None else df[columns]
+
+    with open(os.path.join(path, HEADER_NAME)) as data_file:
+        header = json.load(data_file)
+
+    if columns is None:
+        columns = list(header['columns'])
+
+    zip_codes = np.array(header['zip_codes'], dtype=np.int64)
+    data = {}
+    for column in columns:
+        kind = header['columns'][column]
+        values = np.load(os.path.join(path, column + '.npy'),
+                         mmap_mode=mmap_mode)
+
+        if kind == 'datetime':
+            data[column] = pd.to_datetime(np.asarray(values), unit='s')
+        elif kind == 'zip':
+            data[column] = zip_codes[values]
+            if zip_index:
+                data[column + '_index'] = np.asarray(values)
+        elif kind == 'category':
+            data[column] = pd.Categorical.from_codes(
+                values, header['categories'][column])
+        else:
+            data[column] = values
+
+    return pd.DataFrame(data, columns=list(data))